@@ -1,7 +1,10 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Optional
+import asyncio
+import json
 import uvicorn
 
 from app.universe_manager import (
@@ -11,9 +14,18 @@ from app.universe_manager import (
 )
 from app.character import Character
 from app.character_manager import CharacterManager
-from app.rag_pipeline import answer_question, clear_conversation, get_character_events
-from app.universe_embedder import build_universe_index, build_all_universe_indices
-from config.settings import FRONTEND_URL, API_HOST, API_PORT
+from app.rag_pipeline import answer_question_async, stream_answer, clear_conversation, get_character_events
+from app.build_jobs import build_jobs, QueueFullError
+from app.model_registry import model_registry
+from app.index_cache import index_cache
+from app.embedding_cache import flush_embedding_caches, get_embedding_cache_stats
+from app.retriever import MODEL_NAME, query_cache
+from app.embedding_batcher import embedding_batcher
+from app.faiss_manager import configure_faiss_threads
+from app.llm_interface import phi2_model
+from app.executors import executors
+from app.utils.memory import memory_usage
+from config.settings import FRONTEND_URL, API_HOST, API_PORT, API_WORKERS, EMBEDDING_WARMUP, RETRIEVAL_MODE
 
 app = FastAPI(title="PersonaForge RAG API", version="1.0.0")
 
@@ -29,6 +41,31 @@ app.add_middleware(
 # Initialize character manager
 character_manager = CharacterManager()
 
+@app.on_event("startup")
+async def warm_up_embedding_model():
+    """Load the shared embedding model once so the first chat does not pay for it."""
+    app.state.faiss_threads = configure_faiss_threads()
+    if not EMBEDDING_WARMUP:
+        return
+    try:
+        model_registry.warm_up()
+    except Exception as e:
+        print(f"Warning: Could not warm up embedding model: {e}")
+
+@app.on_event("startup")
+async def start_llm_health_checks():
+    """Probe the LLM endpoints in the background so dead ones are taken out (and back in) without player traffic."""
+    app.state.llm_health_checks = asyncio.create_task(phi2_model.run_health_checks())
+
+@app.on_event("shutdown")
+async def flush_caches():
+    """Stop index builds, persist cached embeddings, close LLM connections and stop the chat executors."""
+    app.state.llm_health_checks.cancel()
+    build_jobs.shutdown()
+    flush_embedding_caches()
+    await phi2_model.aclose()
+    executors.shutdown()
+
 # Pydantic models
 class UniverseCreate(BaseModel):
     universe_name: str
@@ -225,56 +262,138 @@ async def rebuild_character_registry_endpoint(universe_name: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 # Index building endpoints
-@app.post("/api/universes/{universe_name}/build-index")
-async def build_universe_index_endpoint(universe_name: str):
-    """Build FAISS index for a specific universe."""
+@app.post("/api/universes/{universe_name}/build-index", status_code=202)
+async def build_universe_index_endpoint(universe_name: str, full_rebuild: bool = False):
+    """Queue a FAISS index build for a universe (only changed chunks are re-embedded).
+    
+    Chats keep being answered from the current index until the build is published.
+    """
+    if universe_name not in list_universes():
+        raise HTTPException(status_code=404, detail=f"Universe '{universe_name}' not found")
     try:
-        chunk_count = build_universe_index(universe_name)
-        return {"message": f"FAISS index built for '{universe_name}' with {chunk_count} chunks"}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        job, created = build_jobs.submit(universe_name, full_rebuild=full_rebuild)
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    message = "Index build queued" if created else "Index build already in progress"
+    return {"message": f"{message} for '{universe_name}'", "job": job}
 
-@app.post("/api/build-all-indices")
-async def build_all_indices_endpoint():
-    """Build FAISS indices for all universes."""
-    try:
-        build_all_universe_indices()
-        return {"message": "FAISS indices built for all universes"}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+@app.post("/api/build-all-indices", status_code=202)
+async def build_all_indices_endpoint(full_rebuild: bool = False):
+    """Queue FAISS index builds for all universes."""
+    jobs = []
+    for universe_name in list_universes():
+        try:
+            job, _ = build_jobs.submit(universe_name, full_rebuild=full_rebuild)
+        except QueueFullError as e:
+            raise HTTPException(status_code=429, detail=str(e))
+        jobs.append(job)
+    return {"message": f"Queued index builds for {len(jobs)} universes", "jobs": jobs}
+
+@app.get("/api/build-jobs")
+async def list_build_jobs():
+    """List index build jobs, newest first."""
+    return {"jobs": build_jobs.list_jobs()}
+
+@app.get("/api/build-jobs/{job_id}")
+async def get_build_job(job_id: str):
+    """Get the status and progress of an index build job."""
+    job = build_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Build job '{job_id}' not found")
+    return job
+
+@app.post("/api/build-jobs/{job_id}/cancel")
+async def cancel_build_job(job_id: str):
+    """Cancel a queued or running index build; the published index is left untouched."""
+    job = build_jobs.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Build job '{job_id}' not found")
+    return job
+
+def chat_response(request: ChatRequest, character_data: dict, result: dict) -> dict:
+    """Response body of a chat turn."""
+    if request.debug:
+        return {
+            "response": result["response"],
+            "character": character_data["name"],
+            "universe": request.universe,
+            "character_updated": result.get("character_updated", False),
+            "emotion_changes": result.get("emotion_changes", {}),
+            "inventory_changes": result.get("inventory_changes", {}),
+            "debug_info": result["debug_info"]
+        }
+    else:
+        return {
+            "response": result["response"],
+            "character": character_data["name"],
+            "universe": request.universe,
+            "character_updated": result.get("character_updated", False),
+            "emotion_changes": result.get("emotion_changes", {}),
+            "inventory_changes": result.get("inventory_changes", {})
+        }
+
+async def encode_query(query: str):
+    """Vector of a chat query, or None when retrieval should not wait for one.
+
+    Lexical retrieval needs no vector, and while the embedding model is still
+    loading the retriever falls back to lexical search instead.
+    """
+    if RETRIEVAL_MODE == "lexical" or not model_registry.is_loaded(MODEL_NAME):
+        return None
+    # Concurrent chats share one encode call through the micro-batcher
+    return await embedding_batcher.encode(query)
 
 # Chat endpoint
 @app.post("/api/chat")
 async def chat(request: ChatRequest):
     """Chat with a character using RAG with conversation history and dynamic state changes."""
     try:
-        character_data = get_character_by_name(request.universe, request.character_name)
+        character_data = await executors.run("io", get_character_by_name, request.universe, request.character_name)
         character = Character(character_data)
-        result = answer_question(request.query, request.universe, character, debug=request.debug)
-        
-        if request.debug:
-            return {
-                "response": result["response"],
-                "character": character_data["name"],
-                "universe": request.universe,
-                "character_updated": result.get("character_updated", False),
-                "emotion_changes": result.get("emotion_changes", {}),
-                "inventory_changes": result.get("inventory_changes", {}),
-                "debug_info": result["debug_info"]
-            }
-        else:
-            return {
-                "response": result["response"],
-                "character": character_data["name"],
-                "universe": request.universe,
-                "character_updated": result.get("character_updated", False),
-                "emotion_changes": result.get("emotion_changes", {}),
-                "inventory_changes": result.get("inventory_changes", {})
-            }
+        query_vector = await encode_query(request.query)
+        result = await answer_question_async(request.query, request.universe, character, debug=request.debug,
+                                             query_vector=query_vector)
+        return chat_response(request, character_data, result)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+# Streaming chat endpoint
+@app.post("/api/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """Chat like /api/chat, streaming the reply as Server-Sent Events.
+
+    Sends a ``token`` event ({"text": ...}) for every piece of the reply as the
+    LLM generates it, then a ``done`` event with the /api/chat response body,
+    or an ``error`` event ({"detail": ...}).
+    """
+    try:
+        character_data = await executors.run("io", get_character_by_name, request.universe, request.character_name)
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    character = Character(character_data)
+
+    async def events():
+        try:
+            query_vector = await encode_query(request.query)
+            async for kind, data in stream_answer(request.query, request.universe, character, debug=request.debug,
+                                                  query_vector=query_vector):
+                if kind == "token":
+                    yield sse_event("token", {"text": data})
+                else:
+                    yield sse_event("done", chat_response(request, character_data, data))
+        except Exception as e:
+            yield sse_event("error", {"detail": str(e)})
+
+    # no-transform keeps compressing proxies (e.g. the frontend dev server) from buffering the stream
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache, no-transform", "X-Accel-Buffering": "no"})
 
 # Clear conversation endpoint
 @app.post("/api/chat/clear")
@@ -301,5 +420,26 @@ async def get_character_events_endpoint(universe_name: str, character_name: str,
 async def health_check():
     return {"status": "healthy"}
 
+# Runtime metrics
+@app.get("/api/metrics")
+async def get_metrics():
+    """Get load times, memory usage and cache statistics of the retrieval stack and LLM client."""
+    return {
+        "embedding_models": model_registry.get_stats(),
+        "index_cache": index_cache.get_stats(),
+        "embedding_cache": get_embedding_cache_stats(),
+        "query_cache": query_cache.get_stats(),
+        "embedding_batcher": embedding_batcher.get_stats(),
+        "build_jobs": build_jobs.get_stats(),
+        "llm": phi2_model.get_stats(),
+        "executors": executors.get_stats(),
+        "faiss_threads": getattr(app.state, "faiss_threads", None),
+        "process": memory_usage()
+    }
+
 if __name__ == "__main__":
-    uvicorn.run(app, host=API_HOST, port=API_PORT) 
\ No newline at end of file
+    if API_WORKERS > 1:
+        # Multiple workers need an import string so each process can load the app
+        uvicorn.run("app.api:app", host=API_HOST, port=API_PORT, workers=API_WORKERS)
+    else:
+        uvicorn.run(app, host=API_HOST, port=API_PORT) 
\ No newline at end of file
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Recall/latency benchmark for the retrieval index configurations.
+
+Builds every index type FaissManager supports on a universe's chunks (or a
+synthetic corpus), measures recall@k against the exact IndexFlatL2 baseline,
+p50/p99 single-query latency, build time and resident memory, and writes a
+JSON report.
+"""
+
+import argparse
+import json
+import time
+from datetime import datetime
+from pathlib import Path
+
+import faiss
+import numpy as np
+
+from app.faiss_manager import (
+    INDEX_TYPES, apply_search_params, build_index, choose_index_config, configure_faiss_threads
+)
+from app.utils.memory import current_rss_bytes, format_bytes
+
+REPORTS_DIR = Path("reports") / "benchmarks"
+
+
+def load_universe_vectors(universe: str) -> np.ndarray:
+    """Embed the chunks of a universe (served from the embedding cache when possible)."""
+    from app.chunk_store import open_chunks
+    from app.embedding_cache import cached_encode
+    from app.model_registry import get_embedding_model
+    from app.snapshots import current_snapshot_dir
+    from config.settings import EMBEDDING_MODEL
+
+    chunks = [c for c in open_chunks(current_snapshot_dir(universe)) if c]
+    model = get_embedding_model(EMBEDDING_MODEL)
+    return cached_encode(model, chunks, EMBEDDING_MODEL, show_progress_bar=True)
+
+
+def synthetic_vectors(n: int, dim: int, clusters: int = 100, seed: int = 0) -> np.ndarray:
+    """Clustered gaussian vectors, closer to real embeddings than uniform noise."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, clusters, n)
+    vectors = centers[labels] + 0.3 * rng.standard_normal((n, dim)).astype(np.float32)
+    return np.ascontiguousarray(vectors, dtype=np.float32)
+
+
+def recall_at_k(found: np.ndarray, exact: np.ndarray) -> float:
+    """Mean fraction of the exact top-k that the index returned."""
+    k = exact.shape[1]
+    hits = sum(len(set(f[f >= 0]) & set(e)) for f, e in zip(found, exact))
+    return hits / (len(exact) * k)
+
+
+def measure_latency(index, queries: np.ndarray, k: int) -> dict:
+    """Time single-query searches, the way /api/chat issues them."""
+    timings = []
+    for i in range(len(queries)):
+        start = time.perf_counter()
+        index.search(queries[i:i + 1], k)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings = np.array(timings)
+    return {
+        "p50_ms": round(float(np.percentile(timings, 50)), 4),
+        "p99_ms": round(float(np.percentile(timings, 99)), 4),
+        "mean_ms": round(float(timings.mean()), 4),
+    }
+
+
+def benchmark_config(vectors, queries, exact_ids, k, config, sweep) -> list:
+    """Build one index type and evaluate it for each search-parameter setting."""
+    rss_before = current_rss_bytes()
+    start = time.perf_counter()
+    index = build_index(vectors, config)
+    build_seconds = time.perf_counter() - start
+    rss_delta = max(current_rss_bytes() - rss_before, 0)
+    index_bytes = int(faiss.serialize_index(index).nbytes)
+
+    results = []
+    for params in sweep or [{}]:
+        run_config = dict(config, **params)
+        apply_search_params(index, run_config)
+        _, found = index.search(queries, k)
+        result = {
+            "type": config["type"],
+            "factory": config["factory"],
+            "search_params": {key: run_config[key] for key in ("nprobe", "ef_search") if key in run_config},
+            "recall_at_k": round(recall_at_k(found, exact_ids), 4),
+            "build_seconds": round(build_seconds, 3),
+            "index_bytes": index_bytes,
+            "rss_delta_bytes": rss_delta,
+        }
+        result.update(measure_latency(index, queries, k))
+        results.append(result)
+    del index
+    return results
+
+
+def run_benchmark(vectors: np.ndarray, queries: np.ndarray, k: int = 5, index_types=None,
+                  nprobe_values=None, ef_search_values=None) -> dict:
+    """Benchmark every requested index type against the exact flat baseline."""
+    n, dim = vectors.shape
+    exact = faiss.IndexFlatL2(dim)
+    exact.add(vectors)
+    _, exact_ids = exact.search(queries, k)
+    baseline = {"type": "exact", "factory": "IndexFlatL2", "recall_at_k": 1.0}
+    baseline.update(measure_latency(exact, queries, k))
+
+    results = [baseline]
+    for index_type in index_types or INDEX_TYPES:
+        config = choose_index_config(n, dim, index_type)
+        if config["type"] != index_type:
+            print(f"Skipping {index_type}: corpus too small ({n} vectors)")
+            continue
+        sweep = []
+        if "nprobe" in config and nprobe_values:
+            sweep = [{"nprobe": min(p, config["nlist"])} for p in nprobe_values]
+        elif "ef_search" in config and ef_search_values:
+            sweep = [{"ef_search": e} for e in ef_search_values]
+        print(f"Benchmarking {config['factory']}...")
+        results.extend(benchmark_config(vectors, queries, exact_ids, k, config, sweep))
+
+    return {
+        "created": datetime.now().isoformat(),
+        "vectors": n,
+        "dim": dim,
+        "queries": len(queries),
+        "k": k,
+        "faiss_threads": faiss.omp_get_max_threads(),
+        "results": results,
+    }
+
+
+def print_report(report: dict):
+    print(f"\n{report['vectors']} vectors x {report['dim']} dims, {report['queries']} queries, k={report['k']}")
+    print(f"{'index':<22}{'params':<18}{'recall':>8}{'p50 ms':>10}{'p99 ms':>10}{'build s':>10}{'size':>12}")
+    for r in report["results"]:
+        params = ",".join(f"{k}={v}" for k, v in r.get("search_params", {}).items())
+        size = format_bytes(r["index_bytes"]) if "index_bytes" in r else "-"
+        build = f"{r['build_seconds']:.2f}" if "build_seconds" in r else "-"
+        print(f"{r['factory']:<22}{params:<18}{r['recall_at_k']:>8.3f}{r['p50_ms']:>10.3f}"
+              f"{r['p99_ms']:>10.3f}{build:>10}{size:>12}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark retrieval index configurations")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--universe", "-u", help="Benchmark on a universe's indexed chunks")
+    source.add_argument("--synthetic", type=int, metavar="N", help="Benchmark on N synthetic vectors")
+    parser.add_argument("--dim", type=int, default=384, help="Dimension of synthetic vectors")
+    parser.add_argument("--queries", type=int, default=1000, help="Number of queries")
+    parser.add_argument("-k", type=int, default=5, help="Neighbours per query (recall@k)")
+    parser.add_argument("--types", default=",".join(INDEX_TYPES), help="Comma separated index types")
+    parser.add_argument("--nprobe", default="1,8,32,128", help="IVF nprobe values to sweep")
+    parser.add_argument("--ef-search", default="16,64,256", help="HNSW efSearch values to sweep")
+    parser.add_argument("--threads", type=int, default=0, help="FAISS OpenMP threads (default: FAISS_OMP_THREADS)")
+    parser.add_argument("--output", "-o", help="Report path (default: reports/benchmarks/<name>_<time>.json)")
+    args = parser.parse_args(argv)
+    configure_faiss_threads(args.threads or None)
+
+    rng = np.random.default_rng(1)
+    if args.universe:
+        vectors = load_universe_vectors(args.universe)
+        # Perturbed corpus vectors stand in for player queries
+        rows = rng.choice(len(vectors), min(args.queries, len(vectors)), replace=False)
+        queries = vectors[rows] + 0.05 * rng.standard_normal((len(rows), vectors.shape[1])).astype(np.float32)
+        name = args.universe.replace(" ", "_")
+    else:
+        vectors = synthetic_vectors(args.synthetic, args.dim)
+        queries = synthetic_vectors(args.queries, args.dim, seed=1)
+        name = f"synthetic_{args.synthetic}x{args.dim}"
+    queries = np.ascontiguousarray(queries, dtype=np.float32)
+
+    report = run_benchmark(
+        vectors, queries, k=args.k,
+        index_types=[t.strip() for t in args.types.split(",") if t.strip()],
+        nprobe_values=[int(v) for v in args.nprobe.split(",") if v],
+        ef_search_values=[int(v) for v in args.ef_search.split(",") if v],
+    )
+    report["source"] = args.universe or "synthetic"
+    print_report(report)
+
+    output = Path(args.output) if args.output else REPORTS_DIR / f"{name}_{datetime.now():%Y%m%d_%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n✅ Benchmark report written to {output}")
+    return report
+
+
+if __name__ == "__main__":
+    main()
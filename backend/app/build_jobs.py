@@ -0,0 +1,310 @@
+# app/build_jobs.py
+"""
+Background index builds.
+
+Build requests become jobs that run on a small thread pool, so the API keeps
+answering chats (from the previously published snapshot) while a universe is
+re-embedded. Job state is mirrored to ``BUILD_JOBS_DIR`` so that every API
+worker process can report on, and cancel, any job.
+"""
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from app.universe_embedder import BuildCancelled, build_universe_index
+from config.settings import BUILD_WORKERS, BUILD_QUEUE_MAX, BUILD_JOBS_DIR
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+ACTIVE_STATES = (QUEUED, RUNNING)
+# Finished jobs remembered per process
+JOB_HISTORY = 100
+# Minimum seconds between progress writes to the job file
+PROGRESS_SAVE_INTERVAL = 1.0
+
+
+class QueueFullError(Exception):
+    """Raised when too many builds are already waiting."""
+
+
+def _pid_alive(pid) -> bool:
+    """Whether the worker process that wrote a job file is still running."""
+    if not isinstance(pid, int):
+        return False
+    if os.name == "nt":
+        # os.kill would terminate the process here
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class _CancelFlag:
+    """Cancellation signal, set in this process or by a cancel file written by another worker."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.event = threading.Event()
+
+    def set(self):
+        self.event.set()
+
+    def is_set(self) -> bool:
+        return self.event.is_set() or self.path.exists()
+
+
+@dataclass
+class BuildJob:
+    """One index build request and its progress."""
+    id: str
+    universe: str
+    full_rebuild: bool
+    cancel_flag: _CancelFlag = field(repr=False)
+    status: str = QUEUED
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    chunks_embedded: int = 0
+    chunks_to_embed: int = 0
+    chunk_count: Optional[int] = None
+    error: Optional[str] = None
+    future: Optional[Future] = field(default=None, repr=False)
+    last_saved: float = field(default=0.0, repr=False)
+
+    def to_dict(self) -> dict:
+        end = self.finished_at or time.time()
+        elapsed = end - self.started_at if self.started_at else 0.0
+        return {
+            "job_id": self.id,
+            "universe": self.universe,
+            "full_rebuild": self.full_rebuild,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "elapsed_seconds": round(elapsed, 3),
+            "chunks_embedded": self.chunks_embedded,
+            "chunks_to_embed": self.chunks_to_embed,
+            "chunks_per_second": round(self.chunks_embedded / elapsed, 2) if elapsed else 0.0,
+            "chunk_count": self.chunk_count,
+            "error": self.error,
+            "pid": os.getpid(),
+        }
+
+
+class BuildJobQueue:
+    """Bounded pool of index build workers with de-duplication per universe."""
+
+    def __init__(self, max_workers: int = BUILD_WORKERS, max_queued: int = BUILD_QUEUE_MAX,
+                 jobs_dir: Path = BUILD_JOBS_DIR, builder=build_universe_index):
+        self.max_workers = max(1, max_workers)
+        self.max_queued = max_queued
+        self.jobs_dir = Path(jobs_dir)
+        self._builder = builder
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="index-build")
+        self._jobs: "OrderedDict[str, BuildJob]" = OrderedDict()
+        self._active: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def _job_path(self, job_id: str) -> Path:
+        return self.jobs_dir / f"{job_id}.json"
+
+    def _save(self, job: BuildJob):
+        """Mirror the job state to disk so other worker processes can read it."""
+        self.jobs_dir.mkdir(parents=True, exist_ok=True)
+        path = self._job_path(job.id)
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(job.to_dict(), f)
+        os.replace(tmp_path, path)
+        job.last_saved = time.monotonic()
+
+    def _read(self, job_id: str) -> Optional[dict]:
+        if not re.fullmatch(r"[0-9a-f]{32}", job_id):
+            return None
+        try:
+            with open(self._job_path(job_id), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    @contextmanager
+    def _file_lock(self, universe: str, suffix: str):
+        if fcntl is None:
+            yield
+            return
+        self.jobs_dir.mkdir(parents=True, exist_ok=True)
+        slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", universe)
+        with open(self.jobs_dir / f"{slug}{suffix}", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _universe_lock(self, universe: str):
+        """Serialize builds of one universe across worker processes."""
+        return self._file_lock(universe, ".lock")
+
+    def _submit_lock(self, universe: str):
+        """Serialize submits of one universe across worker processes (held briefly, unlike the build lock)."""
+        return self._file_lock(universe, ".submit.lock")
+
+    def _find_active(self, universe: str) -> Optional[dict]:
+        """An active job of the universe owned by another live worker process."""
+        if not self.jobs_dir.exists():
+            return None
+        for path in self.jobs_dir.glob("*.json"):
+            data = self._read(path.stem)
+            if (data is not None and data["universe"] == universe and data["status"] in ACTIVE_STATES
+                    and data.get("pid") != os.getpid() and _pid_alive(data.get("pid"))):
+                return data
+        return None
+
+    def submit(self, universe: str, full_rebuild: bool = False):
+        """Queue a build. Returns (job dict, created); an active build of the same universe is reused,
+        whichever worker process queued it."""
+        with self._submit_lock(universe):
+            with self._lock:
+                active_id = self._active.get(universe)
+                if active_id is not None:
+                    return self._jobs[active_id].to_dict(), False
+            active = self._find_active(universe)
+            if active is not None:
+                return active, False
+            with self._lock:
+                queued = sum(1 for job in self._jobs.values() if job.status == QUEUED)
+                if queued >= self.max_queued:
+                    raise QueueFullError(f"{queued} index builds are already queued")
+                job_id = uuid.uuid4().hex
+                job = BuildJob(job_id, universe, full_rebuild, _CancelFlag(self.jobs_dir / f"{job_id}.cancel"))
+                self._jobs[job.id] = job
+                self._active[universe] = job.id
+                self._prune()
+            # Written before the submit lock is released, so other workers see it
+            self._save(job)
+        job.future = self._executor.submit(self._run, job)
+        return job.to_dict(), True
+
+    def _prune(self):
+        """Forget the oldest finished jobs beyond JOB_HISTORY (caller holds the lock)."""
+        finished = [job for job in self._jobs.values() if job.status not in ACTIVE_STATES]
+        for job in finished[:max(0, len(finished) - JOB_HISTORY)]:
+            del self._jobs[job.id]
+            self._job_path(job.id).unlink(missing_ok=True)
+
+    def _progress(self, job: BuildJob, done: int, total: int):
+        job.chunks_embedded, job.chunks_to_embed = done, total
+        if time.monotonic() - job.last_saved >= PROGRESS_SAVE_INTERVAL:
+            self._save(job)
+
+    def _run(self, job: BuildJob):
+        if job.cancel_flag.is_set():
+            self._finish(job, CANCELLED)
+            return
+        job.status = RUNNING
+        job.started_at = time.time()
+        self._save(job)
+        try:
+            with self._universe_lock(job.universe):
+                job.chunk_count = self._builder(
+                    job.universe, full_rebuild=job.full_rebuild,
+                    progress=lambda done, total: self._progress(job, done, total),
+                    cancel_event=job.cancel_flag,
+                )
+            self._finish(job, SUCCEEDED)
+        except BuildCancelled:
+            print(f"Index build {job.id} for {job.universe} cancelled")
+            self._finish(job, CANCELLED)
+        except Exception as e:
+            print(f"❌ Index build {job.id} for {job.universe} failed: {e}")
+            self._finish(job, FAILED, str(e))
+
+    def _finish(self, job: BuildJob, status: str, error: str = None):
+        job.status = status
+        job.error = error
+        job.finished_at = time.time()
+        with self._lock:
+            if self._active.get(job.universe) == job.id:
+                del self._active[job.universe]
+        self._save(job)
+        job.cancel_flag.path.unlink(missing_ok=True)
+
+    def get(self, job_id: str) -> Optional[dict]:
+        """Status of a job, whichever worker process runs it."""
+        job = self._jobs.get(job_id)
+        return job.to_dict() if job is not None else self._read(job_id)
+
+    def list_jobs(self) -> List[dict]:
+        """Every known job, newest first."""
+        jobs = {}
+        if self.jobs_dir.exists():
+            for path in self.jobs_dir.glob("*.json"):
+                data = self._read(path.stem)
+                if data is not None:
+                    jobs[data["job_id"]] = data
+        for job in list(self._jobs.values()):
+            jobs[job.id] = job.to_dict()
+        return sorted(jobs.values(), key=lambda j: j["created_at"], reverse=True)
+
+    def cancel(self, job_id: str) -> Optional[dict]:
+        """Cancel a queued or running job. Running builds stop at the next encode batch."""
+        job = self._jobs.get(job_id)
+        if job is None:
+            data = self._read(job_id)
+            if data is not None and data["status"] in ACTIVE_STATES:
+                # Owned by another worker process, which polls for this file
+                (self.jobs_dir / f"{job_id}.cancel").touch()
+                data["cancel_requested"] = True
+            return data
+        if job.status in ACTIVE_STATES:
+            job.cancel_flag.set()
+            if job.future is not None and job.future.cancel():
+                self._finish(job, CANCELLED)
+        return dict(job.to_dict(), cancel_requested=job.status in ACTIVE_STATES)
+
+    def shutdown(self):
+        """Cancel outstanding builds and stop the worker threads."""
+        for job in list(self._jobs.values()):
+            if job.status in ACTIVE_STATES:
+                job.cancel_flag.set()
+                if job.future is not None and job.future.cancel():
+                    self._finish(job, CANCELLED)
+        self._executor.shutdown(wait=False)
+
+    def get_stats(self) -> dict:
+        jobs = list(self._jobs.values())
+        return {
+            "workers": self.max_workers,
+            "max_queued": self.max_queued,
+            "queued": sum(1 for job in jobs if job.status == QUEUED),
+            "running": sum(1 for job in jobs if job.status == RUNNING),
+            "succeeded": sum(1 for job in jobs if job.status == SUCCEEDED),
+            "failed": sum(1 for job in jobs if job.status == FAILED),
+            "cancelled": sum(1 for job in jobs if job.status == CANCELLED),
+        }
+
+
+# Global build queue instance
+build_jobs = BuildJobQueue()
@@ -0,0 +1,112 @@
+# app/chunk_metadata.py
+"""
+Per-chunk tags (chunk type, owning character, location, faction) stored next to
+a universe's index, so retrieval can be scoped to e.g. "lore plus this character".
+
+Tags are kept column-wise: for every field a list of distinct values and one
+small integer code per chunk store slot (-1 = untagged). Id sets per tag value
+are computed on first use and cached.
+"""
+import json
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+TAG_FIELDS = ("type", "character", "location", "faction")
+METADATA_FILE = "chunk_metadata.json"
+
+
+class ChunkMetadata:
+    """Column-wise tags for every chunk store slot (slot == FAISS id)."""
+
+    def __init__(self, values: Dict[str, List[str]], codes: Dict[str, np.ndarray]):
+        self.values = values
+        self.codes = codes
+        self._ids: Dict[tuple, np.ndarray] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(next(iter(self.codes.values()))) if self.codes else 0
+
+    @classmethod
+    def build(cls, tags: Iterable[Optional[dict]]) -> "ChunkMetadata":
+        """Build from one tag dict per slot (None for empty slots)."""
+        values = {name: [] for name in TAG_FIELDS}
+        lookup = {name: {} for name in TAG_FIELDS}
+        codes = {name: [] for name in TAG_FIELDS}
+        for slot_tags in tags:
+            slot_tags = slot_tags or {}
+            for name in TAG_FIELDS:
+                value = slot_tags.get(name)
+                if value is None:
+                    codes[name].append(-1)
+                    continue
+                code = lookup[name].get(value)
+                if code is None:
+                    code = lookup[name][value] = len(values[name])
+                    values[name].append(value)
+                codes[name].append(code)
+        return cls(values, {name: np.array(c, dtype=np.int32) for name, c in codes.items()})
+
+    def get(self, chunk_id: int) -> dict:
+        """Tags of one chunk."""
+        tags = {}
+        for name in TAG_FIELDS:
+            code = int(self.codes[name][chunk_id]) if chunk_id < len(self) else -1
+            tags[name] = self.values[name][code] if code >= 0 else None
+        return tags
+
+    def ids_for(self, name: str, value: str) -> np.ndarray:
+        """Sorted ids of the chunks whose ``name`` tag equals ``value``."""
+        key = (name, value)
+        ids = self._ids.get(key)
+        if ids is None:
+            try:
+                code = self.values[name].index(value)
+                ids = np.flatnonzero(self.codes[name] == code).astype(np.int64)
+            except ValueError:
+                ids = np.empty(0, dtype=np.int64)
+            with self._lock:
+                self._ids[key] = ids
+        return ids
+
+    def select(self, scope: List[dict]) -> np.ndarray:
+        """Sorted ids matching any of the tag dicts in ``scope``.
+
+        Within one dict every tag must match (AND); e.g.
+        ``[{"type": "lore"}, {"character": "Kael Vire"}]`` is all lore plus
+        every chunk about Kael Vire.
+        """
+        selected = []
+        for clause in scope:
+            ids = None
+            for name, value in clause.items():
+                if name not in TAG_FIELDS:
+                    raise ValueError(f"Unknown chunk tag '{name}', expected one of {TAG_FIELDS}")
+                matches = self.ids_for(name, value)
+                ids = matches if ids is None else np.intersect1d(ids, matches, assume_unique=True)
+            if ids is not None:
+                selected.append(ids)
+        if not selected:
+            return np.empty(0, dtype=np.int64)
+        return np.unique(np.concatenate(selected))
+
+    def save(self, index_dir: Path):
+        with open(Path(index_dir) / METADATA_FILE, "w", encoding="utf-8") as f:
+            json.dump({
+                "fields": {name: {"values": self.values[name], "codes": self.codes[name].tolist()}
+                           for name in TAG_FIELDS}
+            }, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, index_dir: Path) -> "ChunkMetadata":
+        with open(Path(index_dir) / METADATA_FILE, "r", encoding="utf-8") as f:
+            fields = json.load(f)["fields"]
+        return cls({name: fields[name]["values"] for name in TAG_FIELDS},
+                   {name: np.array(fields[name]["codes"], dtype=np.int32) for name in TAG_FIELDS})
+
+    @staticmethod
+    def exists(index_dir: Path) -> bool:
+        return (Path(index_dir) / METADATA_FILE).exists()
@@ -0,0 +1,191 @@
+# app/chunk_store.py
+"""
+Binary, offset-indexed chunk store.
+
+Layout (all integers little-endian uint64):
+
+    magic "PFCHUNK1" | count | offsets[count + 1] | UTF-8 payload
+
+Chunk ``i`` is ``payload[offsets[i]:offsets[i + 1]]``. The file is opened with
+mmap, so looking up a chunk by FAISS id is O(1) and only touches the pages of
+that one slice, no matter how many chunks the universe has.
+"""
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from array import array
+from pathlib import Path
+from typing import Iterable, List, Union
+
+MAGIC = b"PFCHUNK1"
+HEADER = struct.Struct("<8sQ")
+OFFSET = struct.Struct("<Q")
+OFFSET_PAIR = struct.Struct("<QQ")
+LEGACY_SEPARATOR = "\n---\n"
+
+
+class ChunkStore:
+    """Read-only, memory-mapped view of a chunk store file."""
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, count = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            self._mm.close()
+            raise ValueError(f"{self.path} is not a chunk store file")
+        self._count = count
+        self._offsets_start = HEADER.size
+        self._payload_start = HEADER.size + OFFSET.size * (count + 1)
+        self._view = memoryview(self._mm)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _span(self, i: int):
+        if i < 0:
+            i += self._count
+        if not 0 <= i < self._count:
+            raise IndexError(f"chunk id {i} out of range (store has {self._count} chunks)")
+        start, end = OFFSET_PAIR.unpack_from(self._mm, self._offsets_start + OFFSET.size * i)
+        return self._payload_start + start, self._payload_start + end
+
+    def get_bytes(self, i: int) -> memoryview:
+        """Zero-copy view of the UTF-8 bytes of chunk ``i``."""
+        start, end = self._span(i)
+        return self._view[start:end]
+
+    def __getitem__(self, i: int) -> str:
+        start, end = self._span(i)
+        return str(self._view[start:end], "utf-8")
+
+    def get_many(self, ids: Iterable[int]) -> List[str]:
+        """Decode only the requested chunks."""
+        return [self[int(i)] for i in ids]
+
+    def __iter__(self):
+        for i in range(self._count):
+            yield self[i]
+
+    def close(self):
+        try:
+            self._view.release()
+            self._mm.close()
+        except BufferError:
+            # Callers still hold zero-copy slices; the mapping goes away with them
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ChunkStoreWriter:
+    """Append chunks one at a time and publish the store atomically on close.
+
+    The payload is spooled to a temporary file, so only the offset table
+    (8 bytes per chunk) is kept in memory while writing.
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._offsets = array("Q", [0])
+        self._payload = tempfile.TemporaryFile(dir=self.path.parent)
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def append(self, text: str) -> int:
+        """Add a chunk and return its id."""
+        data = text.encode("utf-8")
+        self._payload.write(data)
+        self._offsets.append(self._offsets[-1] + len(data))
+        return len(self._offsets) - 2
+
+    def extend(self, texts: Iterable[str]):
+        for text in texts:
+            self.append(text)
+
+    def close(self):
+        """Write header, offset table and payload, then swap the file into place."""
+        fd, tmp_path = tempfile.mkstemp(dir=self.path.parent, prefix=".chunks-", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                out.write(HEADER.pack(MAGIC, len(self)))
+                if self._offsets.itemsize != OFFSET.size or sys.byteorder != "little":
+                    out.write(b"".join(OFFSET.pack(o) for o in self._offsets))
+                else:
+                    out.write(self._offsets.tobytes())
+                self._payload.seek(0)
+                while True:
+                    block = self._payload.read(1 << 20)
+                    if not block:
+                        break
+                    out.write(block)
+            os.replace(tmp_path, self.path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        finally:
+            self._payload.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._payload.close()
+
+
+def write_chunk_store(path: Union[str, Path], chunks: Iterable[str]) -> int:
+    """Write chunks to a new chunk store file. Returns the number of chunks written."""
+    with ChunkStoreWriter(path) as writer:
+        writer.extend(chunks)
+        return len(writer)
+
+
+def read_legacy_chunks(txt_path: Union[str, Path]) -> List[str]:
+    """Parse a legacy ``chunks.txt`` file written with ``---`` separators."""
+    with open(txt_path, "r", encoding="utf-8") as f:
+        chunks = f.read().split(LEGACY_SEPARATOR)
+    # Every chunk was written with a trailing separator, so the last item is empty
+    if chunks and chunks[-1] == "":
+        chunks.pop()
+    return chunks
+
+
+def convert_chunks_txt(txt_path: Union[str, Path], out_path: Union[str, Path] = None) -> Path:
+    """Convert a legacy ``chunks.txt`` into a ``chunks.bin`` store next to it."""
+    txt_path = Path(txt_path)
+    out_path = Path(out_path) if out_path else txt_path.with_name("chunks.bin")
+    count = write_chunk_store(out_path, read_legacy_chunks(txt_path))
+    print(f"✅ Converted {count} chunks from {txt_path} to {out_path}")
+    return out_path
+
+
+def open_chunks(index_dir: Union[str, Path]):
+    """Open the chunk store of an index directory, falling back to a legacy chunks.txt."""
+    index_dir = Path(index_dir)
+    bin_path = index_dir / "chunks.bin"
+    if bin_path.exists():
+        return ChunkStore(bin_path)
+    txt_path = index_dir / "chunks.txt"
+    if txt_path.exists():
+        return read_legacy_chunks(txt_path)
+    raise FileNotFoundError(f"No chunk store found in {index_dir}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python -m app.chunk_store <chunks.txt> [chunks.bin]")
+        sys.exit(1)
+    convert_chunks_txt(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else None)
@@ -11,6 +11,7 @@ from pathlib import Path
 from app.character_manager import CharacterManager
 from app.universe_manager import list_universes, create_character_registry
 from app.universe_embedder import build_universe_index, build_all_universe_indices
+from app.chunk_store import convert_chunks_txt
 
 
 def character_cli():
@@ -87,10 +88,14 @@ def universe_cli():
     """Universe management CLI commands."""
     parser = argparse.ArgumentParser(description="Universe Management Commands")
     parser.add_argument("action", choices=[
-        "list", "build-index", "build-all-indices"
+        "list", "build-index", "build-all-indices", "convert-chunks", "benchmark", "worker-memory"
     ], help="Action to perform")
     parser.add_argument("--universe", "-u", 
-                       help="Universe name (for build-index)")
+                       help="Universe name (for build-index / convert-chunks / benchmark / worker-memory)")
+    parser.add_argument("--full", action="store_true",
+                       help="Re-embed every chunk instead of only the changed ones")
+    parser.add_argument("--workers", "-w", type=int, default=None,
+                       help="Worker processes for build-all-indices (0 = one per core, default: BUILD_PROCESSES)")
     
     args = parser.parse_args()
     
@@ -108,17 +113,45 @@ def universe_cli():
             print("❌ Universe name required for build-index action")
             return
         try:
-            chunk_count = build_universe_index(args.universe)
+            chunk_count = build_universe_index(args.universe, full_rebuild=args.full)
             print(f"✅ FAISS index built for '{args.universe}' with {chunk_count} chunks")
         except Exception as e:
             print(f"❌ Error building index: {e}")
     
     elif args.action == "build-all-indices":
         try:
-            build_all_universe_indices()
+            if args.workers is None:
+                build_all_universe_indices(full_rebuild=args.full)
+            else:
+                build_all_universe_indices(full_rebuild=args.full, workers=args.workers)
             print("✅ FAISS indices built for all universes")
         except Exception as e:
             print(f"❌ Error building indices: {e}")
+    
+    elif args.action == "convert-chunks":
+        # Convert legacy chunks.txt files into the binary chunk store format
+        universes = [args.universe] if args.universe else list_universes()
+        for universe in universes:
+            txt_path = Path("data") / universe / "faiss_index" / "chunks.txt"
+            if not txt_path.exists():
+                print(f"⚠️  No chunks.txt found for '{universe}', skipping")
+                continue
+            try:
+                convert_chunks_txt(txt_path)
+            except Exception as e:
+                print(f"❌ Error converting chunks for '{universe}': {e}")
+    
+    elif args.action == "benchmark":
+        if not args.universe:
+            print("❌ Universe name required for benchmark action (use 'python -m app.benchmark --synthetic N' for synthetic data)")
+            return
+        from app.benchmark import main as benchmark_main
+        benchmark_main(["--universe", args.universe])
+    
+    elif args.action == "worker-memory":
+        # Per-worker RSS/PSS when several API workers serve the same indices
+        from app.worker_memory import main as worker_memory_main
+        worker_memory_main(["--universes", args.universe] if args.universe else [])
 
 
 def main():
@@ -137,6 +170,10 @@ Examples:
   python -m app.cli universe list
   python -m app.cli universe build-index --universe Mytherra
   python -m app.cli universe build-all-indices
+  python -m app.cli universe build-all-indices --workers 0
+  python -m app.cli universe convert-chunks --universe Mytherra
+  python -m app.cli universe benchmark --universe Mytherra
+  python -m app.cli universe worker-memory --universe Mytherra
         """
     )
     
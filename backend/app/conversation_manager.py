@@ -1,9 +1,11 @@
 # app/conversation_manager.py
-from typing import List, Dict, Optional, Tuple
+from typing import List, Dict, Tuple
 from dataclasses import dataclass
 from datetime import datetime
 import json
+import os
 import re
+import threading
 from pathlib import Path
 from app.character import Character
 from app.universe_manager import save_character
@@ -32,6 +34,10 @@ class ConversationManager:
         self.max_events = max_events
         self.conversations: Dict[str, List[Message]] = {}
         self.character_events: Dict[str, List[CharacterEvent]] = {}
+        # Snapshots may be written from worker threads; never let an older one overwrite a newer one
+        self._write_lock = threading.Lock()
+        self._snapshot_seq = 0
+        self._written_seq = 0
         
     def get_conversation_key(self, character_name: str, universe: str) -> str:
         """Generate a unique key for each character conversation."""
@@ -248,9 +254,10 @@ class ConversationManager:
         return changes
     
     def apply_character_changes(self, character: Character, emotion_changes: dict, 
-                              inventory_changes: dict) -> bool:
+                              inventory_changes: dict, save: bool = True) -> bool:
         """
-        Apply detected changes to the character and save to file.
+        Apply detected changes to the character and save to file (unless save=False,
+        e.g. when the caller writes it off the event loop).
         Returns True if changes were made.
         """
         changes_made = False
@@ -306,28 +313,30 @@ class ConversationManager:
                         )
         
         # Save character changes if any were made
-        if changes_made:
-            try:
-                save_character(character.universe, character.name, character.to_dict())
-            except Exception as e:
-                print(f"Warning: Failed to save character changes: {e}")
+        if changes_made and save:
+            self.save_character_state(character)
         
         return changes_made
     
+    def save_character_state(self, character: Character):
+        """Write the character's current state to its universe file."""
+        try:
+            save_character(character.universe, character.name, character.to_dict())
+        except Exception as e:
+            print(f"Warning: Failed to save character changes: {e}")
+    
     def clear_conversation(self, character_name: str, universe: str):
         """Clear conversation history for a character."""
         key = self.get_conversation_key(character_name, universe)
         if key in self.conversations:
             del self.conversations[key]
     
-    def save_conversations(self, filepath: str = "data/conversations.json"):
-        """Save conversations to file."""
-        Path(filepath).parent.mkdir(parents=True, exist_ok=True)
-        
-        # Convert to serializable format
-        serializable = {}
-        for key, messages in self.conversations.items():
-            serializable[key] = [
+    def conversations_payload(self, conversations: Dict[str, List[Message]] = None) -> dict:
+        """Conversations (by default the current ones) in their JSON file format."""
+        if conversations is None:
+            conversations = self.conversations
+        return {
+            key: [
                 {
                     "role": msg.role,
                     "content": msg.content,
@@ -337,18 +346,15 @@ class ConversationManager:
                 }
                 for msg in messages
             ]
-        
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(serializable, f, indent=2, ensure_ascii=False)
+            for key, messages in conversations.items()
+        }
     
-    def save_character_events(self, filepath: str = "data/character_events.json"):
-        """Save character events to file."""
-        Path(filepath).parent.mkdir(parents=True, exist_ok=True)
-        
-        # Convert to serializable format
-        serializable = {}
-        for key, events in self.character_events.items():
-            serializable[key] = [
+    def character_events_payload(self, character_events: Dict[str, List[CharacterEvent]] = None) -> dict:
+        """Character events (by default the current ones) in their JSON file format."""
+        if character_events is None:
+            character_events = self.character_events
+        return {
+            key: [
                 {
                     "event_type": event.event_type,
                     "description": event.description,
@@ -359,9 +365,49 @@ class ConversationManager:
                 }
                 for event in events
             ]
+            for key, events in character_events.items()
+        }
+    
+    @staticmethod
+    def _write_json(filepath: str, data: dict):
+        """Write a JSON file atomically, so readers never see a half-written file."""
+        Path(filepath).parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = f"{filepath}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, filepath)
+    
+    def snapshot(self) -> dict:
+        """Copy conversations and events for write_snapshot, which may then run on another thread.
         
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(serializable, f, indent=2, ensure_ascii=False)
+        Only the message and event lists are copied (messages and events are
+        never changed once added); formatting and JSON encoding happen in
+        write_snapshot.
+        """
+        with self._write_lock:
+            self._snapshot_seq += 1
+            seq = self._snapshot_seq
+        return {"seq": seq,
+                "conversations": {key: list(messages) for key, messages in self.conversations.items()},
+                "events": {key: list(events) for key, events in self.character_events.items()}}
+    
+    def write_snapshot(self, snapshot: dict, conversations_path: str = "data/conversations.json",
+                       events_path: str = "data/character_events.json"):
+        """Persist a snapshot unless a newer one has been written already."""
+        with self._write_lock:
+            if snapshot["seq"] <= self._written_seq:
+                return
+            self._write_json(conversations_path, self.conversations_payload(snapshot["conversations"]))
+            self._write_json(events_path, self.character_events_payload(snapshot["events"]))
+            self._written_seq = snapshot["seq"]
+    
+    def save_conversations(self, filepath: str = "data/conversations.json"):
+        """Save conversations to file."""
+        self._write_json(filepath, self.conversations_payload())
+    
+    def save_character_events(self, filepath: str = "data/character_events.json"):
+        """Save character events to file."""
+        self._write_json(filepath, self.character_events_payload())
     
     def load_conversations(self, filepath: str = "data/conversations.json"):
         """Load conversations from file."""
@@ -1,33 +1,96 @@
 # app/embedder.py
-from sentence_transformers import SentenceTransformer
 import faiss
 import numpy as np
-from app.utils.loader import load_documents
-from app.utils.chunking import chunk_text
+import json
+from itertools import groupby
+from pathlib import Path
+from app.utils.loader import iter_documents, scan_documents
+from app.utils.chunking import default_chunker
+from app.model_registry import get_embedding_model
+from app.embedding_cache import flush_embedding_caches
+from app.chunk_store import ChunkStoreWriter, open_chunks
+from app.universe_embedder import encode_batches
+from config.settings import EMBEDDING_MODEL
 import os
 
-MODEL_NAME = "all-MiniLM-L6-v2"
+MODEL_NAME = EMBEDDING_MODEL
 INDEX_PATH = "data/index/faiss.index"
+CHUNK_STORE_PATH = "data/index/chunks.bin"
+DOCUMENT_MANIFEST_PATH = "data/index/documents.json"
 
-def build_and_save_index(data_dir="data/lore/"):
-    model = SentenceTransformer(MODEL_NAME)
-    docs = load_documents(data_dir)
-    
-    chunks = []
-    for doc in docs:
-        chunks.extend(chunk_text(doc))
+def load_document_manifest(model_name: str, dim: int):
+    """Previous build's documents and their chunk ids, if the index can be updated in place."""
+    if not (os.path.exists(DOCUMENT_MANIFEST_PATH) and os.path.exists(INDEX_PATH)):
+        return None, None
+    try:
+        with open(DOCUMENT_MANIFEST_PATH, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        index = faiss.read_index(INDEX_PATH)
+    except Exception as e:
+        print(f"Warning: Could not load previous index, rebuilding from scratch: {e}")
+        return None, None
+    if manifest.get("model") != model_name or manifest.get("dim") != dim or not isinstance(index, faiss.IndexIDMap2):
+        return None, None
+    return manifest, index
 
-    embeddings = model.encode(chunks, show_progress_bar=True)
+def build_and_save_index(data_dir="data/lore/", full_rebuild=False):
+    """
+    Embed the .txt and .pdf files of data_dir into the global index.
+    Files with the same size/mtime or content hash as in the previous build keep their
+    chunks; the others are streamed page by page through the chunker into the index.
+    """
+    model = get_embedding_model(MODEL_NAME)
+    dim = model.get_sentence_embedding_dimension()
 
-    dim = embeddings.shape[1]
-    index = faiss.IndexFlatL2(dim)
-    index.add(np.array(embeddings))
+    manifest, index = (None, None) if full_rebuild else load_document_manifest(MODEL_NAME, dim)
+    if index is None:
+        manifest = {"documents": {}, "next_id": 0}
+        index = faiss.IndexIDMap2(faiss.IndexFlatL2(dim))
+    previous = manifest["documents"]
+
+    changed, unchanged = scan_documents(data_dir, previous)
+    stale_ids = [chunk_id for doc_id, doc in previous.items() if doc_id not in unchanged for chunk_id in doc["ids"]]
+    if stale_ids:
+        index.remove_ids(np.array(stale_ids, dtype=np.int64))
+    print(f"{len(unchanged)} documents unchanged, {len(changed)} new or changed, "
+          f"{len(set(previous) - set(changed) - set(unchanged))} removed.")
 
     os.makedirs("data/index/", exist_ok=True)
-    faiss.write_index(index, INDEX_PATH)
+    documents = {doc_id: dict(signature, ids=previous[doc_id]["ids"]) for doc_id, signature in unchanged.items()}
+    writer = ChunkStoreWriter(CHUNK_STORE_PATH)
+    # Keep the slots of unchanged documents; slots of changed or removed ones stay empty
+    if manifest["next_id"]:
+        kept = {chunk_id for doc in documents.values() for chunk_id in doc["ids"]}
+        old_chunks = open_chunks(Path(CHUNK_STORE_PATH).parent)
+        writer.extend(old_chunks[i] if i in kept else "" for i in range(manifest["next_id"]))
+        old_chunks.close()
+
+    chunker = default_chunker(MODEL_NAME)
+
+    def new_chunks():
+        """(id, text) of every chunk of the changed documents, appended to the chunk store as they are cut."""
+        for doc_id, pages in groupby(iter_documents(data_dir, changed), key=lambda record: record.doc_id):
+            ids = []
+            documents[doc_id] = dict(changed[doc_id], ids=ids)
+            for chunk in chunker.chunk_stream(record.text for record in pages):
+                chunk_id = writer.append(chunk)
+                ids.append(chunk_id)
+                yield chunk_id, chunk
+
+    embedded = 0
+    for ids, vectors in encode_batches(model, new_chunks()):
+        index.add_with_ids(vectors, ids)
+        embedded += len(ids)
+    flush_embedding_caches()
+    # Documents without any text are remembered too, so they are not parsed again
+    for doc_id, signature in changed.items():
+        documents.setdefault(doc_id, dict(signature, ids=[]))
 
-    with open("data/index/chunks.txt", "w", encoding="utf-8") as f:
-        for chunk in chunks:
-            f.write(chunk + "\n---\n")
+    writer.close()
+    tmp_path = INDEX_PATH + ".tmp"
+    faiss.write_index(index, tmp_path)
+    os.replace(tmp_path, INDEX_PATH)
+    with open(DOCUMENT_MANIFEST_PATH, "w", encoding="utf-8") as f:
+        json.dump({"model": MODEL_NAME, "dim": dim, "next_id": len(writer), "documents": documents}, f)
 
-    print(f"✅ {len(chunks)} chunk embedded and saved to FAISS index.")
+    print(f"✅ {embedded} chunks embedded, {index.ntotal} in the FAISS index.")
@@ -0,0 +1,102 @@
+# app/embedding_batcher.py
+import asyncio
+import threading
+import time
+from typing import List, Tuple
+
+import numpy as np
+
+from app.executors import executors
+from app.retriever import MODEL_NAME, embed_queries, query_cache
+from config.settings import EMBEDDING_BATCH_MAX_SIZE, EMBEDDING_BATCH_MAX_WAIT_MS
+
+
+class EmbeddingBatcher:
+    """Coalesces concurrent query embeddings into a single ``encode`` call.
+
+    Queries are collected for up to ``max_wait_ms`` milliseconds or until
+    ``max_batch_size`` are waiting, encoded together on the ``embedding`` executor,
+    and each caller gets its own row back. The query cache is checked once, in
+    ``encode``, before a query joins a batch.
+    """
+
+    def __init__(self, model_name: str = MODEL_NAME, max_batch_size: int = EMBEDDING_BATCH_MAX_SIZE,
+                 max_wait_ms: float = EMBEDDING_BATCH_MAX_WAIT_MS):
+        self.model_name = model_name
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._timer = None
+        # Running batches; the event loop only keeps weak references to tasks
+        self._tasks = set()
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+        self.max_seen_batch = 0
+        self.total_encode_seconds = 0.0
+
+    async def encode(self, query: str) -> np.ndarray:
+        """Return the query embedding (shape: [1, dim])."""
+        vector = query_cache.get(self.model_name, query)
+        if vector is not None:
+            return vector
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((query, future))
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._run_batch(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run_batch(self, batch: List[Tuple[str, asyncio.Future]]):
+        texts = list(dict.fromkeys(query for query, _ in batch))
+        start = time.perf_counter()
+        try:
+            vectors = await executors.run("embedding", embed_queries, texts, self.model_name)
+        except BaseException as e:
+            # Also on cancellation, or the callers would wait forever
+            for _, future in batch:
+                if not future.done():
+                    if isinstance(e, asyncio.CancelledError):
+                        future.cancel()
+                    else:
+                        future.set_exception(e)
+            if not isinstance(e, Exception):
+                raise
+            return
+        with self._lock:
+            self.batches += 1
+            self.items += len(batch)
+            self.max_seen_batch = max(self.max_seen_batch, len(batch))
+            self.total_encode_seconds += time.perf_counter() - start
+        rows = {text: vectors[i:i + 1] for i, text in enumerate(texts)}
+        for query, future in batch:
+            if not future.done():
+                future.set_result(rows[query])
+
+    def get_stats(self) -> dict:
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "batches": self.batches,
+            "queries": self.items,
+            "avg_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "max_seen_batch": self.max_seen_batch,
+            "avg_encode_ms": round(self.total_encode_seconds * 1000 / self.batches, 3) if self.batches else 0.0,
+        }
+
+
+# Global batcher instance
+embedding_batcher = EmbeddingBatcher()
@@ -0,0 +1,331 @@
+# app/embedding_cache.py
+"""
+Persistent, content-addressed embedding cache shared across builds and universes.
+
+Vectors are stored per model in a memory-mapped matrix next to a table of
+16-byte text hashes, so the same chunk (or query) is only ever encoded once per
+model, no matter which universe or builder asks for it.
+
+Several processes can share a cache: writers take a file lock and rewrite a
+row by blanking its key, writing the vector, then writing the key, and readers
+check the key again after copying a vector. A shared generation counter tells
+each process which rows others changed since it last looked.
+"""
+import hashlib
+import json
+import re
+import shutil
+import threading
+import time
+import unicodedata
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+from config.settings import (
+    EMBEDDING_CACHE_ENABLED, EMBEDDING_CACHE_DIR, EMBEDDING_CACHE_MAX_ENTRIES, EMBEDDING_CACHE_DTYPE
+)
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+KEY_SIZE = 16
+EMPTY_KEY = bytes(KEY_SIZE)
+LAYOUT_VERSION = 2
+# Share of the capacity evicted at once when the cache is full
+EVICT_FRACTION = 1 / 64
+
+
+def normalize_text(text: str) -> str:
+    """Normalize unicode and whitespace so trivially different copies share an entry."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def text_key(text: str) -> bytes:
+    """16-byte hash of the normalized text."""
+    return hashlib.blake2b(normalize_text(text).encode("utf-8"), digest_size=KEY_SIZE).digest()
+
+
+class _FileLock:
+    """Advisory lock so several worker processes can write the same cache safely."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._file = None
+
+    def __enter__(self):
+        if fcntl is not None:
+            self._file = open(self.path, "a")
+            fcntl.flock(self._file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if self._file is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+
+
+class EmbeddingCache:
+    """Size-bounded embedding cache for one model, backed by memory-mapped files.
+
+    Once ``capacity`` is reached the least recently used rows are evicted in
+    batches and reused.
+    """
+
+    def __init__(self, model_name: str, dim: int, cache_dir: Path = None,
+                 capacity: int = EMBEDDING_CACHE_MAX_ENTRIES, dtype: str = EMBEDDING_CACHE_DTYPE):
+        self.model_name = model_name
+        self.dim = dim
+        self.capacity = capacity
+        self.dtype = np.dtype(dtype)
+        slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name)
+        self.dir = Path(cache_dir or EMBEDDING_CACHE_DIR) / slug
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._open()
+
+    def _open(self):
+        self.dir.mkdir(parents=True, exist_ok=True)
+        meta = {"model": self.model_name, "dim": self.dim, "dtype": self.dtype.name, "capacity": self.capacity,
+                "layout": LAYOUT_VERSION}
+        meta_path = self.dir / "meta.json"
+        with _FileLock(self.dir / ".lock"):
+            existing = None
+            if meta_path.exists():
+                try:
+                    with open(meta_path, "r", encoding="utf-8") as f:
+                        existing = json.load(f)
+                except (json.JSONDecodeError, OSError):
+                    existing = None
+            fresh = existing != meta
+            if fresh:
+                # Layout changed (or first use): start over
+                for name in ("vectors.dat", "keys.dat", "last_used.dat", "written.dat", "generation.dat"):
+                    (self.dir / name).unlink(missing_ok=True)
+                with open(meta_path, "w", encoding="utf-8") as f:
+                    json.dump(meta, f)
+            mode = "w+" if fresh else "r+"
+            self._vectors = np.memmap(self.dir / "vectors.dat", dtype=self.dtype, mode=mode,
+                                      shape=(self.capacity, self.dim))
+            self._keys = np.memmap(self.dir / "keys.dat", dtype=f"S{KEY_SIZE}", mode=mode,
+                                   shape=(self.capacity,))
+            self._last_used = np.memmap(self.dir / "last_used.dat", dtype=np.int64, mode=mode,
+                                        shape=(self.capacity,))
+            # Generation of the last write to each row, and the latest generation
+            self._written = np.memmap(self.dir / "written.dat", dtype=np.int64, mode=mode,
+                                      shape=(self.capacity,))
+            self._generation = np.memmap(self.dir / "generation.dat", dtype=np.int64, mode=mode, shape=(1,))
+        self._reload_rows()
+
+    def _key_at(self, row: int) -> bytes:
+        # numpy strips trailing NUL bytes from S-dtypes, so pad them back
+        return bytes(self._keys[row]).ljust(KEY_SIZE, b"\0")
+
+    def _reload_rows(self):
+        """Rebuild the in-memory hash -> row index from the keys table."""
+        self._seen = int(self._generation[0])
+        keys = np.asarray(self._keys)
+        self._row_keys: List[bytes] = [None] * self.capacity
+        self._rows: Dict[bytes, int] = {}
+        for row in np.flatnonzero(keys != b"").tolist():
+            key = self._key_at(row)
+            self._rows[key] = row
+            self._row_keys[row] = key
+        self._free: List[int] = np.flatnonzero(keys == b"")[::-1].tolist()
+
+    def _sync(self):
+        """Pick up rows other processes wrote or evicted since this one last looked."""
+        generation = int(self._generation[0])
+        if generation == self._seen:
+            return
+        filled, emptied = set(), []
+        for row in np.flatnonzero(np.asarray(self._written) > self._seen).tolist():
+            old = self._row_keys[row]
+            if old is not None and self._rows.get(old) == row:
+                del self._rows[old]
+            key = self._key_at(row)
+            if key == EMPTY_KEY:
+                self._row_keys[row] = None
+                emptied.append(row)
+            else:
+                self._row_keys[row] = key
+                self._rows[key] = row
+                filled.add(row)
+        if filled or emptied:
+            free = set(self._free)
+            self._free = [row for row in self._free if row not in filled]
+            self._free += [row for row in emptied if row not in free]
+        self._seen = generation
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def _row_for(self, key: bytes) -> int:
+        row = self._rows.get(key)
+        # Another process may have recycled the row since we indexed it
+        if row is not None and self._key_at(row) != key:
+            del self._rows[key]
+            return None
+        return row
+
+    def _evict(self, count: int) -> List[int]:
+        """Free the ``count`` least recently used rows in use (their keys are blanked)."""
+        last_used = np.array(self._last_used)
+        last_used[self._free] = np.iinfo(np.int64).max
+        rows = np.argpartition(last_used, count - 1)[:count].tolist()
+        for row in rows:
+            key = self._row_keys[row]
+            if key is not None and self._rows.get(key) == row:
+                del self._rows[key]
+            self._row_keys[row] = None
+        self._keys[rows] = b""
+        # Part of the write that put() is about to publish
+        self._written[rows] = self._seen + 1
+        self.evictions += len(rows)
+        return rows
+
+    def _allocate(self, count: int) -> List[int]:
+        """Pick rows for new entries: free rows first, then a batch of the least recently used ones."""
+        if len(self._free) < count:
+            # Evict more than needed so the next puts find free rows without another pass
+            used = self.capacity - len(self._free)
+            batch = min(used, max(count - len(self._free), int(self.capacity * EVICT_FRACTION)))
+            self._free = sorted(self._evict(batch), reverse=True) + self._free
+        return [self._free.pop() for _ in range(count)]
+
+    def get(self, texts: List[str]):
+        """Return (vectors, positions of texts not in the cache, keys) for the given texts."""
+        keys = [text_key(t) for t in texts]
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        missing = []
+        now = time.time_ns()
+        with self._lock:
+            self._sync()
+            for i, key in enumerate(keys):
+                row = self._row_for(key)
+                if row is None:
+                    missing.append(i)
+                    continue
+                vectors[i] = self._vectors[row]
+                # Writers blank the key before touching the vector: a changed key means a torn read
+                if self._key_at(row) != key:
+                    missing.append(i)
+                    continue
+                self._last_used[row] = now
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+        return vectors, missing, keys
+
+    def put(self, keys: List[bytes], vectors: np.ndarray):
+        """Store vectors for the given keys, evicting the least recently used rows if full."""
+        if not keys:
+            return
+        now = time.time_ns()
+        with self._lock, _FileLock(self.dir / ".lock"):
+            self._sync()
+            # Keep the first occurrence of duplicate keys
+            unique = {}
+            for i, key in enumerate(keys):
+                if self._row_for(key) is None:
+                    unique.setdefault(key, i)
+            if not unique:
+                return
+            items = list(unique.items())[:self.capacity]
+            rows = self._allocate(len(items))
+            # Blank the keys, then write the vectors, then the keys, so readers
+            # in other processes never pair a key with someone else's vector
+            self._keys[rows] = b""
+            self._keys.flush()
+            self._vectors[rows] = vectors[[i for _, i in items]]
+            self._vectors.flush()
+            generation = self._seen + 1
+            for row, (key, _) in zip(rows, items):
+                self._keys[row] = key
+                self._row_keys[row] = key
+                self._rows[key] = row
+            self._last_used[rows] = now
+            self._keys.flush()
+            self._written[rows] = generation
+            self._generation[0] = generation
+            self._seen = generation
+
+    def encode(self, model, texts: List[str], **encode_kwargs) -> np.ndarray:
+        """Encode texts, calling the model only for texts missing from the cache."""
+        vectors, missing, keys = self.get(texts)
+        if missing:
+            fresh = np.asarray(model.encode([texts[i] for i in missing], **encode_kwargs), dtype=np.float32)
+            vectors[missing] = fresh
+            self.put([keys[i] for i in missing], fresh)
+        return vectors
+
+    def flush(self):
+        """Write dirty pages back to disk."""
+        with self._lock:
+            self._vectors.flush()
+            self._keys.flush()
+            self._last_used.flush()
+            self._written.flush()
+            self._generation.flush()
+
+    def clear(self):
+        """Drop every entry and delete the cache files."""
+        with self._lock:
+            del self._vectors, self._keys, self._last_used, self._written, self._generation
+            shutil.rmtree(self.dir, ignore_errors=True)
+        self._open()
+
+    def get_stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "model_name": self.model_name,
+            "entries": len(self._rows),
+            "capacity": self.capacity,
+            "dtype": self.dtype.name,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+_caches: Dict[str, EmbeddingCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_embedding_cache(model_name: str, dim: int) -> EmbeddingCache:
+    """Return the process-wide cache for a model, opening it on first use."""
+    cache = _caches.get(model_name)
+    if cache is None or cache.dim != dim:
+        with _caches_lock:
+            cache = _caches.get(model_name)
+            if cache is None or cache.dim != dim:
+                cache = EmbeddingCache(model_name, dim)
+                _caches[model_name] = cache
+    return cache
+
+
+def cached_encode(model, texts: List[str], model_name: str, **encode_kwargs) -> np.ndarray:
+    """Encode texts through the persistent cache (or directly if the cache is disabled)."""
+    if not EMBEDDING_CACHE_ENABLED:
+        return np.asarray(model.encode(texts, **encode_kwargs), dtype=np.float32)
+    cache = get_embedding_cache(model_name, model.get_sentence_embedding_dimension())
+    return cache.encode(model, texts, **encode_kwargs)
+
+
+def flush_embedding_caches():
+    """Flush every open cache to disk."""
+    for cache in list(_caches.values()):
+        cache.flush()
+
+
+def get_embedding_cache_stats() -> dict:
+    return {
+        "enabled": EMBEDDING_CACHE_ENABLED,
+        "caches": [cache.get_stats() for cache in list(_caches.values())],
+    }
@@ -0,0 +1,64 @@
+# app/executors.py
+import asyncio
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict
+
+from config.settings import EMBED_EXECUTOR_WORKERS, RETRIEVAL_EXECUTOR_WORKERS, IO_EXECUTOR_WORKERS
+
+
+class Executors:
+    """Dedicated thread pools for the blocking work of the async chat path.
+
+    ``embedding`` runs model encodes, ``retrieval`` FAISS / BM25 searches and
+    index loads, ``io`` JSON reads and writes. Each pool is sized on its own,
+    so e.g. slow disk writes cannot hold up searches, and the event loop only
+    ever awaits them.
+    """
+
+    def __init__(self, embedding: int = EMBED_EXECUTOR_WORKERS, retrieval: int = RETRIEVAL_EXECUTOR_WORKERS,
+                 io: int = IO_EXECUTOR_WORKERS):
+        self.sizes = {"embedding": max(1, embedding), "retrieval": max(1, retrieval), "io": max(1, io)}
+        self.pools: Dict[str, ThreadPoolExecutor] = {
+            name: ThreadPoolExecutor(max_workers=size, thread_name_prefix=f"chat-{name}")
+            for name, size in self.sizes.items()
+        }
+        self._stats = {name: {"tasks": 0, "active": 0, "max_active": 0, "busy_seconds": 0.0} for name in self.pools}
+        self._lock = threading.Lock()
+
+    def _timed(self, name: str, fn: Callable, *args, **kwargs):
+        stats = self._stats[name]
+        with self._lock:
+            stats["active"] += 1
+            stats["max_active"] = max(stats["max_active"], stats["active"])
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            with self._lock:
+                stats["active"] -= 1
+                stats["tasks"] += 1
+                stats["busy_seconds"] += time.perf_counter() - start
+
+    async def run(self, name: str, fn: Callable, *args, **kwargs):
+        """Run a blocking call on the named pool and await its result."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.pools[name], functools.partial(self._timed, name, fn, *args, **kwargs))
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                name: dict(stats, workers=self.sizes[name], busy_seconds=round(stats["busy_seconds"], 3),
+                           queued=self.pools[name]._work_queue.qsize())
+                for name, stats in self._stats.items()
+            }
+
+    def shutdown(self):
+        for pool in self.pools.values():
+            pool.shutdown(wait=False)
+
+
+# Global executors instance
+executors = Executors()
@@ -1,34 +1,306 @@
 import faiss
 import numpy as np
 from pathlib import Path
+import json
+import math
 import os
+from app.snapshots import current_snapshot_dir
+from config.settings import (
+    FAISS_INDEX_TYPE, FAISS_MEMORY_BUDGET_MB, FAISS_FLAT_MAX_VECTORS,
+    FAISS_NPROBE, FAISS_EF_SEARCH, FAISS_HNSW_M, FAISS_OMP_THREADS, API_WORKERS
+)
+
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "ivf_sq8", "hnsw")
+MIN_IVF_VECTORS = 1000
+
+def estimate_index_bytes(index_type: str, n: int, dim: int, hnsw_m: int = FAISS_HNSW_M) -> int:
+    """Rough resident size of an index holding n vectors."""
+    if index_type in ("flat", "ivf_flat"):
+        per_vector = dim * 4
+    elif index_type == "ivf_sq8":
+        per_vector = dim
+    elif index_type == "ivf_pq":
+        per_vector = pq_subquantizers(dim)
+    elif index_type == "hnsw":
+        per_vector = dim * 4 + hnsw_m * 2 * 4
+    else:
+        raise ValueError(f"Unknown index type: {index_type}")
+    # Every id-capable index keeps an 8 byte id per vector
+    return n * (per_vector + 8)
+
+def pq_subquantizers(dim: int) -> int:
+    """Number of PQ sub-quantizers (bytes per vector): about dim / 8, dividing dim."""
+    m = max(1, dim // 8)
+    while dim % m:
+        m -= 1
+    return m
+
+def choose_index_config(n: int, dim: int, index_type: str = None, memory_budget_mb: float = None) -> dict:
+    """Pick an index type and its search parameters for a corpus of n vectors.
+
+    Small corpora stay exact (flat). Larger ones use IVF-Flat while the raw
+    vectors fit the memory budget, then IVF-SQ8 and finally IVF-PQ. HNSW is
+    only used when asked for explicitly because it cannot remove vectors,
+    which incremental builds rely on.
+    """
+    index_type = index_type or FAISS_INDEX_TYPE
+    budget = (memory_budget_mb or FAISS_MEMORY_BUDGET_MB) * 1024 * 1024
+    if index_type == "auto":
+        if n <= FAISS_FLAT_MAX_VECTORS:
+            index_type = "flat"
+        elif estimate_index_bytes("ivf_flat", n, dim) <= budget:
+            index_type = "ivf_flat"
+        elif estimate_index_bytes("ivf_sq8", n, dim) <= budget:
+            index_type = "ivf_sq8"
+        else:
+            index_type = "ivf_pq"
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type '{index_type}', expected one of {INDEX_TYPES} or 'auto'")
+    if index_type.startswith("ivf") and n < MIN_IVF_VECTORS:
+        # Too few vectors to train the quantizers; an exact search is cheaper anyway
+        index_type = "flat"
+
+    config = {"type": index_type, "dim": dim}
+    if index_type.startswith("ivf"):
+        # ~4*sqrt(n) lists, with at least 39 training points per list
+        nlist = max(1, min(int(4 * math.sqrt(n)), n // 39))
+        config["nlist"] = nlist
+        config["nprobe"] = FAISS_NPROBE or min(nlist, max(8, nlist // 32))
+        if index_type == "ivf_pq":
+            config["pq_m"] = pq_subquantizers(dim)
+    elif index_type == "hnsw":
+        config["hnsw_m"] = FAISS_HNSW_M
+        config["ef_search"] = FAISS_EF_SEARCH
+    config["factory"] = index_factory_string(config)
+    return config
+
+def index_factory_string(config: dict) -> str:
+    """FAISS index_factory description for a config produced by choose_index_config."""
+    index_type = config["type"]
+    if index_type == "flat":
+        return "IDMap2,Flat"
+    if index_type == "hnsw":
+        return f"IDMap2,HNSW{config['hnsw_m']}"
+    if index_type == "ivf_flat":
+        return f"IVF{config['nlist']},Flat"
+    if index_type == "ivf_sq8":
+        return f"IVF{config['nlist']},SQ8"
+    return f"IVF{config['nlist']},PQ{config['pq_m']}"
+
+def apply_search_params(index, config: dict):
+    """Apply persisted search-time knobs (nprobe / efSearch) to a loaded index."""
+    params = faiss.ParameterSpace()
+    if "nprobe" in config:
+        params.set_index_parameter(index, "nprobe", int(config["nprobe"]))
+    if "ef_search" in config:
+        params.set_index_parameter(index, "efSearch", int(config["ef_search"]))
+
+def search_parameters(config: dict, ids: np.ndarray):
+    """SearchParameters restricting a search to ``ids``, keeping the index's nprobe / efSearch."""
+    selector = faiss.IDSelectorBatch(np.ascontiguousarray(ids, dtype=np.int64))
+    config = config or {}
+    if "nprobe" in config:
+        params = faiss.SearchParametersIVF(sel=selector, nprobe=int(config["nprobe"]))
+    elif "ef_search" in config:
+        params = faiss.SearchParametersHNSW(sel=selector, efSearch=int(config["ef_search"]))
+    else:
+        params = faiss.SearchParameters(sel=selector)
+    # The SWIG object does not own the selector; keep it alive as long as the params
+    params.selector_ref = selector
+    return params
+
+def training_sample_size(n: int, config: dict) -> int:
+    """Number of vectors used to train the coarse quantizer of an n-vector index."""
+    return min(n, max(256, config.get("nlist", 1) * 64))
+
+def training_sample(embeddings: np.ndarray, config: dict) -> np.ndarray:
+    """Random subset of the vectors, large enough to train the coarse quantizer."""
+    sample_size = training_sample_size(len(embeddings), config)
+    if sample_size == len(embeddings):
+        return embeddings
+    rows = np.random.default_rng(0).choice(len(embeddings), sample_size, replace=False)
+    return embeddings[np.sort(rows)]
+
+def build_index(embeddings: np.ndarray, config: dict, ids: np.ndarray = None):
+    """Build (and train if needed) an in-memory index for a config from choose_index_config."""
+    embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+    if ids is None:
+        ids = np.arange(len(embeddings), dtype=np.int64)
+    index = faiss.index_factory(config["dim"], config["factory"])
+    if not index.is_trained:
+        index.train(training_sample(embeddings, config))
+    index.add_with_ids(embeddings, np.asarray(ids, dtype=np.int64))
+    apply_search_params(index, config)
+    return index
+
+def mmap_io_flags(config: dict):
+    """read_index flags that map the vector data of an index file instead of copying it.
+
+    IVF indices map their inverted lists; flat and HNSW indices map their code
+    storage. The HNSW graph and id maps are still read into private memory.
+    Flat and HNSW code storage needs IO_FLAG_MMAP_IFC (faiss >= 1.11, as
+    pinned); older builds return None for them and read them normally.
+    """
+    config = config or {}
+    if config.get("type", "").startswith("ivf"):
+        return faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+    mmap_ifc = getattr(faiss, "IO_FLAG_MMAP_IFC", None)
+    if mmap_ifc is None:
+        return None
+    return mmap_ifc | faiss.IO_FLAG_READ_ONLY
+
+def configure_faiss_threads(num_threads: int = None) -> int:
+    """Set the OpenMP thread count FAISS uses in this process and return it.
+
+    By default the available cores are split between the API worker processes,
+    so concurrent searches in several workers do not oversubscribe the CPU.
+    """
+    num_threads = num_threads or FAISS_OMP_THREADS
+    if not num_threads:
+        try:
+            cores = len(os.sched_getaffinity(0))
+        except AttributeError:
+            cores = os.cpu_count() or 1
+        num_threads = max(1, cores // max(1, API_WORKERS))
+    faiss.omp_set_num_threads(num_threads)
+    return num_threads
 
 class FaissManager:
-    def __init__(self, universe: str, dim: int):
+    def __init__(self, universe: str, dim: int, index_dir: Path = None):
+        """Manage the index of a universe, by default in its currently published snapshot."""
         self.universe = universe
-        self.index_dir = Path("data") / universe / "faiss_index"
+        self.index_dir = Path(index_dir) if index_dir is not None else current_snapshot_dir(universe)
         self.index_dir.mkdir(parents=True, exist_ok=True)
-        self.index_path = self.index_dir / "index.faiss"
         self.dim = dim
         self.index = None
+        self.config = None
+        self.mmapped = False
+
+    @property
+    def index_path(self) -> Path:
+        return self.index_dir / "index.faiss"
+
+    @property
+    def meta_path(self) -> Path:
+        return self.index_dir / "index_meta.json"
 
-    def create_index(self, embeddings: np.ndarray):
-        """Create a new FAISS index from embeddings (shape: [n, dim])."""
-        self.index = faiss.IndexFlatL2(self.dim)
-        self.index.add(embeddings)
-        faiss.write_index(self.index, str(self.index_path))
+    def create_index(self, embeddings: np.ndarray, ids: np.ndarray = None, index_type: str = None):
+        """Create a new FAISS index from embeddings (shape: [n, dim]).
 
-    def load_index(self):
-        """Load the FAISS index from disk."""
+        The index type is chosen from the corpus size and the configured memory
+        budget (see choose_index_config). Vectors are stored under ``ids``
+        (0..n-1 when omitted), so they can later be removed or added individually.
+        """
+        self.config = choose_index_config(len(embeddings), self.dim, index_type)
+        self.index = build_index(embeddings, self.config, ids)
+        self.save_index()
+
+    def start_index(self, n: int, index_type: str = None) -> int:
+        """Create an empty index sized for n vectors, to be filled batch by batch with add().
+
+        Returns the number of training vectors to pass to train() before adding
+        (0 for index types that need no training).
+        """
+        self.config = choose_index_config(n, self.dim, index_type)
+        self.index = faiss.index_factory(self.dim, self.config["factory"])
+        self.mmapped = False
+        apply_search_params(self.index, self.config)
+        return 0 if self.index.is_trained else training_sample_size(n, self.config)
+
+    def train(self, embeddings: np.ndarray):
+        """Train the coarse quantizer of an index created by start_index()."""
+        self.index.train(np.ascontiguousarray(embeddings, dtype=np.float32))
+
+    def save_index(self):
+        """Write the current index and its metadata to disk.
+
+        The index is written to a temporary file and renamed into place, so
+        processes that memory-map the previous file keep a valid mapping.
+        """
+        tmp_path = self.index_path.with_name(self.index_path.name + ".tmp")
+        faiss.write_index(self.index, str(tmp_path))
+        os.replace(tmp_path, self.index_path)
+        if self.config is not None:
+            with open(self.meta_path, "w", encoding="utf-8") as f:
+                json.dump(dict(self.config, ntotal=int(self.index.ntotal)), f, indent=2)
+
+    def load_index(self, mmap: bool = False):
+        """Load the FAISS index from disk and apply its persisted search parameters.
+
+        With ``mmap=True`` the index is opened read-only and memory-mapped, so
+        every worker process serving it shares one page-cache copy. Index types
+        that cannot be mapped are read normally.
+        """
         if not self.index_path.exists():
             raise FileNotFoundError(f"No FAISS index found at {self.index_path}")
-        self.index = faiss.read_index(str(self.index_path))
+        self.config = None
+        if self.meta_path.exists():
+            with open(self.meta_path, "r", encoding="utf-8") as f:
+                self.config = json.load(f)
+        self.mmapped = False
+        io_flags = mmap_io_flags(self.config) if mmap else None
+        if io_flags is not None:
+            try:
+                self.index = faiss.read_index(str(self.index_path), io_flags)
+                self.mmapped = True
+            except (RuntimeError, AttributeError) as e:
+                print(f"Warning: Could not memory-map {self.index_path}, reading it instead: {e}")
+        if not self.mmapped:
+            self.index = faiss.read_index(str(self.index_path))
+        self.dim = self.index.d
+        if self.config is not None:
+            apply_search_params(self.index, self.config)
 
-    def query(self, vector: np.ndarray, top_k=5):
-        """Query the FAISS index with a single vector (shape: [dim,]). Returns (distances, indices)."""
+    def supports_ids(self) -> bool:
+        """True if the loaded index stores explicit ids (id-mapped or IVF)."""
+        if self.index is None:
+            self.load_index()
+        if isinstance(self.index, faiss.IndexIDMap2):
+            return True
+        try:
+            faiss.extract_index_ivf(self.index)
+            return True
+        except RuntimeError:
+            return False
+
+    def _check_writable(self):
+        if self.mmapped:
+            raise RuntimeError(f"Index {self.index_path} is memory-mapped read-only")
+
+    def add(self, embeddings: np.ndarray, ids: np.ndarray):
+        """Add vectors under explicit ids to an id-mapped index."""
+        self._check_writable()
+        if len(ids):
+            self.index.add_with_ids(np.ascontiguousarray(embeddings, dtype=np.float32),
+                                    np.asarray(ids, dtype=np.int64))
+
+    def remove_ids(self, ids) -> int:
+        """Remove vectors by id. Returns the number of vectors removed.
+
+        Raises RuntimeError for index types that cannot remove vectors (HNSW)
+        and for memory-mapped indices.
+        """
+        if not len(ids):
+            return 0
+        self._check_writable()
+        return self.index.remove_ids(np.asarray(ids, dtype=np.int64))
+
+    def search_batch(self, queries: np.ndarray, top_k=5, ids: np.ndarray = None):
+        """Search many queries in one FAISS call (shape: [n, dim]). Returns (distances, indices), each [n, top_k].
+
+        A C-contiguous float32 matrix is passed to FAISS as is, without copying.
+        When ``ids`` is given only those vectors are considered (pre-filtering).
+        """
         if self.index is None:
             self.load_index()
-        if vector.ndim == 1:
-            vector = vector.reshape(1, -1)
-        distances, indices = self.index.search(vector, top_k)
-        return distances[0], indices[0] 
\ No newline at end of file
+        queries = np.ascontiguousarray(queries, dtype=np.float32)
+        if queries.ndim != 2 or queries.shape[1] != self.index.d:
+            raise ValueError(f"Expected queries of shape (n, {self.index.d}), got {queries.shape}")
+        if ids is None:
+            return self.index.search(queries, top_k)
+        return self.index.search(queries, top_k, params=search_parameters(self.config, ids))
+
+    def query(self, vector: np.ndarray, top_k=5, ids: np.ndarray = None):
+        """Query the FAISS index with a single vector (shape: [dim,]). Returns (distances, indices)."""
+        distances, indices = self.search_batch(vector.reshape(1, -1), top_k, ids=ids)
+        return distances[0], indices[0]
@@ -0,0 +1,268 @@
+# app/http_client.py
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+from config.settings import (
+    LLM_CONNECT_TIMEOUT, LLM_READ_TIMEOUT, LLM_MAX_RETRIES,
+    LLM_RETRY_BACKOFF, LLM_RETRY_BACKOFF_MAX, LLM_POOL_SIZE, LLM_ENDPOINT_URLS
+)
+
+# Statuses that mean "try again later" rather than "this request is wrong"
+RETRY_STATUSES = (429, 502, 503, 504)
+# Latencies kept for the percentiles in get_stats
+LATENCY_WINDOW = 1000
+
+
+class _RetryingClient:
+    """Timeouts, retry policy and stats shared by the sync and async clients."""
+
+    def __init__(self, pool_size: int = LLM_POOL_SIZE, connect_timeout: float = LLM_CONNECT_TIMEOUT,
+                 read_timeout: float = LLM_READ_TIMEOUT, max_retries: int = LLM_MAX_RETRIES,
+                 backoff: float = LLM_RETRY_BACKOFF, backoff_max: float = LLM_RETRY_BACKOFF_MAX):
+        self.pool_size = max(1, pool_size)
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max(0, max_retries)
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self.requests = 0
+        self.retries = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.in_flight = 0
+
+    def _retry_delay(self, attempt: int, response=None) -> float:
+        """Full jitter backoff, or the server's Retry-After when it sends one."""
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after:
+            try:
+                return min(float(retry_after), self.backoff_max)
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.backoff_max, self.backoff * (2 ** attempt)))
+
+    def _begin(self):
+        with self._lock:
+            self.requests += 1
+            self.in_flight += 1
+
+    def _end(self, elapsed: float):
+        with self._lock:
+            self.in_flight -= 1
+            self._latencies.append(elapsed)
+
+    def _count_retry(self):
+        with self._lock:
+            self.retries += 1
+
+    def _count_failure(self, timeout: bool = False):
+        with self._lock:
+            self.failures += 1
+            if timeout:
+                self.timeouts += 1
+
+    def _pool_stats(self) -> dict:
+        return {}
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            latencies = sorted(self._latencies)
+            stats = {
+                "pool_size": self.pool_size,
+                "connect_timeout": self.timeout[0],
+                "read_timeout": self.timeout[1],
+                "max_retries": self.max_retries,
+                "requests": self.requests,
+                "retries": self.retries,
+                "failures": self.failures,
+                "timeouts": self.timeouts,
+                "in_flight": self.in_flight,
+            }
+
+        def percentile(p):
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000, 2) if latencies else 0.0
+
+        stats.update(self._pool_stats())
+        stats.update({"latency_p50_ms": percentile(0.5), "latency_p95_ms": percentile(0.95),
+                      "latency_max_ms": round(latencies[-1] * 1000, 2) if latencies else 0.0})
+        return stats
+
+
+class PooledHTTPClient(_RetryingClient):
+    """Keep-alive HTTP client with connect/read timeouts and bounded, jittered retries.
+
+    One requests Session with a fixed-size connection pool is shared by all
+    threads, so LLM calls reuse open TCP/TLS connections instead of
+    handshaking on every turn. Connection failures and the statuses in
+    RETRY_STATUSES are retried up to ``max_retries`` times with full-jitter
+    exponential backoff; read timeouts are not retried, so a hung generation
+    costs at most ``read_timeout`` seconds.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.session = requests.Session()
+        # pool_block: beyond pool_size concurrent calls wait for a connection instead of opening throwaway ones
+        self._adapter = HTTPAdapter(pool_connections=max(4, len(LLM_ENDPOINT_URLS)), pool_maxsize=self.pool_size,
+                                    pool_block=True, max_retries=0)
+        self.session.mount("http://", self._adapter)
+        self.session.mount("https://", self._adapter)
+
+    def post_json(self, url: str, payload: dict, headers: dict = None, timeout=None) -> requests.Response:
+        """POST a JSON body, retrying transient failures. Returns the last response."""
+        self._begin()
+        start = time.perf_counter()
+        try:
+            for attempt in range(self.max_retries + 1):
+                last_attempt = attempt == self.max_retries
+                try:
+                    response = self.session.post(url, json=payload, headers=headers, timeout=timeout or self.timeout)
+                except requests.exceptions.ConnectTimeout:
+                    if last_attempt:
+                        self._count_failure(timeout=True)
+                        raise
+                    delay = self._retry_delay(attempt)
+                except requests.exceptions.ReadTimeout:
+                    # The server accepted the request but did not answer in time; do not pile on
+                    self._count_failure(timeout=True)
+                    raise
+                except requests.exceptions.ConnectionError:
+                    if last_attempt:
+                        self._count_failure()
+                        raise
+                    delay = self._retry_delay(attempt)
+                else:
+                    if response.status_code not in RETRY_STATUSES or last_attempt:
+                        if response.status_code >= 400:
+                            self._count_failure()
+                        return response
+                    delay = self._retry_delay(attempt, response)
+                    response.close()
+                self._count_retry()
+                time.sleep(delay)
+        finally:
+            self._end(time.perf_counter() - start)
+
+    def _pool_stats(self) -> dict:
+        """Connections opened vs. requests sent over them, summed over the adapter's pools."""
+        opened = sent = 0
+        for key in list(self._adapter.poolmanager.pools.keys()):
+            pool = self._adapter.poolmanager.pools.get(key)
+            if pool is not None:
+                opened += pool.num_connections
+                sent += pool.num_requests
+        return {
+            "connections_opened": opened,
+            "requests_sent": sent,
+            "connection_reuse_ratio": round(1 - opened / sent, 3) if sent else 0.0,
+        }
+
+    def close(self):
+        self.session.close()
+
+
+class AsyncPooledHTTPClient(_RetryingClient):
+    """asyncio counterpart of PooledHTTPClient built on httpx.
+
+    Waiting for the LLM never blocks the event loop, so one worker can hold
+    many concurrent chats. Up to ``pool_size`` keep-alive connections per
+    configured endpoint are opened, further calls wait for a free one;
+    timeouts and retries behave as in PooledHTTPClient.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._client = None
+        self.connections_opened = 0
+        self.requests_sent = 0
+
+    def _get_client(self):
+        # Created lazily so the connection pool belongs to the running event loop
+        if self._client is None:
+            connect, read = self.timeout
+            self._client = httpx.AsyncClient(
+                # httpx limits connections in total, not per host
+                limits=httpx.Limits(max_connections=self.pool_size * len(LLM_ENDPOINT_URLS),
+                                    max_keepalive_connections=self.pool_size * len(LLM_ENDPOINT_URLS)),
+                timeout=httpx.Timeout(connect=connect, read=read, write=connect, pool=read),
+            )
+        return self._client
+
+    async def _trace(self, event: str, info: dict):
+        if event == "connection.connect_tcp.complete":
+            self.connections_opened += 1
+
+    async def _send(self, url: str, payload: dict, headers: dict, stream: bool):
+        client = self._get_client()
+        self._begin()
+        start = time.perf_counter()
+        try:
+            for attempt in range(self.max_retries + 1):
+                last_attempt = attempt == self.max_retries
+                try:
+                    self.requests_sent += 1
+                    request = client.build_request("POST", url, json=payload, headers=headers,
+                                                   extensions={"trace": self._trace})
+                    response = await client.send(request, stream=stream)
+                except (httpx.ReadTimeout, httpx.WriteTimeout, httpx.PoolTimeout):
+                    # The server (or our own pool) is saturated; do not pile on
+                    self._count_failure(timeout=True)
+                    raise
+                except httpx.TransportError as e:
+                    if last_attempt:
+                        self._count_failure(timeout=isinstance(e, httpx.TimeoutException))
+                        raise
+                    delay = self._retry_delay(attempt)
+                else:
+                    if response.status_code not in RETRY_STATUSES or last_attempt:
+                        if response.status_code >= 400:
+                            self._count_failure()
+                        return response
+                    delay = self._retry_delay(attempt, response)
+                    await response.aclose()
+                self._count_retry()
+                await asyncio.sleep(delay)
+        finally:
+            self._end(time.perf_counter() - start)
+
+    async def post_json(self, url: str, payload: dict, headers: dict = None):
+        """POST a JSON body, retrying transient failures. Returns the last httpx.Response."""
+        return await self._send(url, payload, headers, stream=False)
+
+    async def open_stream(self, url: str, payload: dict, headers: dict = None):
+        """POST a JSON body and return the response as soon as its headers arrive.
+
+        Retries happen only before that point; the caller reads the body with
+        ``aiter_*`` and must ``await response.aclose()``. Latency stats measure
+        the time to the headers.
+        """
+        return await self._send(url, payload, headers, stream=True)
+
+    async def probe(self, url: str) -> bool:
+        """Health check: True if the server answers without a 5xx within the connect timeout."""
+        try:
+            response = await self._get_client().get(url, timeout=self.timeout[0])
+        except httpx.HTTPError:
+            return False
+        return response.status_code < 500
+
+    def _pool_stats(self) -> dict:
+        sent, opened = self.requests_sent, self.connections_opened
+        return {
+            "connections_opened": opened,
+            "requests_sent": sent,
+            "connection_reuse_ratio": round(1 - opened / sent, 3) if sent else 0.0,
+        }
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
@@ -0,0 +1,248 @@
+# app/index_cache.py
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Optional, Sequence, Tuple
+
+from app.chunk_metadata import ChunkMetadata, METADATA_FILE
+from app.chunk_store import open_chunks
+from app.faiss_manager import FaissManager
+from app.lexical_index import LexicalIndex
+from app.snapshots import acquire_lease, current_version, gc_snapshots, snapshot_dir
+from app.utils.memory import format_bytes
+from config.settings import INDEX_CACHE_CHECK_INTERVAL, INDEX_CACHE_MEMORY_BUDGET_MB, FAISS_MMAP
+
+
+@dataclass
+class CachedUniverseIndex:
+    """A universe's FAISS index and chunk store kept resident in memory."""
+    universe: str
+    faiss_manager: FaissManager
+    chunks: Sequence[str]
+    signature: Tuple
+    loaded_at: float
+    last_checked: float = field(default=0.0)
+    lexical: Optional[LexicalIndex] = None
+    metadata: Optional[ChunkMetadata] = None
+    resident_bytes: int = 0
+    load_seconds: float = 0.0
+    hits: int = 0
+    version: Optional[str] = None
+
+
+class IndexCache:
+    """Lazily loaded, memory-budgeted cache of universe indices and chunk stores.
+
+    A universe is loaded on its first request; concurrent first requests for
+    the same universe share a single load. When the resident size of all
+    loaded universes exceeds ``memory_budget_mb`` the least recently used ones
+    are evicted. Entries are reloaded when a new index snapshot is published;
+    the CURRENT pointer is only read every ``check_interval`` seconds, so
+    steady-state retrieval does no disk I/O at all. While one thread loads the
+    new snapshot, other requests keep being answered from the old one.
+
+    With ``mmap`` FAISS indices are memory-mapped read-only; together with the
+    memory-mapped chunk store and BM25 postings this lets every worker process
+    share one page-cache copy of each universe.
+    """
+
+    def __init__(self, check_interval: float = INDEX_CACHE_CHECK_INTERVAL,
+                 memory_budget_mb: float = INDEX_CACHE_MEMORY_BUDGET_MB, mmap: bool = FAISS_MMAP):
+        self.check_interval = check_interval
+        self.mmap = mmap
+        self.memory_budget = int(memory_budget_mb * 1024 * 1024)
+        self._entries: "OrderedDict[str, CachedUniverseIndex]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_locks: Dict[str, threading.Lock] = {}
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _files(index_dir: Path) -> list:
+        """Index files that make up a loaded universe (relative to its index dir)."""
+        chunk_file = "chunks.bin" if (index_dir / "chunks.bin").exists() else "chunks.txt"
+        names = ["index.faiss", chunk_file]
+        if LexicalIndex.exists(index_dir):
+            names.append("lexical/meta.json")
+        if ChunkMetadata.exists(index_dir):
+            names.append(METADATA_FILE)
+        return names
+
+    def _signature(self, universe: str) -> Tuple:
+        """Version stamp: the published snapshot, or file mtimes and sizes for the legacy layout."""
+        version = current_version(universe)
+        if version is not None:
+            return ("snapshot", version)
+        index_dir = snapshot_dir(universe, None)
+        signature = []
+        for name in self._files(index_dir):
+            stat = (index_dir / name).stat()
+            signature.append((name, stat.st_mtime_ns, stat.st_size))
+        return tuple(signature)
+
+    def _resident_bytes(self, index_dir: Path) -> int:
+        """Approximate memory footprint: the on-disk size of every loaded file.
+
+        The FAISS index is read into memory as is; the chunk store and BM25
+        postings are memory-mapped and count once their pages are touched.
+        """
+        total = 0
+        for name in self._files(index_dir):
+            path = index_dir / name
+            if name.startswith("lexical/"):
+                total += sum(f.stat().st_size for f in path.parent.iterdir() if f.is_file())
+            else:
+                total += path.stat().st_size
+        return total
+
+    def _load(self, universe: str, dim: Optional[int]) -> CachedUniverseIndex:
+        start = time.perf_counter()
+        signature = self._signature(universe)
+        version = signature[1] if signature[0] == "snapshot" else None
+        index_dir = snapshot_dir(universe, version)
+        # Keep the snapshot from being garbage-collected for as long as it is served
+        lease = acquire_lease(index_dir)
+        try:
+            faiss_manager = FaissManager(universe, dim, index_dir=index_dir)
+            # Served indices are only read, so they can be shared between worker processes
+            faiss_manager.load_index(mmap=self.mmap)
+            chunks = open_chunks(index_dir)
+            lexical = LexicalIndex.load(index_dir) if LexicalIndex.exists(index_dir) else None
+            metadata = ChunkMetadata.load(index_dir) if ChunkMetadata.exists(index_dir) else None
+            resident_bytes = self._resident_bytes(index_dir)
+        except BaseException:
+            if lease is not None:
+                lease.close()
+            raise
+        entry = CachedUniverseIndex(
+            universe, faiss_manager, chunks, signature, time.time(), time.monotonic(), lexical, metadata,
+            resident_bytes=resident_bytes, load_seconds=time.perf_counter() - start, version=version
+        )
+        if lease is not None:
+            # Released once the last request using this entry is done with it
+            weakref.finalize(entry, lease.close)
+        return entry
+
+    def _is_fresh(self, entry: CachedUniverseIndex) -> bool:
+        now = time.monotonic()
+        if now - entry.last_checked < self.check_interval:
+            return True
+        try:
+            fresh = self._signature(entry.universe) == entry.signature
+        except FileNotFoundError:
+            fresh = False
+        if fresh:
+            entry.last_checked = now
+        return fresh
+
+    def _hit(self, entry: CachedUniverseIndex) -> CachedUniverseIndex:
+        with self._lock:
+            if entry.universe in self._entries:
+                self._entries.move_to_end(entry.universe)
+            self.hits += 1
+            entry.hits += 1
+        return entry
+
+    def _evict(self):
+        """Drop least recently used universes until the budget is met (caller holds the lock).
+
+        The most recently used universe always stays, even if it alone exceeds the budget.
+        """
+        if self.memory_budget <= 0:
+            return
+        while self.resident_bytes > self.memory_budget and len(self._entries) > 1:
+            universe = next(iter(self._entries))
+            # Requests still holding the entry keep using it until they finish
+            del self._entries[universe]
+            self.evictions += 1
+            print(f"Evicted index of {universe} from memory (budget {format_bytes(self.memory_budget)})")
+
+    @property
+    def resident_bytes(self) -> int:
+        return sum(entry.resident_bytes for entry in list(self._entries.values()))
+
+    def get(self, universe: str, dim: Optional[int] = None) -> CachedUniverseIndex:
+        """Return the resident index for a universe, loading it on a miss."""
+        entry = self._entries.get(universe)
+        if entry is not None and self._is_fresh(entry):
+            return self._hit(entry)
+
+        with self._lock:
+            load_lock = self._load_locks.setdefault(universe, threading.Lock())
+        if entry is not None and not load_lock.acquire(blocking=False):
+            # Another thread is loading the new snapshot; keep answering from the current one
+            return self._hit(entry)
+        if entry is None:
+            # Only one thread loads a given universe; others wait for it and reuse the result
+            load_lock.acquire()
+        try:
+            entry = self._entries.get(universe)
+            if entry is not None and self._is_fresh(entry):
+                return self._hit(entry)
+            entry = self._load(universe, dim)
+            with self._lock:
+                previous = self._entries.pop(universe, None)
+                if previous is not None:
+                    self.invalidations += 1
+                self.misses += 1
+                self._entries[universe] = entry
+                self._evict()
+        finally:
+            load_lock.release()
+        if previous is not None and previous.version != entry.version:
+            # Dropping our reference releases this process's lease on the old snapshot
+            del previous
+            gc_snapshots(universe)
+        return entry
+
+    def refresh(self, universe: str):
+        """Re-check a universe on its next request, serving the loaded snapshot until the new one is in."""
+        entry = self._entries.get(universe)
+        if entry is not None:
+            entry.last_checked = float("-inf")
+
+    def invalidate(self, universe: Optional[str] = None):
+        """Drop one universe (or all of them) from the cache."""
+        with self._lock:
+            if universe is None:
+                self.invalidations += len(self._entries)
+                self._entries.clear()
+            elif self._entries.pop(universe, None) is not None:
+                self.invalidations += 1
+
+    def get_stats(self) -> dict:
+        """Hit/miss counters, memory use and per-universe footprint and load latency."""
+        total = self.hits + self.misses
+        with self._lock:
+            entries = list(self._entries.values())
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "memory_budget_bytes": self.memory_budget,
+            "mmap": self.mmap,
+            "resident_bytes": sum(entry.resident_bytes for entry in entries),
+            "resident_universes": sorted(entry.universe for entry in entries),
+            "universes": {
+                entry.universe: {
+                    "resident_bytes": entry.resident_bytes,
+                    "load_seconds": round(entry.load_seconds, 4),
+                    "loaded_at": entry.loaded_at,
+                    "hits": entry.hits,
+                    "mmapped": entry.faiss_manager.mmapped,
+                    "snapshot": entry.version,
+                }
+                for entry in entries
+            },
+        }
+
+
+# Global cache instance
+index_cache = IndexCache()
@@ -0,0 +1,150 @@
+# app/lexical_index.py
+"""
+Compact BM25 inverted index built next to a universe's FAISS index.
+
+Postings are stored in CSR form (one contiguous array of doc ids and term
+frequencies, sliced per term by ``indptr``) and scored with numpy, so a query
+only touches the postings of its own terms.
+"""
+import json
+import os
+import re
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+from config.settings import BM25_K1, BM25_B
+
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+STOPWORDS = frozenset("""
+a an and are as at be but by do does for from has have he her him his how i if in into is it its me my
+no not of on or our she so that the their them then there these they this to was we were what when where
+which who why will with you your
+""".split())
+LEXICAL_DIR = "lexical"
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens without stopwords."""
+    return [t for t in TOKEN_PATTERN.findall(text.lower()) if t not in STOPWORDS]
+
+
+class LexicalIndex:
+    """BM25 index over chunk store slots (doc id == FAISS id)."""
+
+    def __init__(self, vocab: Dict[str, int], indptr: np.ndarray, doc_ids: np.ndarray, tfs: np.ndarray,
+                 doc_len: np.ndarray, idf: np.ndarray, avgdl: float, k1: float = BM25_K1, b: float = BM25_B):
+        self.vocab = vocab
+        self.indptr = indptr
+        self.doc_ids = doc_ids
+        self.tfs = tfs
+        self.doc_len = doc_len
+        self.idf = idf
+        self.avgdl = avgdl or 1.0
+        self.k1 = k1
+        self.b = b
+
+    @property
+    def num_docs(self) -> int:
+        return len(self.doc_len)
+
+    @classmethod
+    def build(cls, texts: Iterable[str], k1: float = BM25_K1, b: float = BM25_B) -> "LexicalIndex":
+        """Build the index; the i-th text becomes doc id i (empty texts are never matched)."""
+        vocab: Dict[str, int] = {}
+        postings: List[Dict[int, int]] = []
+        doc_len = []
+        for doc_id, text in enumerate(texts):
+            tokens = tokenize(text) if text else []
+            doc_len.append(len(tokens))
+            counts: Dict[int, int] = {}
+            for token in tokens:
+                term_id = vocab.setdefault(token, len(vocab))
+                if term_id == len(postings):
+                    postings.append({})
+                counts[term_id] = counts.get(term_id, 0) + 1
+            for term_id, count in counts.items():
+                postings[term_id][doc_id] = count
+
+        df = np.array([len(p) for p in postings], dtype=np.int64)
+        indptr = np.zeros(len(postings) + 1, dtype=np.int64)
+        np.cumsum(df, out=indptr[1:])
+        doc_ids = np.empty(indptr[-1], dtype=np.int64)
+        tfs = np.empty(indptr[-1], dtype=np.float32)
+        for term_id, term_postings in enumerate(postings):
+            start, end = indptr[term_id], indptr[term_id + 1]
+            doc_ids[start:end] = np.fromiter(term_postings.keys(), dtype=np.int64, count=end - start)
+            tfs[start:end] = np.fromiter(term_postings.values(), dtype=np.float32, count=end - start)
+
+        doc_len = np.array(doc_len, dtype=np.float32)
+        non_empty = int((doc_len > 0).sum())
+        avgdl = float(doc_len.sum() / non_empty) if non_empty else 1.0
+        idf = np.log1p((non_empty - df + 0.5) / (df + 0.5)).astype(np.float32)
+        return cls(vocab, indptr, doc_ids, tfs, doc_len, idf, avgdl, k1, b)
+
+    def search(self, query: str, top_k: int = 5, ids: np.ndarray = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (scores, doc ids) of the best BM25 matches, best first.
+
+        When ``ids`` is given only those documents are scored.
+        """
+        empty = np.empty(0, dtype=np.float32), np.empty(0, dtype=np.int64)
+        term_ids = sorted({self.vocab[t] for t in tokenize(query) if t in self.vocab})
+        if not term_ids:
+            return empty
+
+        slices = [slice(self.indptr[t], self.indptr[t + 1]) for t in term_ids]
+        docs = np.concatenate([self.doc_ids[s] for s in slices])
+        tfs = np.concatenate([self.tfs[s] for s in slices])
+        idf = np.repeat(self.idf[term_ids], [s.stop - s.start for s in slices])
+        if ids is not None:
+            keep = np.isin(docs, ids)
+            docs, tfs, idf = docs[keep], tfs[keep], idf[keep]
+            if not len(docs):
+                return empty
+
+        norm = self.k1 * (1 - self.b + self.b * self.doc_len[docs] / self.avgdl)
+        contributions = idf * tfs * (self.k1 + 1) / (tfs + norm)
+        unique_docs, inverse = np.unique(docs, return_inverse=True)
+        scores = np.bincount(inverse, weights=contributions).astype(np.float32)
+
+        if len(scores) > top_k:
+            best = np.argpartition(-scores, top_k - 1)[:top_k]
+        else:
+            best = np.arange(len(scores))
+        best = best[np.argsort(-scores[best], kind="stable")]
+        return scores[best], unique_docs[best]
+
+    def save(self, index_dir: Path):
+        """Write the index as .npy arrays (memory-mappable) plus vocabulary and meta files."""
+        out = Path(index_dir) / LEXICAL_DIR
+        out.mkdir(parents=True, exist_ok=True)
+        for name in ("indptr", "doc_ids", "tfs", "doc_len", "idf"):
+            # Write then rename: other processes may have the previous file memory-mapped
+            tmp_path = out / f"{name}.tmp.npy"
+            np.save(tmp_path, getattr(self, name))
+            os.replace(tmp_path, out / f"{name}.npy")
+        terms = [None] * len(self.vocab)
+        for term, term_id in self.vocab.items():
+            terms[term_id] = term
+        with open(out / "vocab.json", "w", encoding="utf-8") as f:
+            json.dump(terms, f, ensure_ascii=False)
+        # meta.json is written last and doubles as the version stamp of the index
+        with open(out / "meta.json", "w", encoding="utf-8") as f:
+            json.dump({"avgdl": self.avgdl, "k1": self.k1, "b": self.b, "num_docs": self.num_docs}, f)
+
+    @classmethod
+    def load(cls, index_dir: Path) -> "LexicalIndex":
+        """Load a saved index; postings are memory-mapped rather than read into memory."""
+        src = Path(index_dir) / LEXICAL_DIR
+        with open(src / "meta.json", "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        with open(src / "vocab.json", "r", encoding="utf-8") as f:
+            vocab = {term: term_id for term_id, term in enumerate(json.load(f))}
+        arrays = {name: np.load(src / f"{name}.npy", mmap_mode="r")
+                  for name in ("indptr", "doc_ids", "tfs", "doc_len", "idf")}
+        return cls(vocab, avgdl=meta["avgdl"], k1=meta["k1"], b=meta["b"], **arrays)
+
+    @staticmethod
+    def exists(index_dir: Path) -> bool:
+        return (Path(index_dir) / LEXICAL_DIR / "meta.json").exists()
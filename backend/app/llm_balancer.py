@@ -0,0 +1,201 @@
+# app/llm_balancer.py
+import asyncio
+import threading
+import time
+from collections import deque
+from typing import Awaitable, Callable, Iterable, List, Optional
+from urllib.parse import urljoin
+
+from app.http_client import LATENCY_WINDOW
+from config.settings import (
+    LLM_ENDPOINT_URLS, LLM_BREAKER_FAILURES, LLM_BREAKER_COOLDOWN,
+    LLM_HEALTH_CHECK_INTERVAL, LLM_HEALTH_CHECK_PATH, LLM_HEDGE_PERCENTILE, LLM_HEDGE_MIN_SAMPLES
+)
+
+# Circuit breaker states
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+def _percentile(values: List[float], p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p * len(values)))] if values else 0.0
+
+
+class Endpoint:
+    """One generation server: load, breaker state and recent latencies."""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.state = CLOSED
+        self.outstanding = 0
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.last_used = 0.0
+        self.last_health_check = None
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+
+
+class EndpointPool:
+    """Balances LLM calls over several endpoints by least outstanding requests.
+
+    Failed calls (passive checks) and failed health probes (active checks)
+    feed a per-endpoint circuit breaker: after ``failure_threshold``
+    consecutive failures an endpoint gets no traffic for ``cooldown`` seconds,
+    then a single trial request decides whether it is back. When every
+    endpoint is taken out, calls go to the one that failed longest ago rather
+    than being rejected. ``hedge_delay``
+    tells callers when a call has become slow enough to be worth sending to a
+    second endpoint as well.
+    """
+
+    def __init__(self, urls: Iterable[str] = None, failure_threshold: int = LLM_BREAKER_FAILURES,
+                 cooldown: float = LLM_BREAKER_COOLDOWN, hedge_percentile: float = LLM_HEDGE_PERCENTILE,
+                 hedge_min_samples: int = LLM_HEDGE_MIN_SAMPLES):
+        self.endpoints = [Endpoint(url) for url in dict.fromkeys(urls or LLM_ENDPOINT_URLS)]
+        self.failure_threshold = max(1, failure_threshold)
+        self.cooldown = cooldown
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = max(1, hedge_min_samples)
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self._lock = threading.Lock()
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.fallbacks = 0
+
+    @property
+    def urls(self) -> List[str]:
+        return [endpoint.url for endpoint in self.endpoints]
+
+    def _available(self, endpoint: Endpoint, now: float) -> bool:
+        if endpoint.state == OPEN and now - endpoint.opened_at >= self.cooldown:
+            endpoint.state = HALF_OPEN
+        if endpoint.state == HALF_OPEN:
+            # One trial request at a time
+            return endpoint.outstanding == 0
+        return endpoint.state == CLOSED
+
+    def acquire(self, exclude: Iterable[Endpoint] = (), fallback: bool = True) -> Optional[Endpoint]:
+        """Reserve the available endpoint with the fewest calls in flight.
+
+        With ``fallback``, an endpoint taken out by its breaker is used when no
+        other is left; None only once every endpoint is excluded.
+        """
+        now = time.monotonic()
+        with self._lock:
+            remaining = [e for e in self.endpoints if e not in exclude]
+            candidates = [e for e in remaining if self._available(e, now)]
+            if candidates:
+                endpoint = min(candidates, key=lambda e: (e.outstanding, e.last_used))
+            elif fallback and remaining:
+                # Everything is taken out: trying the least recently failed endpoint beats failing the call
+                endpoint = min(remaining, key=lambda e: e.opened_at)
+                endpoint.state = HALF_OPEN
+                self.fallbacks += 1
+            else:
+                return None
+            endpoint.outstanding += 1
+            endpoint.requests += 1
+            endpoint.last_used = now
+            return endpoint
+
+    def release(self, endpoint: Endpoint, ok: Optional[bool]):
+        """End a call; ok=None for calls abandoned by the caller (e.g. the losing half of a hedge)."""
+        with self._lock:
+            endpoint.outstanding -= 1
+            if ok is None:
+                if endpoint.state == HALF_OPEN:
+                    # The trial never finished; let another call try
+                    endpoint.state, endpoint.opened_at = OPEN, time.monotonic() - self.cooldown
+            elif ok:
+                self._succeeded(endpoint)
+            else:
+                endpoint.failures += 1
+                self._failed(endpoint)
+
+    def _succeeded(self, endpoint: Endpoint):
+        endpoint.consecutive_failures = 0
+        if endpoint.state == HALF_OPEN:
+            endpoint.state = CLOSED
+            print(f"✅ LLM endpoint {endpoint.url} is back")
+
+    def _failed(self, endpoint: Endpoint):
+        endpoint.consecutive_failures += 1
+        if endpoint.state == HALF_OPEN or (endpoint.state == CLOSED
+                                           and endpoint.consecutive_failures >= self.failure_threshold):
+            endpoint.state = OPEN
+            endpoint.opened_at = time.monotonic()
+            print(f"⚠️ LLM endpoint {endpoint.url} taken out for {self.cooldown:g}s "
+                  f"after {endpoint.consecutive_failures} failures")
+
+    def observe(self, endpoint: Endpoint, seconds: float):
+        """Record how long a call took to start answering."""
+        with self._lock:
+            endpoint.latencies.append(seconds)
+            self._latencies.append(seconds)
+
+    def hedge_delay(self) -> Optional[float]:
+        """Seconds after which a call should be hedged, or None when hedging is off or has too little data."""
+        if self.hedge_percentile <= 0 or len(self.endpoints) < 2:
+            return None
+        with self._lock:
+            if len(self._latencies) < self.hedge_min_samples:
+                return None
+            return _percentile(list(self._latencies), self.hedge_percentile / 100)
+
+    def count_hedge(self, won: bool = False):
+        with self._lock:
+            if won:
+                self.hedge_wins += 1
+            else:
+                self.hedges += 1
+
+    def report_health(self, endpoint: Endpoint, healthy: bool):
+        """Apply an active health check result; failed probes count like failed calls."""
+        with self._lock:
+            endpoint.last_health_check = healthy
+            if not healthy:
+                if endpoint.state != OPEN:
+                    self._failed(endpoint)
+            elif endpoint.state == OPEN:
+                # Answers again: let the next call be its trial request
+                endpoint.state = HALF_OPEN
+
+    async def run_health_checks(self, probe: Callable[[str], Awaitable[bool]],
+                                interval: float = LLM_HEALTH_CHECK_INTERVAL, path: str = LLM_HEALTH_CHECK_PATH):
+        """Probe every endpoint's health URL each ``interval`` seconds until cancelled.
+
+        A single endpoint is not probed: there is nothing to fail over to.
+        """
+        if interval <= 0 or not path or len(self.endpoints) < 2:
+            return
+        while True:
+            results = await asyncio.gather(*(probe(urljoin(e.url, path)) for e in self.endpoints),
+                                           return_exceptions=True)
+            for endpoint, healthy in zip(self.endpoints, results):
+                self.report_health(endpoint, healthy is True)
+            await asyncio.sleep(interval)
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            endpoints = [
+                {
+                    "url": e.url,
+                    "state": e.state,
+                    "outstanding": e.outstanding,
+                    "requests": e.requests,
+                    "failures": e.failures,
+                    "consecutive_failures": e.consecutive_failures,
+                    "last_health_check": e.last_health_check,
+                    "latency_p50_ms": round(_percentile(list(e.latencies), 0.5) * 1000, 2),
+                    "latency_p95_ms": round(_percentile(list(e.latencies), 0.95) * 1000, 2),
+                }
+                for e in self.endpoints
+            ]
+            stats = {"hedges": self.hedges, "hedge_wins": self.hedge_wins, "fallbacks": self.fallbacks}
+        delay = self.hedge_delay()
+        stats.update(hedge_delay_ms=round(delay * 1000, 2) if delay is not None else None, endpoints=endpoints)
+        return stats
@@ -1,29 +1,241 @@
+import asyncio
+import httpx
 import requests
 import json
-from pathlib import Path
-from config.settings import LLM_ENDPOINT_URL, LLM_MAX_TOKENS, LLM_TEMPERATURE
+import threading
+import time
+from collections import deque
+from app.http_client import PooledHTTPClient, AsyncPooledHTTPClient, LATENCY_WINDOW
+from app.llm_balancer import EndpointPool
+from app.prompt_templates import dialog_stop_sequences
+from app.utils.chunking import estimate_token_counts
+from config.settings import LLM_TEMPERATURE, LLM_MAX_STOP_SEQUENCES
+
+# Lines starting with these at the top of a reply are prompt echoes
+RESPONSE_PREFIXES = [
+    "You are",
+    "Context:",
+    "User:",
+    "You:",
+    "Character:",
+    "Answer:"
+]
+# Game-like or meta content; the reply is cut where one of these starts
+UNWANTED_PHRASES = [
+    "A game of",
+    "The rules are",
+    "Question:",
+    "Answer:",
+    "The player",
+    "If the player",
+    "This means",
+    "However,",
+    "This is the actual response",
+    "at least he starts",
+    "idk how to fix",
+    "maybe instruction tuning"
+]
+# Longer replies are cut after their second sentence
+MAX_REPLY_CHARS = 200
+EMPTY_REPLY = "I'm not sure how to respond to that."
+
+
+def stop_sequences(character_name: str = None) -> list:
+    """Where a reply of character_name should end: the dialog turn markers.
+
+    Unwanted phrases stay client-side (clean_response, ResponseStreamCleaner):
+    an endpoint stop matches at the very start of a generation too, and would
+    empty a reply that merely begins with one.
+    """
+    return dialog_stop_sequences(character_name)
+
+def cut_at_stop(text: str, stop: list) -> str:
+    """Cut text at the first stop sequence found (for endpoints that ignore them)."""
+    lower = text.lower()
+    for sequence in stop or []:
+        idx = lower.find(sequence.lower())
+        if idx > 0:
+            return text[:idx].strip()
+    return text
+
+
+class EndpointStatusError(Exception):
+    """An endpoint answered with an error status."""
+
+    def __init__(self, status_code: int, text: str):
+        super().__init__(f"Request failed with status code {status_code}: {text}")
+        self.status_code = status_code
+
+
+def _endpoint_failed(error: Exception) -> bool:
+    """Whether an error counts against the endpoint's health (ours, like a full connection pool, does not)."""
+    if isinstance(error, EndpointStatusError):
+        return error.status_code >= 500
+    return isinstance(error, httpx.TransportError) and not isinstance(error, httpx.PoolTimeout)
+
+def _fail_over(error: Exception) -> bool:
+    """Whether the call should move on to another endpoint; timed-out generations are not repeated."""
+    return _endpoint_failed(error) and not isinstance(error, (httpx.ReadTimeout, httpx.WriteTimeout))
+
+def _reported_tokens(result):
+    """Completion tokens the endpoint reports for a response or stream event, if any."""
+    if not isinstance(result, dict):
+        return None
+    usage = result.get("usage") or {}
+    for value in (usage.get("completion_tokens"), result.get("tokens_generated"), result.get("generated_tokens")):
+        if isinstance(value, int):
+            return value
+    return None
+
+def _reply_text(result) -> str:
+    """Generated text of a response body or stream event, whichever field the server uses."""
+    if isinstance(result, dict):
+        for key in ("response", "text", "output", "token"):
+            if key in result:
+                return result[key] if isinstance(result[key], str) else str(result[key])
+        choices = result.get("choices")
+        if choices:
+            choice = choices[0]
+            return choice.get("text") or (choice.get("delta") or {}).get("content") or ""
+    return str(result)
+
+
+class ResponseStreamCleaner:
+    """clean_response applied to a reply that arrives in pieces.
+
+    ``feed`` returns the part of the reply that is final and can be shown;
+    text that may still be removed (a possible prompt echo, a first line that
+    might be a prefix, what could be the start of an unwanted phrase, trailing
+    whitespace) is held back until it is decided. ``done`` turns True once a
+    stop rule has ended the reply, after which the rest of the generation is
+    not needed.
+
+    The result matches clean_response, except that every leading prefix line
+    is dropped (not just one per prefix) and a reply without any sentence end
+    is cut at MAX_REPLY_CHARS as soon as it gets there. ``stop`` sequences end
+    the reply like unwanted phrases do.
+    """
+
+    def __init__(self, prompt: str, stop: list = None):
+        self.prompt = prompt
+        self.text = ""
+        self.done = False
+        self._pending = ""
+        self._stage = "prompt" if prompt else "prefix"
+        self._phrases = list(dict.fromkeys(phrase.lower() for phrase in (stop or []) + UNWANTED_PHRASES))
+
+    def feed(self, piece: str) -> str:
+        if self.done or not piece:
+            return ""
+        self._pending += piece
+        return self._advance(final=False)
+
+    def finish(self) -> str:
+        """Release everything still held back; returns the last piece to show."""
+        if self.done:
+            return ""
+        delta = self._advance(final=True)
+        self.done = True
+        if not self.text:
+            self.text = delta = EMPTY_REPLY
+        return delta
+
+    def _advance(self, final: bool) -> str:
+        if self._stage == "prompt":
+            if self._pending.startswith(self.prompt):
+                self._pending = self._pending[len(self.prompt):]
+            elif self.prompt.startswith(self._pending) and not final:
+                return ""
+            self._stage = "prefix"
+        if self._stage == "prefix":
+            while True:
+                self._pending = self._pending.lstrip()
+                first_line, newline, rest = self._pending.partition("\n")
+                if any(first_line.startswith(prefix) for prefix in RESPONSE_PREFIXES):
+                    if not newline:
+                        if not final:
+                            return ""
+                        self._pending = ""
+                        break
+                    self._pending = rest
+                elif not final and not newline and any(prefix.startswith(first_line) for prefix in RESPONSE_PREFIXES):
+                    return ""
+                else:
+                    break
+            self._stage = "body"
+        return self._release(final)
+
+    def _phrase_start(self, lower: str) -> int:
+        """Length of the longest tail of the text that could be the start of a stop or unwanted phrase."""
+        for size in range(min(len(lower), max(map(len, self._phrases)) - 1), 0, -1):
+            tail = lower[-size:]
+            if any(phrase.startswith(tail) for phrase in self._phrases):
+                return size
+        return 0
+
+    def _release(self, final: bool) -> str:
+        body = self.text + self._pending
+        stop = False
+        lower = body.lower()
+        for phrase in self._phrases:
+            idx = lower.find(phrase)
+            if idx > 0:
+                body, stop = body[:max(idx, len(self.text))], True
+                break
+        sentence_ends = [i for i, char in enumerate(body) if char == "."][:2]
+        if len(body) > MAX_REPLY_CHARS and not stop:
+            if len(sentence_ends) == 2:
+                body, stop = body[:sentence_ends[1] + 1], True
+            elif not sentence_ends:
+                body, stop = body[:MAX_REPLY_CHARS] + "...", True
+        if stop or final:
+            end = len(body.rstrip())
+        else:
+            end = len(body) - self._phrase_start(lower)
+            if len(sentence_ends) == 2:
+                # What follows the second sentence is only kept if the reply stays short
+                end = min(end, sentence_ends[1] + 1)
+            elif not sentence_ends:
+                end = min(end, MAX_REPLY_CHARS)
+            while end > len(self.text) and body[end - 1].isspace():
+                end -= 1
+        end = max(end, len(self.text))
+        delta = body[len(self.text):end]
+        self.text += delta
+        self._pending = body[end:]
+        if stop:
+            self.done = True
+        return delta
+
 
 class Phi2Interface:
-    def __init__(self, endpoint_url=None):
-        self.endpoint_url = endpoint_url or LLM_ENDPOINT_URL
+    def __init__(self, endpoint_url=None, client: PooledHTTPClient = None,
+                 async_client: AsyncPooledHTTPClient = None, pool: EndpointPool = None):
+        # Generation servers (LLM_ENDPOINT_URLS), balanced by least outstanding requests
+        self.pool = pool or EndpointPool([endpoint_url] if endpoint_url else None)
+        # Shared keep-alive connection pools with timeouts and retries (sync callers and the async API)
+        self.client = client or PooledHTTPClient()
+        self.async_client = async_client or AsyncPooledHTTPClient()
+        self._stream_lock = threading.Lock()
+        self._first_token_latencies = deque(maxlen=LATENCY_WINDOW)
+        self.streams = 0
+        self.streams_stopped_early = 0
+        self.stream_failures = 0
+        # Generated vs. kept tokens: what the endpoint produced that the player never sees
+        self._token_lock = threading.Lock()
+        self.generations = 0
+        self.tokens_generated = 0
+        self.tokens_kept = 0
+        self.tokens_reported = 0
         
-    def clean_response(self, response: str, prompt: str) -> str:
+    def clean_response(self, response: str, prompt: str, stop: list = None) -> str:
         """Clean the response to extract only the character's reply."""
         # Remove the prompt from the response if it's included
         if prompt in response:
             response = response.replace(prompt, "").strip()
         
         # Remove common prefixes that might be included
-        prefixes_to_remove = [
-            "You are",
-            "Context:",
-            "User:",
-            "You:",
-            "Character:",
-            "Answer:"
-        ]
-        
-        for prefix in prefixes_to_remove:
+        for prefix in RESPONSE_PREFIXES:
             if response.startswith(prefix):
                 # Find the first newline after the prefix
                 lines = response.split('\n')
@@ -36,32 +248,20 @@ class Phi2Interface:
         # Clean up any remaining artifacts
         response = response.strip()
         
+        # End at the first stop sequence in case the endpoint ignored them
+        response = cut_at_stop(response, stop)
+        
         # Limit response length to prevent rambling
-        if len(response) > 200:
+        if len(response) > MAX_REPLY_CHARS:
             # Try to cut at a sentence boundary
             sentences = response.split('.')
             if len(sentences) > 1:
                 response = '. '.join(sentences[:2]) + '.'
             else:
-                response = response[:200] + "..."
+                response = response[:MAX_REPLY_CHARS] + "..."
         
         # Remove any game-like or meta content
-        unwanted_phrases = [
-            "A game of",
-            "The rules are",
-            "Question:",
-            "Answer:",
-            "The player",
-            "If the player",
-            "This means",
-            "However,",
-            "This is the actual response",
-            "at least he starts",
-            "idk how to fix",
-            "maybe instruction tuning"
-        ]
-        
-        for phrase in unwanted_phrases:
+        for phrase in UNWANTED_PHRASES:
             if phrase.lower() in response.lower():
                 # Cut off at the unwanted phrase
                 idx = response.lower().find(phrase.lower())
@@ -71,59 +271,357 @@ class Phi2Interface:
         
         # If response is empty or just whitespace, return a default
         if not response or response.isspace():
-            return "I'm not sure how to respond to that."
+            return EMPTY_REPLY
             
         return response
         
-    def generate_response(self, prompt: str, max_length: int = None, temperature: float = None) -> str:
-        """Generate response using remote Phi-2 endpoint."""
+    def build_request(self, prompt: str, max_length: int = None, temperature: float = None, stream: bool = False,
+                      stop: list = None):
+        """Payload and headers for the remote Phi-2 endpoint."""
         # Use config defaults if not specified
         max_length = max_length or 100  # Reduced from 512 to 100 for shorter responses
         temperature = temperature or LLM_TEMPERATURE
+        payload = {
+            "prompt": prompt,
+            "max_tokens": max_length,
+            "temperature": temperature
+        }
+        headers = {
+            'Content-Type': 'application/json',
+            'Accept': 'application/json'
+        }
+        if stop and LLM_MAX_STOP_SEQUENCES > 0:
+            # Lets the endpoint end the generation instead of producing tokens we cut off
+            payload["stop"] = stop[:LLM_MAX_STOP_SEQUENCES]
+        if stream:
+            payload["stream"] = True
+            headers['Accept'] = 'text/event-stream, application/x-ndjson, application/json'
+        return payload, headers
+
+    def parse_response(self, response, prompt: str, stop: list = None) -> str:
+        """Extract and clean the reply from an endpoint response (requests or httpx)."""
+        # Check if request was successful
+        if response.status_code != 200:
+            raise Exception(f"Request failed with status code {response.status_code}: {response.text}")
+        result = response.json()
+        # Try different possible response formats
+        raw_response = _reply_text(result)
         
+        # Clean the response to extract only the character's reply
+        reply = self.clean_response(raw_response, prompt, stop)
+        self._count_tokens(raw_response, reply, _reported_tokens(result))
+        return reply
+
+    def _count_tokens(self, generated: str, reply: str, reported: int = None):
+        """Record one generation; tokens are the endpoint's count when it reports one, else estimated."""
+        estimated, kept = estimate_token_counts([generated, reply if reply != EMPTY_REPLY else ""])
+        generated_tokens = reported if reported is not None else estimated
+        with self._token_lock:
+            self.generations += 1
+            self.tokens_generated += generated_tokens
+            self.tokens_kept += min(kept, generated_tokens)
+            self.tokens_reported += reported is not None
+        
+    def _post(self, payload: dict, headers: dict):
+        """POST to the least loaded healthy endpoint, failing over to the others on connection errors and 5xx."""
+        tried, last_response, last_error = [], None, None
+        while True:
+            endpoint = self.pool.acquire(exclude=tried)
+            if endpoint is None:
+                if last_response is not None:
+                    return last_response
+                raise last_error or Exception("No healthy LLM endpoint available")
+            tried.append(endpoint)
+            start = time.perf_counter()
+            try:
+                response = self.client.post_json(endpoint.url, payload, headers=headers)
+            except requests.exceptions.ReadTimeout:
+                self.pool.release(endpoint, ok=False)
+                raise
+            except requests.exceptions.RequestException as e:
+                self.pool.release(endpoint, ok=False)
+                last_error = e
+                continue
+            ok = response.status_code < 500
+            self.pool.release(endpoint, ok)
+            if ok:
+                self.pool.observe(endpoint, time.perf_counter() - start)
+                return response
+            last_response = response
+
+    async def _apost(self, payload: dict, headers: dict):
+        """Async _post."""
+        tried, last_response, last_error = [], None, None
+        while True:
+            endpoint = self.pool.acquire(exclude=tried)
+            if endpoint is None:
+                if last_response is not None:
+                    return last_response
+                raise last_error or Exception("No healthy LLM endpoint available")
+            tried.append(endpoint)
+            start = time.perf_counter()
+            try:
+                response = await self.async_client.post_json(endpoint.url, payload, headers=headers)
+            except httpx.HTTPError as e:
+                self.pool.release(endpoint, ok=not _endpoint_failed(e))
+                if not _fail_over(e):
+                    raise
+                last_error = e
+                continue
+            ok = response.status_code < 500
+            self.pool.release(endpoint, ok)
+            if ok:
+                self.pool.observe(endpoint, time.perf_counter() - start)
+                return response
+            last_response = response
+
+    def generate_response(self, prompt: str, max_length: int = None, temperature: float = None,
+                          stop: list = None) -> str:
+        """Generate response using remote Phi-2 endpoint."""
         try:
-            # Prepare the request payload
-            payload = {
-                "prompt": prompt,
-                "max_tokens": max_length,
-                "temperature": temperature
-            }
-            
-            # Make the request with headers
-            headers = {
-                'Content-Type': 'application/json',
-                'Accept': 'application/json'
-            }
-            response = requests.post(self.endpoint_url, json=payload, headers=headers)
-            
-            # Check if request was successful
-            if response.status_code == 200:
-                result = response.json()
-                # Try different possible response formats
-                if isinstance(result, dict):
-                    if "response" in result:
-                        raw_response = result["response"]
-                    elif "text" in result:
-                        raw_response = result["text"]
-                    elif "output" in result:
-                        raw_response = result["output"]
+            payload, headers = self.build_request(prompt, max_length, temperature, stop=stop)
+            response = self._post(payload, headers)
+            return self.parse_response(response, prompt, stop)
+        except requests.exceptions.Timeout as e:
+            raise Exception(f"Error generating response: LLM endpoint timed out ({e})")
+        except Exception as e:
+            raise Exception(f"Error generating response: {str(e)}")
+
+    async def agenerate_response(self, prompt: str, max_length: int = None, temperature: float = None,
+                                 stop: list = None) -> str:
+        """Async generate_response; the event loop keeps serving other requests while the model works."""
+        try:
+            payload, headers = self.build_request(prompt, max_length, temperature, stop=stop)
+            response = await self._apost(payload, headers)
+            return self.parse_response(response, prompt, stop)
+        except httpx.TimeoutException as e:
+            raise Exception(f"Error generating response: LLM endpoint timed out ({e!r})")
+        except Exception as e:
+            raise Exception(f"Error generating response: {str(e)}")
+
+    @staticmethod
+    async def _stream_pieces(response):
+        """(text, reported completion tokens or None) of a streamed response as it arrives.
+
+        Understands Server-Sent Events and NDJSON (one JSON event, or raw text,
+        per line) and falls back to the whole body for endpoints that do not stream.
+        """
+        content_type = response.headers.get("content-type", "")
+        if "text/event-stream" in content_type or "ndjson" in content_type or "jsonl" in content_type:
+            async for line in response.aiter_lines():
+                if line.startswith("data:"):
+                    line = line[6:] if line.startswith("data: ") else line[5:]
+                elif not line.strip() or line.startswith((":", "event:", "id:", "retry:")):
+                    continue
+                if line.strip() == "[DONE]":
+                    break
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    yield line, None
+                    continue
+                if isinstance(event, dict) and event.get("error"):
+                    raise Exception(f"LLM endpoint error: {event['error']}")
+                yield _reply_text(event), _reported_tokens(event)
+        elif "application/json" in content_type:
+            result = json.loads(await response.aread())
+            yield _reply_text(result), _reported_tokens(result)
+        else:
+            async for text in response.aiter_text():
+                yield text, None
+
+    async def _start_stream(self, endpoint, payload: dict, headers: dict):
+        """Open a generation on endpoint and wait for its first piece: (response, pieces, first piece or None)."""
+        response = None
+        try:
+            response = await self.async_client.open_stream(endpoint.url, payload, headers=headers)
+            if response.status_code != 200:
+                await response.aread()
+                raise EndpointStatusError(response.status_code, response.text)
+            pieces = self._stream_pieces(response)
+            try:
+                first = await pieces.__anext__()
+            except StopAsyncIteration:
+                first = None
+            return response, pieces, first
+        except BaseException:
+            if response is not None:
+                await response.aclose()
+            raise
+
+    async def _open_stream(self, payload: dict, headers: dict):
+        """Start a streamed generation on the pool: (endpoint, response, pieces, first piece or None).
+
+        A call still waiting for its first piece after the pool's hedge delay is
+        sent to a second endpoint too and the first one to answer is kept.
+        Calls that fail to connect or get a 5xx move on to the next endpoint.
+        """
+        tried, tasks, launched, hedge_tasks = [], {}, {}, set()
+        last_error = None
+
+        def launch(fallback=True):
+            endpoint = self.pool.acquire(exclude=tried, fallback=fallback)
+            if endpoint is None:
+                return None
+            tried.append(endpoint)
+            task = asyncio.ensure_future(self._start_stream(endpoint, payload, headers))
+            tasks[task], launched[task] = endpoint, time.perf_counter()
+            return task
+
+        if launch() is None:
+            raise Exception("No healthy LLM endpoint available")
+        delay = self.pool.hedge_delay()
+        hedge_at = time.perf_counter() + delay if delay is not None else None
+        try:
+            while tasks:
+                timeout = max(0.0, hedge_at - time.perf_counter()) if hedge_at is not None else None
+                done, _ = await asyncio.wait(list(tasks), timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # Slower than the hedge percentile: race a second endpoint
+                    hedge_at = None
+                    hedge = launch(fallback=False)
+                    if hedge is not None:
+                        hedge_tasks.add(hedge)
+                        self.pool.count_hedge()
+                    continue
+                winner = None
+                for task in done:
+                    endpoint = tasks.pop(task)
+                    try:
+                        response, pieces, first = task.result()
+                    except Exception as e:
+                        self.pool.release(endpoint, ok=not _endpoint_failed(e))
+                        if not _fail_over(e):
+                            raise
+                        last_error = e
+                        continue
+                    if winner is None:
+                        winner = (endpoint, response, pieces, first)
+                        self.pool.observe(endpoint, time.perf_counter() - launched[task])
+                        if task in hedge_tasks:
+                            self.pool.count_hedge(won=True)
                     else:
-                        raw_response = str(result)
+                        await response.aclose()
+                        self.pool.release(endpoint, ok=True)
+                if winner is not None:
+                    return winner
+                if not tasks:
+                    launch()
+        finally:
+            # Losers of a hedge (or everything, if the caller went away) are abandoned
+            for task, endpoint in tasks.items():
+                if task.done() and not task.cancelled() and task.exception() is None:
+                    await task.result()[0].aclose()
                 else:
-                    raw_response = str(result)
-                
-                # Clean the response to extract only the character's reply
-                cleaned_response = self.clean_response(raw_response, prompt)
-                return cleaned_response
-            else:
-                raise Exception(f"Request failed with status code {response.status_code}: {response.text}")
-                
+                    task.cancel()
+                self.pool.release(endpoint, ok=None)
+        raise last_error or Exception("No healthy LLM endpoint available")
+
+    async def astream_response(self, prompt: str, max_length: int = None, temperature: float = None,
+                               stop: list = None):
+        """Yield the cleaned reply in pieces as the endpoint generates it.
+
+        Stop sequences are sent to the endpoint and also applied here: once one
+        shows up (or another stop rule ends the reply) the connection is
+        closed, so an endpoint that ignored them can stop generating.
+        """
+        cleaner = ResponseStreamCleaner(prompt, stop)
+        start = time.perf_counter()
+        first_token = None
+        endpoint = response = None
+        failed = None
+        received, reported = [], None
+
+        async def generated(first, pieces):
+            if first is not None:
+                yield first
+                async for item in pieces:
+                    yield item
+
+        try:
+            payload, headers = self.build_request(prompt, max_length, temperature, stream=True, stop=stop)
+            endpoint, response, pieces, first = await self._open_stream(payload, headers)
+            async for piece, piece_tokens in generated(first, pieces):
+                received.append(piece)
+                reported = piece_tokens if piece_tokens is not None else reported
+                delta = cleaner.feed(piece)
+                if delta:
+                    first_token = first_token or time.perf_counter() - start
+                    yield delta
+                if cleaner.done:
+                    with self._stream_lock:
+                        self.streams_stopped_early += 1
+                    break
+            delta = cleaner.finish()
+            self._count_tokens("".join(received), cleaner.text, reported)
+            if delta:
+                first_token = first_token or time.perf_counter() - start
+                yield delta
+        except httpx.TimeoutException as e:
+            failed = e
+            self._count_stream_failure()
+            raise Exception(f"Error generating response: LLM endpoint timed out ({e!r})")
         except Exception as e:
+            failed = e
+            self._count_stream_failure()
             raise Exception(f"Error generating response: {str(e)}")
+        finally:
+            if response is not None:
+                await response.aclose()
+            if endpoint is not None:
+                self.pool.release(endpoint, ok=failed is None or not _endpoint_failed(failed))
+            with self._stream_lock:
+                self.streams += 1
+                if first_token is not None:
+                    self._first_token_latencies.append(first_token)
+
+    def _count_stream_failure(self):
+        with self._stream_lock:
+            self.stream_failures += 1
+
+    def get_stats(self) -> dict:
+        """Connection pool, retry and latency stats of the LLM endpoint."""
+        with self._stream_lock:
+            latencies = sorted(self._first_token_latencies)
+            stream = {"streams": self.streams, "stopped_early": self.streams_stopped_early,
+                      "failures": self.stream_failures}
+        for name, p in (("first_token_p50_ms", 0.5), ("first_token_p95_ms", 0.95)):
+            stream[name] = round(latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000, 2) if latencies else 0.0
+        with self._token_lock:
+            generated, kept, generations = self.tokens_generated, self.tokens_kept, self.generations
+            tokens = {
+                "generations": generations,
+                "reported_by_endpoint": self.tokens_reported,
+                "tokens_generated": generated,
+                "tokens_kept": kept,
+                "avg_tokens_per_turn": round(generated / generations, 1) if generations else 0.0,
+                "wasted_token_ratio": round(1 - kept / generated, 3) if generated else 0.0,
+            }
+        return {"endpoints": self.pool.get_stats(), "sync": self.client.get_stats(),
+                "async": self.async_client.get_stats(), "stream": stream, "tokens": tokens}
+
+    async def run_health_checks(self):
+        """Actively probe every endpoint until cancelled (see EndpointPool.run_health_checks)."""
+        await self.pool.run_health_checks(self.async_client.probe)
+
+    def close(self):
+        self.client.close()
+
+    async def aclose(self):
+        self.client.close()
+        await self.async_client.aclose()
 
 # Global instance
 phi2_model = Phi2Interface()
 
-def call_llm(prompt: str) -> str:
+def call_llm(prompt: str, stop: list = None) -> str:
     """Main interface function for calling the LLM."""
-    return phi2_model.generate_response(prompt)
+    return phi2_model.generate_response(prompt, stop=stop)
+
+async def call_llm_async(prompt: str, stop: list = None) -> str:
+    """Async interface function for calling the LLM from the API."""
+    return await phi2_model.agenerate_response(prompt, stop=stop)
+
+def stream_llm(prompt: str, stop: list = None):
+    """Async iterator over the cleaned reply as it is generated."""
+    return phi2_model.astream_response(prompt, stop=stop)
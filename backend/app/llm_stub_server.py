@@ -0,0 +1,170 @@
+# app/llm_stub_server.py
+"""
+Stub generation servers for testing the LLM endpoint pool locally.
+
+    python -m app.llm_stub_server --port 9001 --count 3 --delay 0.2 --slow-rate 0.05 --slow-delay 3
+
+starts three servers on ports 9001-9003 that answer POST requests like the
+Phi-2 endpoint (JSON, or Server-Sent Events when the body asks for
+``"stream": true``) and GET /health, with configurable latency, failures and
+stop-sequence support.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_REPLY = "Well met, traveler. The gate stays closed until dawn.\nUser: Why?\n"
+
+
+class StubOptions:
+    def __init__(self, delay=0.1, token_delay=0.02, fail_rate=0.0, slow_rate=0.0, slow_delay=2.0,
+                 reply=DEFAULT_REPLY, ignore_stop=False, unhealthy=False):
+        self.delay = delay
+        self.token_delay = token_delay
+        self.fail_rate = fail_rate
+        self.slow_rate = slow_rate
+        self.slow_delay = slow_delay
+        self.reply = reply
+        self.ignore_stop = ignore_stop
+        self.unhealthy = unhealthy
+
+
+def generate_tokens(reply: str, max_tokens: int, stop: list = None) -> list:
+    """Word tokens of the reply, repeated up to max_tokens and cut at the first stop sequence."""
+    words = reply.replace("\n", " \n ").split(" ")
+    tokens, i = [], 0
+    while len(tokens) < max_tokens and words:
+        word = words[i % len(words)]
+        if word:
+            tokens.append(word if word == "\n" or not tokens or tokens[-1] == "\n" else " " + word)
+        i += 1
+    text = "".join(tokens)
+    cut = min([idx for idx in (text.find(s) for s in stop or []) if idx > 0] or [len(text)])
+    kept, length = [], 0
+    for token in tokens:
+        if length >= cut:
+            break
+        kept.append(token[:cut - length])
+        length += len(token)
+    return kept
+
+
+def make_handler(name: str, options: StubOptions, stats: dict):
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _send_json(self, status: int, body: dict):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if options.unhealthy:
+                self._send_json(503, {"status": "unhealthy", "server": name})
+            else:
+                self._send_json(200, {"status": "ok", "server": name})
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            stats["requests"] += 1
+            if random.random() < options.fail_rate:
+                stats["failures"] += 1
+                self._send_json(503, {"error": "stub failure", "server": name})
+                return
+            delay = options.slow_delay if random.random() < options.slow_rate else options.delay
+            time.sleep(delay)
+            stop = None if options.ignore_stop else body.get("stop")
+            tokens = generate_tokens(options.reply, int(body.get("max_tokens", 100)), stop)
+            if not body.get("stream"):
+                time.sleep(options.token_delay * len(tokens))
+                stats["tokens"] += len(tokens)
+                self._send_json(200, {"response": "".join(tokens), "server": name,
+                                      "usage": {"completion_tokens": len(tokens)}})
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            try:
+                for token in tokens:
+                    self._write_chunk(f"data: {json.dumps({'token': token})}\n\n")
+                    stats["tokens"] += 1
+                    time.sleep(options.token_delay)
+                self._write_chunk(f"data: {json.dumps({'token': '', 'usage': {'completion_tokens': len(tokens)}})}\n\n")
+                self._write_chunk("data: [DONE]\n\n")
+                self.wfile.write(b"0\r\n\r\n")
+            except (BrokenPipeError, ConnectionResetError):
+                # The client stopped reading: generation ends here
+                stats["cancelled"] += 1
+
+        def _write_chunk(self, text: str):
+            data = text.encode()
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+            self.wfile.flush()
+
+        def log_message(self, format, *args):
+            pass
+
+    return StubHandler
+
+
+def start_stub_servers(port: int = 9001, count: int = 1, host: str = "127.0.0.1", options: StubOptions = None):
+    """Start ``count`` stub servers on consecutive ports in background threads.
+
+    Port 0 gives each server a free port. Returns (servers, urls, stats); stop
+    them with ``server.shutdown()``.
+    """
+    options = options or StubOptions()
+    servers, urls, stats = [], [], []
+    for i in range(count):
+        counters = {"requests": 0, "failures": 0, "tokens": 0, "cancelled": 0}
+        server = ThreadingHTTPServer((host, port + i if port else 0), None)
+        bound = server.server_address[1]
+        server.RequestHandlerClass = make_handler(f"stub-{bound}", options, counters)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        urls.append(f"http://{host}:{bound}/generate")
+        stats.append(counters)
+    return servers, urls, stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run stub LLM generation servers")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9001, help="First port")
+    parser.add_argument("--count", type=int, default=1, help="Number of servers on consecutive ports")
+    parser.add_argument("--delay", type=float, default=0.1, help="Seconds before the first token")
+    parser.add_argument("--token-delay", type=float, default=0.02, help="Seconds per generated token")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Fraction of requests answered with 503")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="Fraction of requests delayed by --slow-delay")
+    parser.add_argument("--slow-delay", type=float, default=2.0, help="Seconds before the first token of slow requests")
+    parser.add_argument("--reply", default=DEFAULT_REPLY, help="Text the servers generate (repeated up to max_tokens)")
+    parser.add_argument("--ignore-stop", action="store_true", help="Generate past stop sequences")
+    parser.add_argument("--unhealthy", action="store_true", help="Answer health checks (GET) with 503")
+    args = parser.parse_args(argv)
+
+    options = StubOptions(args.delay, args.token_delay, args.fail_rate, args.slow_rate, args.slow_delay,
+                          args.reply, args.ignore_stop, args.unhealthy)
+    servers, urls, stats = start_stub_servers(args.port, args.count, args.host, options)
+    print(f"✅ {len(servers)} stub LLM servers running")
+    print(f"LLM_ENDPOINT_URLS={','.join(urls)}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        for server in servers:
+            server.shutdown()
+        for url, counters in zip(urls, stats):
+            print(f"{url}: {counters}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+# app/model_registry.py
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from app.utils.memory import current_rss_bytes, format_bytes
+from config.settings import EMBEDDING_MODEL, EMBEDDING_DEVICE
+
+
+class ModelRegistry:
+    """Process-wide registry of SentenceTransformer models keyed by (model name, device).
+
+    Each model is loaded once and the same instance is shared by the retriever,
+    the universe embedder and the legacy embedder.
+    """
+
+    def __init__(self):
+        self._models: Dict[Tuple[str, str], object] = {}
+        self._stats: Dict[Tuple[str, str], dict] = {}
+        self._tokenizers: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(model_name: Optional[str], device: Optional[str]) -> Tuple[str, str]:
+        return (model_name or EMBEDDING_MODEL, device or EMBEDDING_DEVICE or "auto")
+
+    def get_model(self, model_name: str = None, device: str = None):
+        """Return the shared model instance, loading it on first use."""
+        key = self._key(model_name, device)
+        model = self._models.get(key)
+        if model is not None:
+            return model
+
+        with self._lock:
+            # Another thread may have finished loading while we waited
+            model = self._models.get(key)
+            if model is not None:
+                return model
+            model = self._load(key)
+            self._models[key] = model
+            return model
+
+    def _load(self, key: Tuple[str, str]):
+        from sentence_transformers import SentenceTransformer
+
+        name, device = key
+        rss_before = current_rss_bytes()
+        start = time.perf_counter()
+        model = SentenceTransformer(name, device=None if device == "auto" else device)
+        load_seconds = time.perf_counter() - start
+        rss_after = current_rss_bytes()
+
+        param_bytes = 0
+        try:
+            param_bytes = sum(p.numel() * p.element_size() for p in model.parameters())
+        except Exception:
+            pass
+
+        self._stats[key] = {
+            "model_name": name,
+            "device": str(getattr(model, "device", device)),
+            "load_seconds": round(load_seconds, 3),
+            "parameter_bytes": param_bytes,
+            "rss_delta_bytes": max(rss_after - rss_before, 0),
+            "warmed_up": False,
+        }
+        print(f"Loaded embedding model {name} on {self._stats[key]['device']} in {load_seconds:.2f}s "
+              f"(parameters: {format_bytes(param_bytes)}, RSS +{format_bytes(rss_after - rss_before)})")
+        return model
+
+    def warm_up(self, model_name: str = None, device: str = None):
+        """Load the model and run one dummy encode so the first real query is not slow."""
+        key = self._key(model_name, device)
+        model = self.get_model(*key)
+        start = time.perf_counter()
+        model.encode(["warm up"])
+        self._stats[key]["warmed_up"] = True
+        self._stats[key]["warmup_seconds"] = round(time.perf_counter() - start, 3)
+        return model
+
+    def get_tokenizer(self, model_name: str = None):
+        """Tokenizer of an embedding model, loaded on its own if the model is not resident.
+
+        Returns None if it cannot be loaded (callers then estimate token counts).
+        """
+        name = model_name or EMBEDDING_MODEL
+        for (loaded_name, _), model in list(self._models.items()):
+            if loaded_name == name and getattr(model, "tokenizer", None) is not None:
+                return model.tokenizer
+        if name not in self._tokenizers:
+            try:
+                from transformers import AutoTokenizer
+                # SentenceTransformer resolves bare model names to the sentence-transformers organisation
+                repo = name if "/" in name else f"sentence-transformers/{name}"
+                self._tokenizers[name] = AutoTokenizer.from_pretrained(repo)
+            except Exception as e:
+                print(f"Warning: Could not load tokenizer for {name}, estimating token counts: {e}")
+                self._tokenizers[name] = None
+        return self._tokenizers[name]
+
+    def is_loaded(self, model_name: str = None, device: str = None) -> bool:
+        """True if the model is already resident (never triggers a load)."""
+        return self._key(model_name, device) in self._models
+
+    def unload(self, model_name: str = None, device: str = None):
+        """Drop a model from the registry."""
+        key = self._key(model_name, device)
+        with self._lock:
+            self._models.pop(key, None)
+            self._stats.pop(key, None)
+
+    def get_stats(self) -> dict:
+        """Load time and memory cost of every resident model."""
+        return {
+            "models": [dict(stats) for stats in self._stats.values()],
+            "process_rss_bytes": current_rss_bytes(),
+        }
+
+
+# Global registry instance
+model_registry = ModelRegistry()
+
+
+def get_embedding_model(model_name: str = None, device: str = None):
+    """Shortcut for the shared embedding model."""
+    return model_registry.get_model(model_name, device)
@@ -0,0 +1,156 @@
+# app/parallel_build.py
+"""
+Parallel index builds for many universes on a process pool.
+
+Each worker process loads one copy of the embedding model. The build runs in
+two phases:
+
+1. Encode: the chunks of every universe are de-duplicated and cut into
+   equally sized work units, so small universes share encode batches and
+   large ones are spread over all workers.
+2. Index: every universe is built in a worker from the vectors of phase 1
+   (FAISS training, BM25 and the snapshot write also run in parallel).
+
+Vectors never pass between processes: phase 1 workers store what they encode
+in the persistent embedding cache (shared by all workers, see
+app.embedding_cache) and phase 2 workers read it back by text key. Without
+the cache there is nothing to share, so each universe is encoded by its own
+worker in phase 2.
+"""
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import List
+
+from app.embedding_cache import get_embedding_cache
+from config.settings import (
+    EMBEDDING_MODEL, EMBEDDING_CACHE_ENABLED, EMBEDDING_CACHE_MAX_ENTRIES, BUILD_ENCODE_UNIT
+)
+
+MODEL_NAME = EMBEDDING_MODEL
+
+
+def available_cores() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def _init_worker(threads: int):
+    """Give each worker an equal share of the cores and load its model copy."""
+    from app.faiss_manager import configure_faiss_threads
+    from app.model_registry import model_registry
+
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    configure_faiss_threads(threads)
+    model_registry.get_model(MODEL_NAME)
+
+
+def _encode_unit(texts: List[str]) -> int:
+    """Encode one work unit into the embedding cache; returns how many texts were not cached yet."""
+    from app.model_registry import get_embedding_model
+
+    model = get_embedding_model(MODEL_NAME)
+    cache = get_embedding_cache(MODEL_NAME, model.get_sentence_embedding_dimension())
+    misses = cache.misses
+    cache.encode(model, texts)
+    return cache.misses - misses
+
+
+def _build_unit(universe: str, full_rebuild: bool):
+    from app.universe_embedder import build_universe_index
+
+    start = time.perf_counter()
+    chunk_count = build_universe_index(universe, full_rebuild=full_rebuild)
+    return chunk_count, time.perf_counter() - start
+
+
+def pack_units(texts: List[str], unit_size: int, workers: int) -> List[List[str]]:
+    """Cut texts into units of at most ``unit_size``, with at least one unit per worker when possible."""
+    if not texts:
+        return []
+    unit_size = max(1, min(unit_size, -(-len(texts) // workers)))
+    return [texts[i:i + unit_size] for i in range(0, len(texts), unit_size)]
+
+
+def build_universes_parallel(universes: List[str], full_rebuild: bool = False, workers: int = 0,
+                             unit_size: int = BUILD_ENCODE_UNIT) -> dict:
+    """Build the indices of several universes on a process pool and return a throughput summary."""
+    from app.universe_embedder import collect_universe_chunks
+
+    workers = workers or available_cores()
+    workers = max(1, min(workers, available_cores()))
+    threads = max(1, available_cores() // workers)
+    started = time.perf_counter()
+
+    # Collect every universe's chunks up front (cheap, no model needed)
+    texts_by_universe = {universe: collect_universe_chunks(universe) for universe in universes}
+    unique_texts = list(dict.fromkeys(t for texts in texts_by_universe.values() for t in texts))
+    # Phase 1 hands its vectors to phase 2 through the cache, so it only pays off with one
+    units = pack_units(unique_texts, unit_size, workers) if EMBEDDING_CACHE_ENABLED else []
+    del texts_by_universe
+    print(f"Building {len(universes)} universes on {workers} worker processes "
+          f"({len(unique_texts)} unique chunks in {len(units)} encode units).")
+    if EMBEDDING_CACHE_ENABLED and len(unique_texts) > EMBEDDING_CACHE_MAX_ENTRIES:
+        print(f"Warning: {len(unique_texts)} chunks do not fit in the embedding cache "
+              f"(EMBEDDING_CACHE_MAX_ENTRIES={EMBEDDING_CACHE_MAX_ENTRIES}); evicted ones are encoded again.")
+
+    summary = {"workers": workers, "threads_per_worker": threads, "universes": {}}
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx,
+                             initializer=_init_worker, initargs=(threads,)) as pool:
+        # Phase 1: encode all chunks, small universes packed into shared units
+        encode_start = time.perf_counter()
+        encoded = sum(future.result() for future in as_completed([pool.submit(_encode_unit, unit)
+                                                                   for unit in units]))
+        encode_seconds = time.perf_counter() - encode_start if units else 0.0
+        if not EMBEDDING_CACHE_ENABLED:
+            # Encoded by the universe builds of phase 2
+            encoded = len(unique_texts)
+        del units
+
+        # Phase 2: build every universe, reading its vectors from the cache
+        index_start = time.perf_counter()
+        futures = {pool.submit(_build_unit, universe, full_rebuild): universe for universe in universes}
+        for future in as_completed(futures):
+            universe = futures[future]
+            try:
+                chunk_count, seconds = future.result()
+                summary["universes"][universe] = {"chunks": chunk_count, "build_seconds": round(seconds, 3)}
+            except Exception as e:
+                print(f"Error building index for {universe}: {e}")
+                summary["universes"][universe] = {"error": str(e)}
+        index_seconds = time.perf_counter() - index_start
+
+    total_seconds = time.perf_counter() - started
+    summary.update({
+        "chunks": len(unique_texts),
+        "encoded": encoded,
+        "cached": len(unique_texts) - encoded,
+        "encode_seconds": round(encode_seconds, 3),
+        "index_seconds": round(index_seconds, 3),
+        "total_seconds": round(total_seconds, 3),
+        "encode_chunks_per_second": round(encoded / encode_seconds, 2) if encode_seconds and encoded else 0.0,
+        "chunks_per_second": round(len(unique_texts) / total_seconds, 2) if total_seconds else 0.0,
+    })
+    print_summary(summary)
+    return summary
+
+
+def print_summary(summary: dict):
+    print(f"\n📊 Parallel build: {len(summary['universes'])} universes, {summary['chunks']} chunks "
+          f"({summary['encoded']} encoded, {summary['cached']} from cache) on {summary['workers']} workers")
+    print(f"   Encode: {summary['encode_seconds']:.2f}s ({summary['encode_chunks_per_second']:.1f} chunks/s) | "
+          f"Index: {summary['index_seconds']:.2f}s | Total: {summary['total_seconds']:.2f}s "
+          f"({summary['chunks_per_second']:.1f} chunks/s)")
+    for universe, result in sorted(summary["universes"].items()):
+        if "error" in result:
+            print(f"   ❌ {universe}: {result['error']}")
+        else:
+            print(f"   ✅ {universe}: {result['chunks']} chunks in {result['build_seconds']:.2f}s")
@@ -129,6 +129,23 @@ User: {query}
     
     return prompt
 
+# The model starting another turn of the conversation
+DIALOG_PATTERNS = [
+    "\nUser:",
+    "\nAI:",
+    "\nBOT:",
+    "\nSAM:",
+    "\nAlex:",
+    "\nKael Vire:"
+]
+
+def dialog_stop_sequences(character_name: str = None) -> list[str]:
+    """Dialog continuation patterns for a reply of character_name, its own next turn included."""
+    patterns = list(DIALOG_PATTERNS)
+    if character_name:
+        patterns.insert(1, f"\n{character_name}:")
+    return list(dict.fromkeys(patterns))
+
 def clean_response(response: str) -> str:
     """Clean the response to remove prompt injection artifacts and dialog continuation."""
     if not response:
@@ -168,16 +185,7 @@ def clean_response(response: str) -> str:
                     cleaned = cleaned[next_line:].strip()
     
     # Remove dialog continuation patterns
-    dialog_patterns = [
-        "\nUser:",
-        "\nAI:",
-        "\nBOT:",
-        "\nSAM:",
-        "\nAlex:",
-        "\nKael Vire:"
-    ]
-    
-    for pattern in dialog_patterns:
+    for pattern in DIALOG_PATTERNS:
         if pattern in cleaned:
             # Keep only the first response, remove everything after dialog continuation
             pos = cleaned.find(pattern)
@@ -1,16 +1,14 @@
 # app/rag_pipeline.py
-from app.retriever import get_relevant_docs_for_universe
+from app.retriever import get_relevant_docs_for_universe, character_scope
 from app.prompt_templates import format_prompt_character_focused
-from app.llm_interface import call_llm
-from app.universe_manager import list_universes, load_universe_manifest, load_characters
+from app.llm_interface import call_llm, call_llm_async, stream_llm, stop_sequences
+from app.universe_manager import list_universes, load_characters
 from app.character import Character
 from app.conversation_manager import conversation_manager
+from app.executors import executors
 
-def answer_question(query: str, universe: str, character: Character, debug: bool = False) -> dict:
-    """Answer a question using RAG with conversation history and dynamic character state changes."""
-    # Get relevant context chunks (limit to 3 for smaller models)
-    context_chunks = get_relevant_docs_for_universe(query, universe, k=3)
-    
+def _build_prompt(query: str, universe: str, character: Character, context_chunks) -> dict:
+    """Prompt and the context pieces it was built from."""
     # Create enhanced character description with current state
     character_desc = f"{character.name}, a {character.role} from {character.location}"
     
@@ -28,10 +26,17 @@ def answer_question(query: str, universe: str, character: Character, debug: bool
         query, context_chunks, character_desc, conversation_history, 
         important_events, character_state
     )
-    
-    # Generate response
-    response = call_llm(full_prompt)
-    
+    return {
+        "conversation_history": conversation_history,
+        "important_events": important_events,
+        "character_state": character_state,
+        "full_prompt": full_prompt,
+        # Where the character's reply ends, so the endpoint can stop generating there
+        "stop": stop_sequences(character.name),
+    }
+
+def _record_turn(query: str, universe: str, character: Character, response: str, save: bool = True):
+    """Add the exchange to the history and apply the character changes it implies."""
     # Add messages to conversation history
     conversation_manager.add_message(character.name, universe, "user", query)
     conversation_manager.add_message(character.name, universe, "assistant", response)
@@ -43,22 +48,21 @@ def answer_question(query: str, universe: str, character: Character, debug: bool
     
     # Apply changes to character
     changes_made = conversation_manager.apply_character_changes(
-        character, emotion_changes, inventory_changes
+        character, emotion_changes, inventory_changes, save=save
     )
-    
-    # Save conversations and events
-    conversation_manager.save_conversations()
-    conversation_manager.save_character_events()
-    
+    return emotion_changes, inventory_changes, changes_made
+
+def _result(query: str, universe: str, character: Character, debug: bool, context_chunks, prompt: dict,
+            response: str, emotion_changes: dict, inventory_changes: dict, changes_made: bool) -> dict:
     if debug:
         return {
             "response": response,
             "debug_info": {
                 "query": query,
                 "retrieved_context": context_chunks,
-                "conversation_history": conversation_history,
-                "important_events": important_events,
-                "character_state": character_state,
+                "conversation_history": prompt["conversation_history"],
+                "important_events": prompt["important_events"],
+                "character_state": prompt["character_state"],
                 "emotion_changes": emotion_changes,
                 "inventory_changes": inventory_changes,
                 "changes_applied": changes_made,
@@ -70,7 +74,7 @@ def answer_question(query: str, universe: str, character: Character, debug: bool
                     "backstory": character.backstory,
                     "location": character.location
                 },
-                "full_prompt": full_prompt,
+                "full_prompt": prompt["full_prompt"],
                 "universe": universe
             }
         }
@@ -82,6 +86,74 @@ def answer_question(query: str, universe: str, character: Character, debug: bool
             "inventory_changes": inventory_changes
         }
 
+def answer_question(query: str, universe: str, character: Character, debug: bool = False,
+                    query_vector=None) -> dict:
+    """Answer a question using RAG with conversation history and dynamic character state changes."""
+    # Get relevant context chunks (limit to 3 for smaller models), scoped to lore plus this character
+    context_chunks = get_relevant_docs_for_universe(
+        query, universe, k=3, query_vector=query_vector, scope=character_scope(character.name)
+    )
+    prompt = _build_prompt(query, universe, character, context_chunks)
+    
+    # Generate response
+    response = call_llm(prompt["full_prompt"], stop=prompt["stop"])
+    
+    emotion_changes, inventory_changes, changes_made = _record_turn(query, universe, character, response)
+    
+    # Save conversations and events
+    conversation_manager.save_conversations()
+    conversation_manager.save_character_events()
+    
+    return _result(query, universe, character, debug, context_chunks, prompt, response,
+                   emotion_changes, inventory_changes, changes_made)
+
+async def _retrieve_async(query: str, universe: str, character: Character, query_vector=None):
+    return await executors.run(
+        "retrieval", get_relevant_docs_for_universe,
+        query, universe, k=3, query_vector=query_vector, scope=character_scope(character.name)
+    )
+
+async def _finish_turn_async(query: str, universe: str, character: Character, response: str):
+    """Record the exchange; history and character state change in memory, only the writes leave the event loop."""
+    emotion_changes, inventory_changes, changes_made = _record_turn(query, universe, character, response,
+                                                                    save=False)
+    if changes_made:
+        await executors.run("io", conversation_manager.save_character_state, character)
+    await executors.run("io", conversation_manager.write_snapshot, conversation_manager.snapshot())
+    return emotion_changes, inventory_changes, changes_made
+
+async def answer_question_async(query: str, universe: str, character: Character, debug: bool = False,
+                                query_vector=None) -> dict:
+    """answer_question for the API: retrieval and file writes run on the executors, the LLM call is awaited."""
+    context_chunks = await _retrieve_async(query, universe, character, query_vector)
+    prompt = _build_prompt(query, universe, character, context_chunks)
+    
+    response = await call_llm_async(prompt["full_prompt"], stop=prompt["stop"])
+    
+    emotion_changes, inventory_changes, changes_made = await _finish_turn_async(query, universe, character, response)
+    return _result(query, universe, character, debug, context_chunks, prompt, response,
+                   emotion_changes, inventory_changes, changes_made)
+
+async def stream_answer(query: str, universe: str, character: Character, debug: bool = False,
+                        query_vector=None):
+    """Streaming answer_question_async: yields ("token", text) pieces of the reply as they are
+    generated, then ("done", result) once the turn has been analyzed and saved.
+
+    A turn whose stream is abandoned (e.g. the player disconnects) is not recorded.
+    """
+    context_chunks = await _retrieve_async(query, universe, character, query_vector)
+    prompt = _build_prompt(query, universe, character, context_chunks)
+    
+    pieces = []
+    async for piece in stream_llm(prompt["full_prompt"], stop=prompt["stop"]):
+        pieces.append(piece)
+        yield "token", piece
+    response = "".join(pieces)
+    
+    emotion_changes, inventory_changes, changes_made = await _finish_turn_async(query, universe, character, response)
+    yield "done", _result(query, universe, character, debug, context_chunks, prompt, response,
+                          emotion_changes, inventory_changes, changes_made)
+
 def clear_conversation(character_name: str, universe: str):
     """Clear conversation history for a character."""
     conversation_manager.clear_conversation(character_name, universe)
@@ -1,32 +1,230 @@
 # app/retriever.py
+import threading
+import time
+from collections import OrderedDict
 import numpy as np
-from sentence_transformers import SentenceTransformer
-from app.faiss_manager import FaissManager
 from pathlib import Path
+from app.chunk_store import open_chunks
+from app.index_cache import index_cache
+from app.model_registry import get_embedding_model, model_registry
+from app.embedding_cache import cached_encode, normalize_text
+from config.settings import (
+    EMBEDDING_MODEL, QUERY_CACHE_SIZE, QUERY_CACHE_TTL, RETRIEVAL_MODE, HYBRID_ALPHA, HYBRID_CANDIDATES,
+    RETRIEVAL_SCOPE, SCOPE_BOOST
+)
 
 INDEX_PATH = "data/index/faiss.index"
-CHUNK_PATH = "data/index/chunks.txt"
-MODEL_NAME = "all-MiniLM-L6-v2"
+MODEL_NAME = EMBEDDING_MODEL
+# Chunk types that belong to the whole universe rather than to one character
+LORE_CHUNK_TYPES = ("universe", "role", "lore")
+_NO_HITS = (np.empty(0, dtype=np.float32), np.empty(0, dtype=np.int64))
+
+class QueryEmbeddingCache:
+    """In-process LRU cache of query vectors keyed by (model name, normalized query).
+    
+    Entries optionally expire after ``ttl`` seconds (0 disables expiry).
+    """
+    
+    def __init__(self, capacity: int = QUERY_CACHE_SIZE, ttl: float = QUERY_CACHE_TTL):
+        self.capacity = capacity
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    @staticmethod
+    def _key(model_name: str, query: str):
+        # MiniLM-style models are uncased, so "Hello " and "hello" share an entry
+        return (model_name, normalize_text(query).casefold())
+    
+    def get(self, model_name: str, query: str):
+        key = self._key(model_name, query)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                vector, stored_at = entry
+                if not self.ttl or time.monotonic() - stored_at < self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return vector
+                del self._entries[key]
+            self.misses += 1
+            return None
+    
+    def put(self, model_name: str, query: str, vector: np.ndarray):
+        if self.capacity <= 0:
+            return
+        key = self._key(model_name, query)
+        with self._lock:
+            self._entries[key] = (vector, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+    
+    def get_stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "capacity": self.capacity,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+# Global query cache instance
+query_cache = QueryEmbeddingCache()
+
+def embed_queries(queries: list[str], model_name: str = MODEL_NAME) -> np.ndarray:
+    """Encode queries with a single model call and add them to the query cache (shape: [n, dim]).
+    
+    Callers have already missed the query cache (see EmbeddingBatcher.encode).
+    """
+    model = get_embedding_model(model_name)
+    vectors = np.ascontiguousarray(cached_encode(model, queries, model_name), dtype=np.float32)
+    for row, query in enumerate(queries):
+        vec = vectors[row:row + 1].copy()
+        vec.flags.writeable = False
+        query_cache.put(model_name, query, vec)
+    return vectors
+
+def encode_queries(queries: list[str], model_name: str = MODEL_NAME) -> np.ndarray:
+    """Encode many queries with a single model call for the ones not cached yet (shape: [n, dim])."""
+    cached = [query_cache.get(model_name, q) for q in queries]
+    missing = [i for i, vec in enumerate(cached) if vec is None]
+    if missing:
+        fresh = embed_queries([queries[i] for i in missing], model_name)
+        for row, i in enumerate(missing):
+            cached[i] = fresh[row:row + 1]
+    return np.ascontiguousarray(np.vstack(cached), dtype=np.float32)
+
+def encode_query(query: str, model_name: str = MODEL_NAME) -> np.ndarray:
+    """Return the query embedding (shape: [1, dim]), skipping the model for repeated queries."""
+    query_vec = query_cache.get(model_name, query)
+    if query_vec is None:
+        model = get_embedding_model(model_name)
+        query_vec = cached_encode(model, [query], model_name)
+        # Cached vectors are shared between requests, so keep them read-only
+        query_vec.flags.writeable = False
+        query_cache.put(model_name, query, query_vec)
+    return query_vec
 
 # Legacy function for backward compatibility
 def get_relevant_docs(query: str, k: int = 5) -> list[str]:
     # This uses the old global index
     import faiss
-    model = SentenceTransformer(MODEL_NAME)
-    query_vec = model.encode([query])
+    query_vec = encode_query(query)
     index = faiss.read_index(INDEX_PATH)
     distances, indices = index.search(np.array(query_vec), k)
-    with open(CHUNK_PATH, "r", encoding="utf-8") as f:
-        chunks = f.read().split("\n---\n")
-    return [chunks[i] for i in indices[0]]
-
-def get_relevant_docs_for_universe(query: str, universe: str, k: int = 5) -> list[str]:
-    """Retrieve relevant docs for a given universe using its FAISS index and chunk file."""
-    model = SentenceTransformer(MODEL_NAME)
-    query_vec = model.encode([query])
-    faiss_manager = FaissManager(universe, dim=query_vec.shape[1])
-    distances, indices = faiss_manager.query(np.array(query_vec[0]), top_k=k)
-    chunk_path = Path("data") / universe / "faiss_index" / "chunks.txt"
-    with open(chunk_path, "r", encoding="utf-8") as f:
-        chunks = f.read().split("\n---\n")
-    return [chunks[i] for i in indices]
+    chunks = open_chunks(Path(INDEX_PATH).parent)
+    return [chunks[i] for i in indices[0] if i >= 0]
+
+def _normalize_scores(scores: np.ndarray) -> np.ndarray:
+    """Min-max scale scores to [0, 1] so vector and lexical scores can be mixed."""
+    if len(scores) == 0:
+        return scores
+    low, high = float(scores.min()), float(scores.max())
+    if high - low < 1e-9:
+        return np.ones_like(scores, dtype=np.float32)
+    return (scores - low) / (high - low)
+
+def fuse_results(vector_hits, lexical_hits, k: int, alpha: float = HYBRID_ALPHA,
+                 boost_ids: np.ndarray = None, boost: float = SCOPE_BOOST) -> list[int]:
+    """Combine (distances, ids) from FAISS and (scores, ids) from BM25 into the top-k ids.
+    
+    Chunks listed in ``boost_ids`` get ``boost`` added to their fused score.
+    """
+    combined = {}
+    distances, ids = vector_hits
+    valid = ids >= 0
+    for chunk_id, score in zip(ids[valid], _normalize_scores(-distances[valid])):
+        combined[int(chunk_id)] = alpha * float(score)
+    scores, ids = lexical_hits
+    for chunk_id, score in zip(ids, _normalize_scores(scores)):
+        combined[int(chunk_id)] = combined.get(int(chunk_id), 0.0) + (1 - alpha) * float(score)
+    if boost_ids is not None and combined:
+        candidates = np.fromiter(combined, dtype=np.int64, count=len(combined))
+        for chunk_id in candidates[np.isin(candidates, boost_ids)]:
+            combined[int(chunk_id)] += boost
+    return sorted(combined, key=combined.get, reverse=True)[:k]
+
+def character_scope(character_name: str) -> list[dict]:
+    """Retrieval scope covering the universe lore plus every chunk about one character."""
+    return [{"type": chunk_type} for chunk_type in LORE_CHUNK_TYPES] + [{"character": character_name}]
+
+def search_universe(query: str, universe: str, k: int = 5, query_vector: np.ndarray = None,
+                    mode: str = None, scope: list[dict] = None, scope_mode: str = None, cached=None) -> list[int]:
+    """Return the ids of the best chunks for a query using vector, lexical or hybrid retrieval.
+    
+    ``scope`` is a list of tag dicts (see ChunkMetadata.select). With ``scope_mode``
+    "filter" only matching chunks are searched, with "boost" they are ranked higher
+    and with "universe" the scope is ignored (default: RETRIEVAL_SCOPE).
+    The ids belong to the snapshot of ``cached`` (an index_cache entry, looked
+    up if not given); read their chunks from that same entry.
+    """
+    mode = mode or RETRIEVAL_MODE
+    scope_mode = scope_mode or RETRIEVAL_SCOPE
+    if cached is None:
+        cached = index_cache.get(universe, dim=query_vector.shape[1] if query_vector is not None else None)
+    if cached.lexical is None:
+        mode = "vector"
+    elif mode != "lexical" and query_vector is None and not model_registry.is_loaded(MODEL_NAME):
+        # Cheap fallback while the embedding model is still loading
+        mode = "lexical"
+    
+    allowed, boost_ids = None, None
+    if scope and scope_mode != "universe" and cached.metadata is not None:
+        scoped_ids = cached.metadata.select(scope)
+        if scope_mode == "boost":
+            boost_ids = scoped_ids
+        else:
+            allowed = scoped_ids
+            if not len(allowed):
+                return []
+    # Boosting re-ranks a wider candidate list; filtering only needs k hits
+    top_k = k if boost_ids is None and mode != "hybrid" else max(k, HYBRID_CANDIDATES)
+    
+    lexical_hits, vector_hits = _NO_HITS, _NO_HITS
+    if mode in ("lexical", "hybrid"):
+        lexical_hits = cached.lexical.search(query, top_k=top_k, ids=allowed)
+    if mode in ("vector", "hybrid"):
+        query_vec = query_vector if query_vector is not None else encode_query(query)
+        vector_hits = cached.faiss_manager.query(np.array(query_vec[0]), top_k=top_k, ids=allowed)
+    
+    if mode == "hybrid" or boost_ids is not None:
+        alpha = {"vector": 1.0, "lexical": 0.0}.get(mode, HYBRID_ALPHA)
+        return fuse_results(vector_hits, lexical_hits, k, alpha=alpha, boost_ids=boost_ids)
+    if mode == "lexical":
+        return lexical_hits[1].tolist()
+    return [int(i) for i in vector_hits[1] if i >= 0]
+
+def get_relevant_docs_for_universe(query: str, universe: str, k: int = 5, query_vector: np.ndarray = None,
+                                   mode: str = None, scope: list[dict] = None, scope_mode: str = None) -> list[str]:
+    """Retrieve relevant docs for a given universe using its FAISS/BM25 indices and chunk store.
+    
+    ``mode`` is "vector", "lexical" or "hybrid" (default: RETRIEVAL_MODE). Pass
+    ``query_vector`` when the query was already embedded (e.g. by the embedding batcher),
+    and ``scope`` (e.g. ``character_scope(name)``) to restrict or boost tagged chunks.
+    """
+    # One cache entry for ids and chunks, so a snapshot published in between cannot mix them
+    cached = index_cache.get(universe, dim=query_vector.shape[1] if query_vector is not None else None)
+    ids = search_universe(query, universe, k=k, query_vector=query_vector, mode=mode,
+                          scope=scope, scope_mode=scope_mode, cached=cached)
+    return [cached.chunks[i] for i in ids]
+
+def get_relevant_docs_batch(queries: list[str], universe: str, k: int = 5) -> list[list[str]]:
+    """Retrieve docs for many queries (e.g. every NPC line in a game tick) with one encode and one search."""
+    if not queries:
+        return []
+    query_vecs = encode_queries(queries)
+    cached = index_cache.get(universe, dim=query_vecs.shape[1])
+    distances, indices = cached.faiss_manager.search_batch(query_vecs, top_k=k)
+    return [[cached.chunks[i] for i in row if i >= 0] for row in indices]
@@ -0,0 +1,129 @@
+# app/snapshots.py
+"""
+Versioned index snapshots for a universe.
+
+Every build writes a complete snapshot (FAISS index, chunk store, BM25 index,
+tags and chunk manifest) into ``faiss_index/snapshots/<version>/`` and then
+publishes it by atomically replacing the ``faiss_index/CURRENT`` pointer, so
+readers always see one consistent set of files. Readers hold a shared lock on
+the snapshot they serve; old snapshots are only deleted when nobody holds one.
+"""
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import List, Optional
+
+from config.settings import INDEX_SNAPSHOTS_KEEP
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+SNAPSHOTS_DIR = "snapshots"
+CURRENT_FILE = "CURRENT"
+LEASE_FILE = ".lease"
+
+
+def index_root(universe: str) -> Path:
+    return Path("data") / universe / "faiss_index"
+
+
+def current_version(universe: str) -> Optional[str]:
+    """Name of the published snapshot, or None for the legacy single-directory layout."""
+    try:
+        version = (index_root(universe) / CURRENT_FILE).read_text(encoding="utf-8").strip()
+    except FileNotFoundError:
+        return None
+    return version or None
+
+
+def snapshot_dir(universe: str, version: Optional[str]) -> Path:
+    """Directory of a snapshot (the index root itself for the legacy layout)."""
+    if version is None:
+        return index_root(universe)
+    return index_root(universe) / SNAPSHOTS_DIR / version
+
+
+def current_snapshot_dir(universe: str) -> Path:
+    """Directory of the snapshot queries should currently be served from."""
+    return snapshot_dir(universe, current_version(universe))
+
+
+def list_snapshots(universe: str) -> List[str]:
+    """Snapshot versions on disk, oldest first."""
+    snapshots = index_root(universe) / SNAPSHOTS_DIR
+    if not snapshots.exists():
+        return []
+    return sorted(p.name for p in snapshots.iterdir() if p.is_dir())
+
+
+def new_snapshot_dir(universe: str) -> Path:
+    """Create an empty directory for the next snapshot (versions sort chronologically)."""
+    path = snapshot_dir(universe, f"v{time.time_ns()}")
+    path.mkdir(parents=True)
+    return path
+
+
+def publish_snapshot(universe: str, path: Path):
+    """Atomically point CURRENT at a fully written snapshot directory."""
+    pointer = index_root(universe) / CURRENT_FILE
+    tmp_pointer = pointer.with_name(f"{CURRENT_FILE}.{os.getpid()}.tmp")
+    with open(tmp_pointer, "w", encoding="utf-8") as f:
+        f.write(Path(path).name)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_pointer, pointer)
+
+
+def discard_snapshot(path: Path):
+    """Delete an unpublished snapshot, e.g. after a failed build."""
+    shutil.rmtree(path, ignore_errors=True)
+
+
+def acquire_lease(path: Path):
+    """Take a shared lock on a snapshot so it is not garbage-collected while served.
+
+    Returns an open file to close when done (None for the legacy layout or
+    without fcntl).
+    """
+    if fcntl is None or Path(path).parent.name != SNAPSHOTS_DIR:
+        return None
+    try:
+        lease = open(Path(path) / LEASE_FILE, "a")
+    except OSError:
+        return None
+    fcntl.flock(lease, fcntl.LOCK_SH)
+    return lease
+
+
+def _remove_unused(path: Path) -> bool:
+    """Delete a snapshot unless a reader holds its lease."""
+    if fcntl is None:
+        shutil.rmtree(path, ignore_errors=True)
+        return True
+    try:
+        with open(path / LEASE_FILE, "a") as lease:
+            # Hold the exclusive lock while deleting, so no reader can take a lease meanwhile
+            fcntl.flock(lease, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            shutil.rmtree(path, ignore_errors=True)
+        return True
+    except BlockingIOError:
+        return False
+    except FileNotFoundError:
+        return True
+
+
+def gc_snapshots(universe: str, keep: int = INDEX_SNAPSHOTS_KEEP) -> List[str]:
+    """Delete old snapshots no process is serving, keeping the ``keep`` newest besides CURRENT."""
+    current = current_version(universe)
+    older = [v for v in list_snapshots(universe) if v != current]
+    if current is not None:
+        # Snapshots newer than CURRENT belong to builds still in progress
+        older = [v for v in older if v < current]
+    removed = []
+    for version in older[:max(0, len(older) - keep)]:
+        if _remove_unused(snapshot_dir(universe, version)):
+            removed.append(version)
+    return removed
@@ -1,30 +1,41 @@
-from sentence_transformers import SentenceTransformer
 import faiss
 import numpy as np
 import json
+import hashlib
+import itertools
 from pathlib import Path
-from app.faiss_manager import FaissManager
+from typing import Iterable, Iterator
+from app.faiss_manager import FaissManager, choose_index_config
+from app.chunk_store import write_chunk_store
+from app.lexical_index import LexicalIndex
+from app.chunk_metadata import ChunkMetadata
+from app.index_cache import index_cache
+from app.snapshots import new_snapshot_dir, publish_snapshot, discard_snapshot, gc_snapshots
 from app.universe_manager import load_characters, load_universe_manifest
+from app.model_registry import get_embedding_model
+from app.embedding_cache import cached_encode, flush_embedding_caches
+from app.utils.chunking import default_chunker
+from app.utils.loader import iter_text_blocks
+from config.settings import EMBEDDING_MODEL, BUILD_PROGRESS_BATCH, BUILD_SORT_WINDOW, BUILD_PROCESSES
 
-MODEL_NAME = "all-MiniLM-L6-v2"
+MODEL_NAME = EMBEDDING_MODEL
+CHUNK_MANIFEST_FILE = "chunk_manifest.json"
+# Compact chunk ids once more than this fraction of the id space belongs to deleted chunks
+MAX_DEAD_ID_RATIO = 0.5
 
-def build_universe_index(universe_name: str):
-    """Build FAISS index for a specific universe using character data and lore."""
-    print(f"Building FAISS index for universe: {universe_name}")
-    
-    model = SentenceTransformer(MODEL_NAME)
-    
-    # Collect text chunks from universe
-    chunks = []
-    
+def chunk_record(text: str, chunk_type: str, character=None, location=None, faction=None) -> dict:
+    return {"text": text, "type": chunk_type, "character": character, "location": location, "faction": faction}
+
+def _universe_records(universe_name: str) -> Iterator[dict]:
+    """Chunks from the universe manifest, character files and lore files, in that order."""
     # 1. Add universe description
     try:
         manifest = load_universe_manifest(universe_name)
-        chunks.append(f"Universe: {manifest['universe_name']} - {manifest['description']}")
+        yield chunk_record(f"Universe: {manifest['universe_name']} - {manifest['description']}", "universe")
         
         # Add role descriptions
         for role in manifest['roles']:
-            chunks.append(f"Role {role['name']}: {role['description']}")
+            yield chunk_record(f"Role {role['name']}: {role['description']}", "role")
     except Exception as e:
         print(f"Warning: Could not load universe manifest: {e}")
     
@@ -32,29 +43,35 @@ def build_universe_index(universe_name: str):
     try:
         characters = load_characters(universe_name)
         for char in characters:
+            tags = {
+                "character": char['name'],
+                "location": char.get('location'),
+                "faction": char.get('relationships', {}).get('faction'),
+            }
+            
             # Character overview chunk
             char_desc = f"Character: {char['name']} is a {char['role']} located at {char['location']}. "
             char_desc += f"Current mood: {char['current_mood']['primary_emotion']} ({char['current_mood']['intensity']}). "
             char_desc += f"Inventory: {', '.join(char['inventory'])}"
-            chunks.append(char_desc)
+            yield chunk_record(char_desc, "overview", **tags)
             
             # Detailed backstory chunk
-            chunks.append(f"{char['name']} backstory: {char['backstory']}")
+            yield chunk_record(f"{char['name']} backstory: {char['backstory']}", "backstory", **tags)
             
             # Personality traits chunk
             if 'personality_traits' in char:
                 traits = ', '.join(char['personality_traits'])
-                chunks.append(f"{char['name']} personality: {traits}")
+                yield chunk_record(f"{char['name']} personality: {traits}", "personality", **tags)
             
             # Key quotes chunk
             if 'key_quotes' in char:
                 quotes = ' '.join(char['key_quotes'])
-                chunks.append(f"{char['name']} quotes: {quotes}")
+                yield chunk_record(f"{char['name']} quotes: {quotes}", "quotes", **tags)
             
             # Knowledge domains chunk
             if 'knowledge_domains' in char:
                 domains = ', '.join(char['knowledge_domains'])
-                chunks.append(f"{char['name']} knowledge: {domains}")
+                yield chunk_record(f"{char['name']} knowledge: {domains}", "knowledge", **tags)
             
             # Relationships chunk
             if 'relationships' in char:
@@ -64,60 +81,278 @@ def build_universe_index(universe_name: str):
                     rel_text += f". Allies: {', '.join(rel['allies'])}"
                 if rel.get('enemies'):
                     rel_text += f". Enemies: {', '.join(rel['enemies'])}"
-                chunks.append(rel_text)
+                yield chunk_record(rel_text, "relationships", **tags)
             
             # Location information
-            chunks.append(f"Location {char['location']}: {char['name']} the {char['role']} can be found here.")
+            yield chunk_record(f"Location {char['location']}: {char['name']} the {char['role']} can be found here.",
+                               "location", **tags)
     except Exception as e:
         print(f"Warning: Could not load characters: {e}")
     
-    # 3. Check for additional lore files in universe directory
+    # 3. Check for additional lore files in universe directory, chunked by sentences to a token budget
     universe_dir = Path("data") / universe_name
     lore_files = list(universe_dir.glob("*.txt")) + list(universe_dir.glob("*.md"))
+    chunker = default_chunker(MODEL_NAME) if lore_files else None
     
     for lore_file in lore_files:
         try:
-            with open(lore_file, 'r', encoding='utf-8') as f:
-                content = f.read()
-                # Split into smaller chunks if the file is large
-                if len(content) > 1000:
-                    # Simple chunking by paragraphs
-                    paragraphs = content.split('\n\n')
-                    chunks.extend([p.strip() for p in paragraphs if p.strip()])
-                else:
-                    chunks.append(content)
+            for chunk in chunker.chunk_stream(iter_text_blocks(str(lore_file))):
+                yield chunk_record(chunk, "lore")
         except Exception as e:
             print(f"Warning: Could not read lore file {lore_file}: {e}")
+
+def iter_universe_chunk_records(universe_name: str) -> Iterator[dict]:
+    """Yield the text chunks of a universe with their tags (see app.chunk_metadata.TAG_FIELDS).
+    
+    Each record is ``{"text", "type", "character", "location", "faction"}``;
+    tags that do not apply are None. Records are produced lazily, lore files
+    one at a time.
+    """
+    count = 0
+    for record in _universe_records(universe_name):
+        count += 1
+        yield record
     
-    if not chunks:
+    if not count:
         # Create some default content if no data is found
-        chunks = [
-            f"This is the {universe_name} universe.",
-            "No additional lore or character information is currently available."
-        ]
         print("Warning: No content found, using default chunks.")
+        yield chunk_record(f"This is the {universe_name} universe.", "universe")
+        yield chunk_record("No additional lore or character information is currently available.", "universe")
+
+def collect_universe_chunks(universe_name: str) -> list[str]:
+    """Collect the text chunks of a universe from its manifest, characters and lore files."""
+    return [record["text"] for record in iter_universe_chunk_records(universe_name)]
+
+def chunk_hash(text: str) -> str:
+    """Content hash used to recognise unchanged chunks between builds."""
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+def load_chunk_manifest(index_dir: Path) -> dict:
+    """Load the chunk hash -> FAISS id manifest written by the previous build."""
+    manifest_path = index_dir / CHUNK_MANIFEST_FILE
+    if not manifest_path.exists():
+        return None
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (json.JSONDecodeError, OSError) as e:
+        print(f"Warning: Could not read chunk manifest {manifest_path}: {e}")
+        return None
+
+def save_chunk_manifest(index_dir: Path, manifest: dict):
+    """Write the chunk manifest next to the index."""
+    with open(index_dir / CHUNK_MANIFEST_FILE, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+
+class BuildCancelled(Exception):
+    """Raised inside a build when its job was cancelled."""
+
+def length_batches(items: Iterable[tuple], batch_size: int = BUILD_PROGRESS_BATCH,
+                   window: int = BUILD_SORT_WINDOW) -> Iterator[list]:
+    """Group ``(id, text)`` items into batches of similar length.
+    
+    Items are read ``window`` at a time and sorted by text length before being
+    cut into batches, so batches need little padding while only one window of
+    texts is held in memory.
+    """
+    items = iter(items)
+    while True:
+        buffer = list(itertools.islice(items, max(window, batch_size)))
+        if not buffer:
+            return
+        buffer.sort(key=lambda item: len(item[1]))
+        for start in range(0, len(buffer), batch_size):
+            yield buffer[start:start + batch_size]
+
+def encode_batches(model, items: Iterable[tuple], cancel_event=None,
+                   batch_size: int = BUILD_PROGRESS_BATCH) -> Iterator[tuple]:
+    """Encode ``(id, text)`` items through the embedding cache, yielding ``(ids, vectors)`` per batch.
+    
+    Batches are length-bucketed (see length_batches). When ``cancel_event`` is
+    set the build stops with BuildCancelled at the next batch boundary.
+    """
+    for batch in length_batches(items, batch_size):
+        if cancel_event is not None and cancel_event.is_set():
+            raise BuildCancelled()
+        ids = np.array([chunk_id for chunk_id, _ in batch], dtype=np.int64)
+        yield ids, cached_encode(model, [text for _, text in batch], MODEL_NAME)
+
+def stream_into_index(faiss_manager: FaissManager, model, hashes: list, chunks_by_hash: dict, id_by_hash: dict,
+                      progress=None, cancel_event=None):
+    """Build a new index over ``hashes`` by encoding and adding one batch at a time.
+    
+    Index types that need training are trained on a random sample first; those
+    vectors are added right away and skipped in the stream, so no chunk is
+    encoded twice and the full set of embeddings is never held in memory.
+    """
+    sample_size = faiss_manager.start_index(len(hashes))
+    done, skip = 0, set()
     
-    print(f"Found {len(chunks)} text chunks to embed.")
+    def report(count):
+        nonlocal done
+        done += count
+        if progress is not None:
+            progress(done, len(hashes))
     
-    # Generate embeddings
-    embeddings = model.encode(chunks, show_progress_bar=True)
+    if sample_size:
+        rows = np.random.default_rng(0).choice(len(hashes), sample_size, replace=False)
+        sample = [hashes[i] for i in np.sort(rows)]
+        batches = list(encode_batches(model, ((id_by_hash[h], chunks_by_hash[h]) for h in sample),
+                                      cancel_event))
+        ids = np.concatenate([b[0] for b in batches])
+        vectors = np.concatenate([b[1] for b in batches])
+        del batches
+        faiss_manager.train(vectors)
+        faiss_manager.add(vectors, ids)
+        report(len(ids))
+        skip = set(sample)
+        del vectors, ids
+    
+    items = ((id_by_hash[h], chunks_by_hash[h]) for h in hashes if h not in skip)
+    for ids, vectors in encode_batches(model, items, cancel_event):
+        faiss_manager.add(vectors, ids)
+        report(len(ids))
+    faiss_manager.save_index()
+
+def build_universe_index(universe_name: str, full_rebuild: bool = False, progress=None, cancel_event=None):
+    """Build FAISS index for a specific universe using character data and lore.
+    
+    Every chunk is stored with a content hash next to the index. On rebuild only
+    new or changed chunks are embedded and deleted chunks are removed from the
+    id-mapped index; pass ``full_rebuild=True`` to re-embed everything. The
+    result is written as a new snapshot and published atomically (see app.snapshots).
+    
+    Chunks are encoded in length-bucketed batches that go straight into the
+    index (see stream_into_index), so peak memory does not grow with the
+    number of embeddings. ``progress(done, total)`` is called after every
+    batch and ``cancel_event`` is passed to encode_batches (used by build jobs).
+    """
+    print(f"Building FAISS index for universe: {universe_name}")
+    
+    model = get_embedding_model(MODEL_NAME)
+    dim = model.get_sentence_embedding_dimension()
+    
+    # Collect text chunks from universe, dropping exact duplicates
+    chunks_by_hash, tags_by_hash = {}, {}
+    for record in iter_universe_chunk_records(universe_name):
+        h = chunk_hash(record["text"])
+        if h not in chunks_by_hash:
+            chunks_by_hash[h] = record["text"]
+            tags_by_hash[h] = record
+    
+    print(f"Found {len(chunks_by_hash)} text chunks.")
     
-    # Create and save FAISS index
-    dim = embeddings.shape[1]
     faiss_manager = FaissManager(universe_name, dim)
-    faiss_manager.create_index(np.array(embeddings))
+    manifest = None if full_rebuild else load_chunk_manifest(faiss_manager.index_dir)
+    incremental = False
+    if manifest and manifest.get("model") == MODEL_NAME and manifest.get("dim") == dim:
+        try:
+            incremental = faiss_manager.supports_ids()
+        except Exception as e:
+            print(f"Warning: Could not load existing index, rebuilding from scratch: {e}")
     
-    # Save chunks for retrieval
-    chunks_path = Path("data") / universe_name / "faiss_index" / "chunks.txt"
-    with open(chunks_path, "w", encoding="utf-8") as f:
-        for chunk in chunks:
-            f.write(chunk + "\n---\n")
+    if incremental:
+        id_by_hash = manifest["chunks"]
+        next_id = manifest["next_id"]
+        removed_ids = [chunk_id for h, chunk_id in id_by_hash.items() if h not in chunks_by_hash]
+        new_hashes = [h for h in chunks_by_hash if h not in id_by_hash]
+        id_by_hash = {h: chunk_id for h, chunk_id in id_by_hash.items() if h in chunks_by_hash}
+    else:
+        id_by_hash, next_id, removed_ids = {}, 0, []
+        new_hashes = list(chunks_by_hash)
     
-    print(f"✅ FAISS index built for {universe_name} with {len(chunks)} chunks.")
-    return len(chunks)
+    # Everything below goes into a fresh snapshot; queries keep using the published one
+    snapshot = new_snapshot_dir(universe_name)
+    faiss_manager.index_dir = snapshot
+    try:
+        id_by_hash.update(zip(new_hashes, range(next_id, next_id + len(new_hashes))))
+        next_id += len(new_hashes)
+    
+        rebuild = not incremental
+        if incremental:
+            target = choose_index_config(len(id_by_hash), dim)
+            current = faiss_manager.config or {}
+            compact = next_id and (next_id - len(id_by_hash)) / next_id > MAX_DEAD_ID_RATIO
+            # Switch index type (or re-cluster) when the corpus outgrew the current one
+            rebuild = (compact or current.get("type") != target["type"]
+                       or target.get("nlist", 0) >= 2 * current.get("nlist", 0) > 0)
+            if not rebuild:
+                try:
+                    faiss_manager.remove_ids(removed_ids)
+                except RuntimeError:
+                    # e.g. HNSW cannot remove vectors
+                    rebuild = True
+            if rebuild and compact:
+                # Re-pack ids so deleted chunks stop occupying chunk store slots
+                print("Compacting chunk ids.")
+                id_by_hash = dict(zip(id_by_hash.keys(), range(len(id_by_hash))))
+                next_id = len(id_by_hash)
+    
+        if rebuild:
+            if incremental:
+                print(f"Rebuilding index from cached embeddings ({len(new_hashes)} new or changed chunks).")
+            else:
+                print(f"Embedding {len(new_hashes)} chunks.")
+            stream_into_index(faiss_manager, model, list(id_by_hash), chunks_by_hash, id_by_hash,
+                              progress, cancel_event)
+        else:
+            # Embed only the delta and append it to the existing index
+            if new_hashes:
+                print(f"Embedding {len(new_hashes)} new or changed chunks.")
+            done = 0
+            items = ((id_by_hash[h], chunks_by_hash[h]) for h in new_hashes)
+            for ids, vectors in encode_batches(model, items, cancel_event):
+                faiss_manager.add(vectors, ids)
+                done += len(ids)
+                if progress is not None:
+                    progress(done, len(new_hashes))
+            faiss_manager.save_index()
+    
+        # Save chunks for retrieval (slot i holds the text of FAISS id i, deleted ids stay empty)
+        text_by_id = {chunk_id: chunks_by_hash[h] for h, chunk_id in id_by_hash.items()}
+        write_chunk_store(
+            faiss_manager.index_dir / "chunks.bin",
+            (text_by_id.get(chunk_id, "") for chunk_id in range(next_id))
+        )
+        # Lexical (BM25) index over the same slots, for hybrid retrieval of proper nouns
+        LexicalIndex.build(text_by_id.get(chunk_id, "") for chunk_id in range(next_id)).save(faiss_manager.index_dir)
+        # Tags per slot, for retrieval scoped to e.g. lore plus the active character
+        tags_by_id = {chunk_id: tags_by_hash[h] for h, chunk_id in id_by_hash.items()}
+        ChunkMetadata.build(tags_by_id.get(chunk_id) for chunk_id in range(next_id)).save(faiss_manager.index_dir)
+        save_chunk_manifest(faiss_manager.index_dir, {
+            "model": MODEL_NAME,
+            "dim": dim,
+            "next_id": next_id,
+            "chunks": id_by_hash
+        })
+        if cancel_event is not None and cancel_event.is_set():
+            raise BuildCancelled()
+    except BaseException:
+        discard_snapshot(snapshot)
+        raise
+    
+    # Switch readers to the new snapshot in one atomic step
+    publish_snapshot(universe_name, snapshot)
+    
+    flush_embedding_caches()
+    
+    # Make this process pick up the new snapshot on its next query (the old one serves until then)
+    index_cache.refresh(universe_name)
+    removed_snapshots = gc_snapshots(universe_name)
+    if removed_snapshots:
+        print(f"Removed {len(removed_snapshots)} old index snapshot(s).")
+    
+    reused = len(id_by_hash) - len(new_hashes)
+    print(f"✅ FAISS index built for {universe_name} with {len(id_by_hash)} chunks "
+          f"({len(new_hashes)} embedded, {reused} reused, {len(removed_ids)} removed).")
+    return len(id_by_hash)
 
-def build_all_universe_indices():
-    """Build FAISS indices for all universes."""
+def build_all_universe_indices(full_rebuild: bool = False, workers: int = BUILD_PROCESSES):
+    """Build FAISS indices for all universes.
+    
+    With ``workers`` other than 1 the universes are built on a process pool
+    (0 = one worker per core, see app.parallel_build).
+    """
     from app.universe_manager import list_universes
     
     universes = list_universes()
@@ -125,9 +360,13 @@ def build_all_universe_indices():
         print("No universes found.")
         return
     
+    if workers != 1:
+        from app.parallel_build import build_universes_parallel
+        return build_universes_parallel(universes, full_rebuild=full_rebuild, workers=workers)
+    
     for universe in universes:
         try:
-            build_universe_index(universe)
+            build_universe_index(universe, full_rebuild=full_rebuild)
         except Exception as e:
             print(f"Error building index for {universe}: {e}")
 
@@ -1,9 +1,146 @@
 # app/utils/chunking.py
-import textwrap
+"""
+Text chunking.
+
+SentenceChunker packs whole sentences into chunks of at most ``max_tokens``
+tokens of the embedding model, closes chunks at paragraph ends once they are
+reasonably full and repeats the last sentences of a chunk (up to
+``overlap_tokens``) at the start of the next one. Token counts are computed
+for many sentences per tokenizer call.
+"""
+import re
+from typing import Callable, Iterable, Iterator, List, Optional
+
+from config.settings import CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS
+
+_PARAGRAPH_RE = re.compile(r"\n\s*\n")
+_PARAGRAPH_END_RE = re.compile(r"\n\s*\n\s*$")
+_SENTENCE_END_RE = re.compile(r"(?:(?<=[.!?…])|(?<=[.!?…][\"'”’)\]]))\s+")
+# Rough word-piece estimate used when no tokenizer is available
+_TOKEN_RE = re.compile(r"\w{1,6}|[^\w\s]")
+# Paragraph ends close a chunk once it holds this fraction of max_tokens
+PARAGRAPH_FILL = 0.5
+# A stream tail without any sentence end is cut after this many characters per max token
+MAX_TAIL_CHARS_PER_TOKEN = 16
+
+
+def estimate_token_counts(texts: List[str]) -> List[int]:
+    return [len(_TOKEN_RE.findall(text)) for text in texts]
+
+def tokenizer_counter(tokenizer) -> Callable[[List[str]], List[int]]:
+    """Batched token counter for a HuggingFace tokenizer (one call per list of texts)."""
+    def count(texts: List[str]) -> List[int]:
+        if not texts:
+            return []
+        return [len(ids) for ids in tokenizer(texts, add_special_tokens=False)["input_ids"]]
+    return count
+
+def split_segments(text: str, ends_paragraph: bool = True) -> List[tuple]:
+    """Split text into (sentence, ends_paragraph) pairs.
+
+    Pass ``ends_paragraph=False`` when the paragraph continues after ``text``.
+    """
+    segments = []
+    for paragraph in _PARAGRAPH_RE.split(text):
+        sentences = [s.strip() for s in _SENTENCE_END_RE.split(paragraph)]
+        sentences = [s for s in sentences if s]
+        segments.extend((s, i == len(sentences) - 1) for i, s in enumerate(sentences))
+    if segments and not ends_paragraph and not _PARAGRAPH_END_RE.search(text):
+        segments[-1] = (segments[-1][0], False)
+    return segments
+
+
+class SentenceChunker:
+    def __init__(self, max_tokens: int = CHUNK_MAX_TOKENS, overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+                 count_tokens: Optional[Callable[[List[str]], List[int]]] = None):
+        self.max_tokens = max(1, max_tokens)
+        self.overlap_tokens = min(max(0, overlap_tokens), self.max_tokens // 2)
+        self.count_tokens = count_tokens or estimate_token_counts
+
+    def chunk(self, text: str) -> List[str]:
+        return list(self.chunk_stream([text]))
+
+    def chunk_stream(self, texts: Iterable[str]) -> Iterator[str]:
+        """Chunk the concatenation of texts (e.g. the pages of a document) lazily.
+
+        Only the unfinished last sentence is carried from one text to the next.
+        """
+        state = {"current": [], "tokens": 0, "fresh": False}
+        tail = ""
+        for text in texts:
+            buffer = tail + text
+            # Everything up to the last sentence end (or paragraph break) is complete; whitespace
+            # at the very end may still grow into a paragraph break, so it stays in the tail
+            boundary = 0
+            for match in _SENTENCE_END_RE.finditer(buffer):
+                if match.end() < len(buffer):
+                    boundary = match.end()
+            for match in _PARAGRAPH_RE.finditer(buffer, boundary):
+                if match.end() < len(buffer):
+                    boundary = match.end()
+            if len(buffer) - boundary > self.max_tokens * MAX_TAIL_CHARS_PER_TOKEN:
+                boundary = len(buffer)
+            tail = buffer[boundary:]
+            yield from self._pack(split_segments(buffer[:boundary], ends_paragraph=False), state)
+        yield from self._pack(split_segments(tail), state)
+        if state["fresh"]:
+            yield self._join(state["current"])
+
+    @staticmethod
+    def _join(sentences: list) -> str:
+        parts = []
+        for i, (text, _, ends_paragraph) in enumerate(sentences):
+            parts.append(text)
+            if i < len(sentences) - 1:
+                parts.append("\n\n" if ends_paragraph else " ")
+        return "".join(parts)
+
+    def _split_long(self, text: str, tokens: int) -> List[tuple]:
+        """Cut a sentence longer than max_tokens at word boundaries."""
+        words = text.split()
+        per_piece = max(1, int(len(words) * self.max_tokens * 0.9 / tokens))
+        pieces = [" ".join(words[i:i + per_piece]) for i in range(0, len(words), per_piece)]
+        return list(zip(pieces, self.count_tokens(pieces)))
+
+    def _pack(self, segments: List[tuple], state: dict) -> Iterator[str]:
+        if not segments:
+            return
+        counts = self.count_tokens([text for text, _ in segments])
+        for (text, ends_paragraph), tokens in zip(segments, counts):
+            pieces = [(text, tokens)] if tokens <= self.max_tokens else self._split_long(text, tokens)
+            for i, (piece, piece_tokens) in enumerate(pieces):
+                if state["tokens"] + piece_tokens > self.max_tokens and state["current"]:
+                    if state["fresh"]:
+                        yield self._join(state["current"])
+                    self._start_overlap(state, piece_tokens)
+                state["current"].append((piece, piece_tokens, ends_paragraph and i == len(pieces) - 1))
+                state["tokens"] += piece_tokens
+                state["fresh"] = True
+            if ends_paragraph and state["tokens"] >= self.max_tokens * PARAGRAPH_FILL:
+                yield self._join(state["current"])
+                state.update(current=[], tokens=0, fresh=False)
+
+    def _start_overlap(self, state: dict, next_tokens: int):
+        """Keep the last sentences of the emitted chunk (within overlap_tokens) as the start of the next."""
+        overlap, tokens = [], 0
+        for sentence in reversed(state["current"]):
+            if tokens + sentence[1] > self.overlap_tokens or tokens + sentence[1] + next_tokens > self.max_tokens:
+                break
+            overlap.insert(0, sentence)
+            tokens += sentence[1]
+        state.update(current=overlap, tokens=tokens, fresh=False)
+
+
+def default_chunker(model_name: str = None) -> SentenceChunker:
+    """Chunker counting tokens with the embedding model's tokenizer (estimated if it is unavailable)."""
+    from app.model_registry import model_registry
+
+    tokenizer = model_registry.get_tokenizer(model_name)
+    return SentenceChunker(count_tokens=tokenizer_counter(tokenizer) if tokenizer is not None else None)
 
 def chunk_text(text: str, chunk_size=500, overlap=100) -> list[str]:
     """
-    Creates fixed-length chunks with overlap / Can be used for token-aware chunking
+    Creates fixed-length chunks with overlap (character based; see SentenceChunker for token-aware chunking)
     """
     chunks = []
     start = 0
@@ -1,23 +1,186 @@
 # app/utils/loader.py
+"""
+Streaming document loader for lore folders.
+
+Documents are yielded page by page as ``PageRecord(doc_id, page, text)``
+instead of being read into memory whole. Text files are read in blocks; PDFs
+are parsed in ranges of pages on a process pool, with only a few ranges in
+flight at a time. scan_documents compares files against a previous scan, so
+callers can skip files that did not change. load_documents and load_pdf_file
+still return whole documents, built on the same streaming path.
+"""
+import hashlib
+import itertools
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from config.settings import LOADER_WORKERS, LOADER_PDF_PAGES_PER_TASK, LOADER_TEXT_BLOCK_CHARS
+
+DOCUMENT_SUFFIXES = (".txt", ".pdf")
+
+
+class PageRecord(NamedTuple):
+    doc_id: str  # path relative to the loaded folder
+    page: int  # PDF page, or block number for text files
+    text: str
+
 
 def load_text_file(file_path: str) -> str:
     with open(file_path, 'r', encoding='utf-8') as f:
         return f.read()
 
+def iter_text_blocks(file_path: str, block_chars: int = LOADER_TEXT_BLOCK_CHARS) -> Iterator[str]:
+    """Read a text file in blocks of at most ``block_chars`` characters."""
+    with open(file_path, 'r', encoding='utf-8') as f:
+        while True:
+            block = f.read(block_chars)
+            if not block:
+                return
+            yield block
+
+# Each PDF worker keeps its most recently opened reader, since consecutive page ranges usually share a file
+_pdf_reader = (None, None)
+
+def _open_pdf(file_path: str):
+    global _pdf_reader
+    if _pdf_reader[0] != file_path:
+        from PyPDF2 import PdfReader
+        _pdf_reader = (file_path, PdfReader(file_path))
+    return _pdf_reader[1]
+
+def pdf_page_count(file_path: str) -> int:
+    return len(_open_pdf(file_path).pages)
+
+def extract_pdf_pages(file_path: str, start: int, stop: int) -> List[str]:
+    """Text of pages ``start..stop-1``; every page ends with a newline."""
+    reader = _open_pdf(file_path)
+    return [(reader.pages[i].extract_text() or "") + "\n" for i in range(start, stop)]
+
+def list_documents(folder_path: str) -> List[str]:
+    """Doc ids (paths relative to the folder) of every supported file, sorted."""
+    folder = Path(folder_path)
+    return sorted(str(path.relative_to(folder)) for path in folder.glob("*")
+                  if path.is_file() and path.suffix in DOCUMENT_SUFFIXES)
+
+def file_hash(file_path: str) -> str:
+    digest = hashlib.sha1()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def scan_documents(folder_path: str, known: Optional[Dict[str, dict]] = None) -> Tuple[Dict[str, dict], Dict[str, dict]]:
+    """Split the documents of a folder into (changed, unchanged) compared to ``known``.
+
+    Both map doc id -> signature ``{"size", "mtime_ns", "sha1"}``. A file with
+    the same size and mtime as before is unchanged without being read; one
+    whose mtime moved is hashed, and only counts as changed if its content did.
+    """
+    known = known or {}
+    changed, unchanged = {}, {}
+    for doc_id in list_documents(folder_path):
+        stat = os.stat(Path(folder_path) / doc_id)
+        previous = known.get(doc_id)
+        if previous and previous["size"] == stat.st_size and previous["mtime_ns"] == stat.st_mtime_ns:
+            unchanged[doc_id] = previous
+            continue
+        signature = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+                     "sha1": file_hash(Path(folder_path) / doc_id)}
+        if previous and previous["size"] == stat.st_size and previous.get("sha1") == signature["sha1"]:
+            unchanged[doc_id] = dict(previous, **signature)
+        else:
+            changed[doc_id] = signature
+    return changed, unchanged
+
+def _load_tasks(folder: Path, doc_ids: List[str], pages_per_task: int, pool=None, lookahead: int = 1):
+    """(doc_id, start, stop) per PDF page range, (doc_id, None, None) per text file.
+
+    With a ``pool`` PDF pages are counted there as well, ``lookahead`` PDFs
+    ahead, so this process never parses a PDF.
+    """
+    pdf_ids = deque(doc_id for doc_id in doc_ids if doc_id.endswith(".pdf"))
+    counts = {}
+    for doc_id in doc_ids:
+        if not doc_id.endswith(".pdf"):
+            yield doc_id, None, None
+            continue
+        while pool is not None and pdf_ids and len(counts) < lookahead:
+            next_id = pdf_ids.popleft()
+            counts[next_id] = pool.submit(pdf_page_count, str(folder / next_id))
+        try:
+            if pool is not None:
+                count = counts.pop(doc_id).result()
+            else:
+                count = pdf_page_count(str(folder / doc_id))
+        except Exception as e:
+            print(f"Warning: Could not read PDF {folder / doc_id}: {e}")
+            continue
+        for start in range(0, count, pages_per_task):
+            yield doc_id, start, min(start + pages_per_task, count)
+
+def _task_records(folder: Path, doc_id: str, start: Optional[int], stop: Optional[int], future) -> Iterator[PageRecord]:
+    path = str(folder / doc_id)
+    if start is None:
+        for block_number, block in enumerate(iter_text_blocks(path)):
+            yield PageRecord(doc_id, block_number, block)
+        return
+    pages = future.result() if future is not None else extract_pdf_pages(path, start, stop)
+    for offset, text in enumerate(pages):
+        yield PageRecord(doc_id, start + offset, text)
+
+def iter_documents(folder_path: str, doc_ids: Optional[Iterable[str]] = None, workers: int = LOADER_WORKERS,
+                   pages_per_task: int = LOADER_PDF_PAGES_PER_TASK) -> Iterator[PageRecord]:
+    """Yield the pages of the documents in a folder, in doc id and page order.
+
+    ``doc_ids`` limits loading to those documents (e.g. the changed ones from
+    scan_documents). PDF page ranges are parsed on ``workers`` processes
+    (0 = one per core, 1 = in this process) while earlier pages are consumed;
+    at most two ranges per worker are in flight.
+    """
+    folder = Path(folder_path)
+    doc_ids = list_documents(folder_path) if doc_ids is None else sorted(doc_ids)
+    if not workers:
+        try:
+            workers = len(os.sched_getaffinity(0))
+        except AttributeError:
+            workers = os.cpu_count() or 1
+    pool = None
+    if workers > 1 and any(doc_id.endswith(".pdf") for doc_id in doc_ids):
+        pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    try:
+        pending = deque()
+        for doc_id, start, stop in _load_tasks(folder, doc_ids, pages_per_task, pool, 2 * workers):
+            future = None
+            if pool is not None and start is not None:
+                future = pool.submit(extract_pdf_pages, str(folder / doc_id), start, stop)
+            pending.append((doc_id, start, stop, future))
+            if len(pending) > 2 * workers:
+                yield from _task_records(folder, *pending.popleft())
+        while pending:
+            yield from _task_records(folder, *pending.popleft())
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
 def load_pdf_file(file_path: str) -> str:
-    from PyPDF2 import PdfReader
-    reader = PdfReader(file_path)
-    return "\n".join([page.extract_text() for page in reader.pages])
+    """Whole text of a PDF, pages joined by newlines."""
+    path = Path(file_path)
+    pages = iter_documents(str(path.parent), [path.name], workers=1)
+    return "\n".join(record.text[:-1] for record in pages)
 
-def load_documents(folder_path: str) -> list[str]:
+def load_documents(folder_path: str) -> List[str]:
     """
     Reads all files in the given folder and returns a list of strings
+    (one per document; use iter_documents to stream them page by page)
     """
     all_texts = []
-    for path in Path(folder_path).glob("*"):
-        if path.suffix == ".txt":
-            all_texts.append(load_text_file(str(path)))
-        elif path.suffix == ".pdf":
-            all_texts.append(load_pdf_file(str(path)))
+    for doc_id, records in itertools.groupby(iter_documents(folder_path), key=lambda record: record.doc_id):
+        if doc_id.endswith(".pdf"):
+            all_texts.append("\n".join(record.text[:-1] for record in records))
+        else:
+            all_texts.append("".join(record.text for record in records))
     return all_texts
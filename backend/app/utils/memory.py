@@ -0,0 +1,56 @@
+# app/utils/memory.py
+import os
+import sys
+
+
+def current_rss_bytes() -> int:
+    """Return the resident set size of the current process in bytes (0 if unknown)."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is reported in bytes on macOS and kilobytes on Linux
+        return peak if sys.platform == "darwin" else peak * 1024
+    except (ImportError, OSError):
+        return 0
+
+
+def memory_usage() -> dict:
+    """RSS, PSS and shared/private split of the current process in bytes.
+
+    PSS (proportional set size) charges each shared page 1/N to each of the N
+    processes mapping it, so summing PSS over workers gives their real total.
+    Only Linux reports it; elsewhere just the RSS is returned.
+    """
+    usage = {"pid": os.getpid(), "rss": current_rss_bytes()}
+    try:
+        with open("/proc/self/smaps_rollup", "r") as f:
+            fields = {}
+            for line in f:
+                parts = line.split()
+                if len(parts) == 3 and parts[2] == "kB":
+                    fields[parts[0].rstrip(":")] = int(parts[1]) * 1024
+    except OSError:
+        return usage
+    usage.update({
+        "rss": fields.get("Rss", usage["rss"]),
+        "pss": fields.get("Pss", 0),
+        "shared": fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0),
+        "private": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0),
+    })
+    return usage
+
+
+def format_bytes(num_bytes: int) -> str:
+    """Human readable byte count, e.g. 87.3 MB."""
+    size = float(num_bytes)
+    for unit in ["B", "KB", "MB", "GB"]:
+        if abs(size) < 1024 or unit == "GB":
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
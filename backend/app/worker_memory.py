@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Per-worker memory report for serving universe indices from several processes.
+
+Starts N worker processes the way uvicorn does, lets each one load and search
+the given universes through its own IndexCache, and reports every worker's
+RSS / PSS before and after. Run it once with mmap and once without to see how
+much of the index memory the workers share.
+"""
+
+import argparse
+import json
+import multiprocessing
+from datetime import datetime
+from pathlib import Path
+
+from app.utils.memory import format_bytes, memory_usage
+
+REPORTS_DIR = Path("reports") / "benchmarks"
+
+
+def _worker(worker_id: int, universes: list, mmap: bool, barrier, results):
+    import numpy as np
+    from app.faiss_manager import configure_faiss_threads
+    from app.index_cache import IndexCache
+
+    configure_faiss_threads(1)
+    before = memory_usage()
+    cache = IndexCache(memory_budget_mb=0, mmap=mmap)
+    rng = np.random.default_rng(worker_id)
+    for universe in universes:
+        entry = cache.get(universe)
+        # Touch the data the way live traffic would: searches and chunk reads
+        queries = rng.standard_normal((32, entry.faiss_manager.dim)).astype(np.float32)
+        entry.faiss_manager.search_batch(queries, top_k=5)
+        for i in range(len(entry.chunks)):
+            entry.chunks[i]
+    # Measure while every worker holds its indices, so shared pages are split between them
+    barrier.wait()
+    results.put({"worker": worker_id, "before": before, "after": memory_usage()})
+    barrier.wait()
+
+
+def measure_workers(universes: list, workers: int = 2, mmap: bool = True) -> dict:
+    """Load the universes in ``workers`` spawned processes and collect their memory usage."""
+    ctx = multiprocessing.get_context("spawn")
+    barrier = ctx.Barrier(workers)
+    results = ctx.Queue()
+    processes = [ctx.Process(target=_worker, args=(i, universes, mmap, barrier, results))
+                 for i in range(workers)]
+    for process in processes:
+        process.start()
+    reports = sorted((results.get() for _ in processes), key=lambda r: r["worker"])
+    for process in processes:
+        process.join()
+    return {
+        "created": datetime.now().isoformat(),
+        "universes": universes,
+        "workers": workers,
+        "mmap": mmap,
+        "results": reports,
+        "total_pss_after": sum(r["after"].get("pss", 0) for r in reports),
+    }
+
+
+def print_report(report: dict):
+    print(f"\n{report['workers']} workers, mmap={report['mmap']}, universes: {', '.join(report['universes'])}")
+    print(f"{'worker':<8}{'rss before':>12}{'rss after':>12}{'pss after':>12}{'shared':>12}{'private':>12}")
+    for r in report["results"]:
+        before, after = r["before"], r["after"]
+        print(f"{r['worker']:<8}{format_bytes(before['rss']):>12}{format_bytes(after['rss']):>12}"
+              f"{format_bytes(after.get('pss', 0)):>12}{format_bytes(after.get('shared', 0)):>12}"
+              f"{format_bytes(after.get('private', 0)):>12}")
+    print(f"Total PSS: {format_bytes(report['total_pss_after'])}")
+
+
+def main(argv=None):
+    from app.snapshots import current_snapshot_dir
+    from app.universe_manager import list_universes
+
+    parser = argparse.ArgumentParser(description="Measure per-worker memory of served universe indices")
+    parser.add_argument("--universes", "-u", help="Comma separated universes (default: all)")
+    parser.add_argument("--workers", "-w", type=int, default=2, help="Number of worker processes")
+    parser.add_argument("--no-mmap", action="store_true", help="Read indices into private memory")
+    parser.add_argument("--output", "-o", help="Report path (default: reports/benchmarks/worker_memory_<time>.json)")
+    args = parser.parse_args(argv)
+
+    universes = [u.strip() for u in args.universes.split(",")] if args.universes else list_universes()
+    universes = [u for u in universes if (current_snapshot_dir(u) / "index.faiss").exists()]
+    if not universes:
+        print("❌ No built universe indices found")
+        return None
+
+    report = measure_workers(universes, workers=args.workers, mmap=not args.no_mmap)
+    print_report(report)
+
+    output = Path(args.output) if args.output else REPORTS_DIR / f"worker_memory_{datetime.now():%Y%m%d_%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n✅ Worker memory report written to {output}")
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -6,10 +6,27 @@ from pathlib import Path
 LLM_ENDPOINT_URL = os.getenv("LLM_ENDPOINT_URL", "https://646f-34-125-62-103.ngrok-free.app/generate")
 LLM_MAX_TOKENS = int(os.getenv("LLM_MAX_TOKENS", "100"))
 LLM_TEMPERATURE = float(os.getenv("LLM_TEMPERATURE", "0.7"))
+LLM_POOL_SIZE = int(os.getenv("LLM_POOL_SIZE", "16"))  # keep-alive connections to the LLM endpoint per process
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))  # seconds
+LLM_READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT", "120"))  # seconds to wait for a generation
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))  # retries of connection errors and 429/502/503/504
+LLM_RETRY_BACKOFF = float(os.getenv("LLM_RETRY_BACKOFF", "0.5"))  # base of the jittered exponential backoff, seconds
+LLM_RETRY_BACKOFF_MAX = float(os.getenv("LLM_RETRY_BACKOFF_MAX", "8"))  # longest wait between retries, seconds
+LLM_MAX_STOP_SEQUENCES = int(os.getenv("LLM_MAX_STOP_SEQUENCES", "4"))  # stop sequences sent with each generation, 0 = client-side stops only
+
+# LLM Endpoint Pool
+LLM_ENDPOINT_URLS = [url.strip() for url in os.getenv("LLM_ENDPOINT_URLS", "").split(",") if url.strip()] or [LLM_ENDPOINT_URL]
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "3"))  # consecutive failures before an endpoint is taken out
+LLM_BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", "30"))  # seconds before a broken endpoint gets a trial request
+LLM_HEALTH_CHECK_INTERVAL = float(os.getenv("LLM_HEALTH_CHECK_INTERVAL", "10"))  # seconds between active checks, 0 disables them
+LLM_HEALTH_CHECK_PATH = os.getenv("LLM_HEALTH_CHECK_PATH", "/health")  # resolved against each endpoint URL
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "0"))  # e.g. 95: hedge calls slower than this percentile, 0 disables
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))  # latencies observed before hedging starts
 
 # API Configuration
 API_HOST = os.getenv("API_HOST", "0.0.0.0")
 API_PORT = int(os.getenv("API_PORT", "8000"))
+API_WORKERS = int(os.getenv("API_WORKERS", "1"))
 
 # Frontend Configuration
 FRONTEND_URL = os.getenv("FRONTEND_URL", "http://localhost:3000")
@@ -20,4 +37,65 @@ MODELS_DIR = Path("models")
 
 # FAISS Configuration
 FAISS_TOP_K = int(os.getenv("FAISS_TOP_K", "5"))
-EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2") 
\ No newline at end of file
+FAISS_INDEX_TYPE = os.getenv("FAISS_INDEX_TYPE", "auto")  # auto, flat, ivf_flat, ivf_sq8, ivf_pq or hnsw
+FAISS_MEMORY_BUDGET_MB = float(os.getenv("FAISS_MEMORY_BUDGET_MB", "1024"))  # per universe index
+FAISS_FLAT_MAX_VECTORS = int(os.getenv("FAISS_FLAT_MAX_VECTORS", "50000"))  # exact search up to this size
+FAISS_NPROBE = int(os.getenv("FAISS_NPROBE", "0"))  # IVF lists probed per query, 0 = derived from nlist
+FAISS_EF_SEARCH = int(os.getenv("FAISS_EF_SEARCH", "64"))
+FAISS_HNSW_M = int(os.getenv("FAISS_HNSW_M", "32"))
+FAISS_OMP_THREADS = int(os.getenv("FAISS_OMP_THREADS", "0"))  # 0 = cores / API_WORKERS
+FAISS_MMAP = os.getenv("FAISS_MMAP", "true").lower() == "true"  # share served indices between workers via mmap
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+EMBEDDING_DEVICE = os.getenv("EMBEDDING_DEVICE")  # e.g. "cpu" or "cuda"; auto-detected when unset
+EMBEDDING_WARMUP = os.getenv("EMBEDDING_WARMUP", "true").lower() == "true"
+
+# Index Cache Configuration
+INDEX_CACHE_CHECK_INTERVAL = float(os.getenv("INDEX_CACHE_CHECK_INTERVAL", "5"))  # seconds between index file checks
+INDEX_CACHE_MEMORY_BUDGET_MB = float(os.getenv("INDEX_CACHE_MEMORY_BUDGET_MB", "2048"))  # 0 = unlimited
+INDEX_SNAPSHOTS_KEEP = int(os.getenv("INDEX_SNAPSHOTS_KEEP", "1"))  # previous snapshots kept for rollback
+
+# Index Build Jobs
+BUILD_WORKERS = int(os.getenv("BUILD_WORKERS", "1"))  # concurrent index builds per process
+BUILD_QUEUE_MAX = int(os.getenv("BUILD_QUEUE_MAX", "16"))  # queued builds before new ones are rejected
+BUILD_PROGRESS_BATCH = int(os.getenv("BUILD_PROGRESS_BATCH", "256"))  # chunks encoded between progress updates
+BUILD_SORT_WINDOW = int(os.getenv("BUILD_SORT_WINDOW", "4096"))  # chunks length-sorted together before batching
+BUILD_JOBS_DIR = Path(os.getenv("BUILD_JOBS_DIR", "data/build_jobs"))
+BUILD_PROCESSES = int(os.getenv("BUILD_PROCESSES", "1"))  # build-all worker processes, 0 = one per core
+BUILD_ENCODE_UNIT = int(os.getenv("BUILD_ENCODE_UNIT", "512"))  # chunks per encode work unit in parallel builds
+
+# Document Loader (legacy lore folder)
+LOADER_WORKERS = int(os.getenv("LOADER_WORKERS", "0"))  # PDF parsing processes, 0 = one per core, 1 = in-process
+LOADER_PDF_PAGES_PER_TASK = int(os.getenv("LOADER_PDF_PAGES_PER_TASK", "8"))  # PDF pages parsed per work item
+LOADER_TEXT_BLOCK_CHARS = int(os.getenv("LOADER_TEXT_BLOCK_CHARS", "65536"))  # characters read per text file block
+
+# Chunking
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "200"))  # embedding-model tokens per chunk
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "32"))  # tokens of trailing sentences repeated in the next chunk
+
+# Embedding Cache Configuration
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+EMBEDDING_CACHE_DIR = Path(os.getenv("EMBEDDING_CACHE_DIR", "data/embedding_cache"))
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "200000"))
+EMBEDDING_CACHE_DTYPE = os.getenv("EMBEDDING_CACHE_DTYPE", "float32")  # "float32" or "float16"
+
+# Query Embedding Cache Configuration
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "1024"))  # 0 disables the cache
+QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", "0"))  # seconds, 0 means entries never expire
+
+# Query Embedding Batching
+EMBEDDING_BATCH_MAX_SIZE = int(os.getenv("EMBEDDING_BATCH_MAX_SIZE", "32"))  # queries per encode call
+EMBEDDING_BATCH_MAX_WAIT_MS = float(os.getenv("EMBEDDING_BATCH_MAX_WAIT_MS", "5"))  # max extra latency per query
+
+# Async Chat Executors (blocking work of /api/chat runs here, off the event loop)
+EMBED_EXECUTOR_WORKERS = int(os.getenv("EMBED_EXECUTOR_WORKERS", "1"))  # batches run back to back, the model uses its own threads
+RETRIEVAL_EXECUTOR_WORKERS = int(os.getenv("RETRIEVAL_EXECUTOR_WORKERS", "4"))  # concurrent FAISS / BM25 searches
+IO_EXECUTOR_WORKERS = int(os.getenv("IO_EXECUTOR_WORKERS", "2"))  # character and conversation file reads/writes
+
+# Retrieval Configuration
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")  # vector, hybrid or lexical
+HYBRID_ALPHA = float(os.getenv("HYBRID_ALPHA", "0.5"))  # weight of the vector score in hybrid mode
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20"))  # candidates fetched from each retriever
+BM25_K1 = float(os.getenv("BM25_K1", "1.2"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+RETRIEVAL_SCOPE = os.getenv("RETRIEVAL_SCOPE", "filter")  # filter, boost or universe
+SCOPE_BOOST = float(os.getenv("SCOPE_BOOST", "0.2"))  # score bonus for in-scope chunks in boost mode
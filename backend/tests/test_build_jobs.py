@@ -0,0 +1,84 @@
+"""
+Background build jobs: one active build per universe, across worker processes.
+
+    cd backend && python -m pytest tests
+"""
+import json
+import subprocess
+import sys
+import threading
+import time
+import uuid
+
+from app.build_jobs import ACTIVE_STATES, QUEUED, SUCCEEDED, BuildJobQueue
+
+
+def blocking_builder(release):
+    def build(universe, full_rebuild=False, progress=None, cancel_event=None):
+        release.wait(5)
+        return 3
+    return build
+
+
+def write_foreign_job(jobs_dir, universe, pid):
+    """Job file as written by the queue of another worker process."""
+    job_id = uuid.uuid4().hex
+    jobs_dir.mkdir(parents=True, exist_ok=True)
+    (jobs_dir / f"{job_id}.json").write_text(json.dumps({
+        "job_id": job_id, "universe": universe, "full_rebuild": False, "status": QUEUED,
+        "created_at": time.time(), "pid": pid,
+    }))
+    return job_id
+
+
+def wait_for(job_id, queue, status):
+    deadline = time.monotonic() + 5
+    while queue.get(job_id)["status"] != status and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return queue.get(job_id)["status"]
+
+
+def test_resubmit_returns_the_active_job(tmp_path):
+    release = threading.Event()
+    queue = BuildJobQueue(max_workers=1, jobs_dir=tmp_path, builder=blocking_builder(release))
+    try:
+        first, created = queue.submit("U")
+        again, created_again = queue.submit("U")
+        assert created and not created_again
+        assert again["job_id"] == first["job_id"]
+        release.set()
+        assert wait_for(first["job_id"], queue, SUCCEEDED) == SUCCEEDED
+        _, created_after = queue.submit("U")
+        assert created_after
+    finally:
+        release.set()
+        queue.shutdown()
+
+
+def test_active_job_of_another_worker_is_reused(tmp_path):
+    other = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(30)"])
+    try:
+        foreign_id = write_foreign_job(tmp_path, "U", other.pid)
+        queue = BuildJobQueue(max_workers=1, jobs_dir=tmp_path, builder=blocking_builder(threading.Event()))
+        job, created = queue.submit("U")
+        assert not created
+        assert job["job_id"] == foreign_id
+        queue.shutdown()
+    finally:
+        other.kill()
+        other.wait()
+
+
+def test_job_of_a_dead_worker_is_ignored(tmp_path):
+    dead = subprocess.Popen([sys.executable, "-c", "pass"])
+    dead.wait()
+    foreign_id = write_foreign_job(tmp_path, "U", dead.pid)
+    release = threading.Event()
+    queue = BuildJobQueue(max_workers=1, jobs_dir=tmp_path, builder=blocking_builder(release))
+    try:
+        job, created = queue.submit("U")
+        assert created
+        assert job["job_id"] != foreign_id and job["status"] in ACTIVE_STATES
+    finally:
+        release.set()
+        queue.shutdown()
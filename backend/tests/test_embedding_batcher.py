@@ -0,0 +1,71 @@
+"""
+Query embedding batcher: coalescing and what its callers see when a batch
+fails or is cancelled.
+
+    cd backend && python -m pytest tests
+"""
+import asyncio
+
+import numpy as np
+
+from app import embedding_batcher as batcher_module
+from app.embedding_batcher import EmbeddingBatcher
+
+
+def fake_run(encode):
+    async def run(pool, fn, texts, model_name):
+        return await encode(texts)
+    return run
+
+
+def test_concurrent_queries_share_one_batch(monkeypatch):
+    calls = []
+
+    async def encode(texts):
+        calls.append(list(texts))
+        return np.arange(len(texts), dtype=np.float32).reshape(-1, 1)
+
+    monkeypatch.setattr(batcher_module.executors, "run", fake_run(encode))
+    batcher = EmbeddingBatcher(model_name="test-batcher", max_batch_size=8, max_wait_ms=20)
+
+    async def main():
+        return await asyncio.gather(*(batcher.encode(q) for q in ["a", "b", "a"]))
+
+    vectors = asyncio.run(main())
+
+    assert calls == [["a", "b"]]
+    assert [float(v[0, 0]) for v in vectors] == [0.0, 1.0, 0.0]
+
+
+def test_failed_batch_fails_its_callers(monkeypatch):
+    async def encode(texts):
+        raise RuntimeError("model crashed")
+
+    monkeypatch.setattr(batcher_module.executors, "run", fake_run(encode))
+    batcher = EmbeddingBatcher(model_name="test-batcher", max_batch_size=2, max_wait_ms=20)
+
+    async def main():
+        return await asyncio.gather(batcher.encode("a"), batcher.encode("b"), return_exceptions=True)
+
+    results = asyncio.run(main())
+
+    assert all(isinstance(r, RuntimeError) for r in results)
+
+
+def test_cancelled_batch_does_not_leave_callers_waiting(monkeypatch):
+    async def encode(texts):
+        await asyncio.sleep(3600)
+
+    monkeypatch.setattr(batcher_module.executors, "run", fake_run(encode))
+    batcher = EmbeddingBatcher(model_name="test-batcher", max_batch_size=2, max_wait_ms=20)
+
+    async def main():
+        callers = [asyncio.ensure_future(batcher.encode(q)) for q in ("a", "b")]
+        await asyncio.sleep(0.05)
+        for task in list(batcher._tasks):
+            task.cancel()
+        return await asyncio.wait_for(asyncio.gather(*callers, return_exceptions=True), 1)
+
+    results = asyncio.run(main())
+
+    assert all(isinstance(r, asyncio.CancelledError) for r in results)
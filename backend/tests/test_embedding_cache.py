@@ -0,0 +1,89 @@
+"""
+Persistent embedding cache: sharing between instances and worker processes,
+eviction, and never pairing a key with another text's vector.
+
+    cd backend && python -m pytest tests
+"""
+import hashlib
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+
+from app.embedding_cache import EmbeddingCache
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+DIM = 8
+
+
+def vector_of(text):
+    digest = hashlib.sha256(text.encode("utf-8")).digest()[:DIM]
+    return np.frombuffer(digest, dtype=np.uint8).astype(np.float32)
+
+
+class CountingModel:
+    def __init__(self):
+        self.encoded = []
+
+    def encode(self, texts, **kwargs):
+        self.encoded += texts
+        return np.stack([vector_of(t) for t in texts])
+
+
+def open_cache(tmp_path, capacity=16):
+    return EmbeddingCache("test/model", DIM, cache_dir=tmp_path, capacity=capacity, dtype="float32")
+
+
+def test_texts_are_encoded_once_across_instances(tmp_path):
+    model = CountingModel()
+    first = open_cache(tmp_path).encode(model, ["the gate", "the bridge"])
+    # A second instance sees the first one's writes; normalized whitespace shares an entry
+    second = open_cache(tmp_path).encode(model, ["the bridge", "the  gate"])
+
+    assert model.encoded == ["the gate", "the bridge"]
+    assert np.array_equal(first[0], vector_of("the gate"))
+    assert np.array_equal(second, np.stack([vector_of("the bridge"), vector_of("the gate")]))
+
+
+def test_rows_evicted_by_another_instance_are_not_served(tmp_path):
+    a, b = open_cache(tmp_path, capacity=4), open_cache(tmp_path, capacity=4)
+    model = CountingModel()
+    old = [f"old {i}" for i in range(4)]
+    a.encode(model, old)
+    a.encode(model, old[2:])  # most recently used
+
+    b.encode(model, ["new 0", "new 1"])
+    vectors, missing, _ = a.get(old + ["new 0", "new 1"])
+
+    assert missing == [0, 1]
+    expected = np.stack([vector_of(t) for t in old[2:] + ["new 0", "new 1"]])
+    assert np.array_equal(vectors[2:], expected)
+    assert b.evictions == 2
+
+
+def test_cache_is_shared_with_another_process(tmp_path):
+    cache = open_cache(tmp_path)
+    cache.get(["warm up"])
+    script = (
+        "import sys, numpy as np\n"
+        "sys.path.insert(0, 'tests')\n"
+        "from test_embedding_cache import CountingModel, open_cache\n"
+        "from pathlib import Path\n"
+        f"open_cache(Path({str(tmp_path)!r})).encode(CountingModel(), ['from the other worker'])\n"
+    )
+    subprocess.run([sys.executable, "-c", script], cwd=BACKEND_DIR, check=True)
+
+    vectors, missing, _ = cache.get(["from the other worker"])
+
+    assert missing == []
+    assert np.array_equal(vectors[0], vector_of("from the other worker"))
+
+
+def test_changed_layout_starts_over(tmp_path):
+    model = CountingModel()
+    open_cache(tmp_path).encode(model, ["the gate"])
+
+    reopened = EmbeddingCache("test/model", DIM * 2, cache_dir=tmp_path, capacity=16, dtype="float32")
+
+    assert len(reopened) == 0
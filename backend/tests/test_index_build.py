@@ -0,0 +1,88 @@
+"""
+Incremental index builds: only new or changed chunks are embedded, removed
+chunks leave the index, and the result is served from a new snapshot.
+
+    cd backend && python -m pytest tests
+"""
+import hashlib
+
+import numpy as np
+import pytest
+
+from app import embedding_cache, universe_embedder
+from app.index_cache import index_cache
+from app.retriever import get_relevant_docs_for_universe
+from app.snapshots import current_version, list_snapshots
+from app.universe_embedder import build_universe_index, chunk_record
+
+DIM = 16
+
+
+class FakeModel:
+    """Deterministic embeddings from the text hash, recording what it encodes."""
+
+    def __init__(self):
+        self.encoded = []
+
+    def get_sentence_embedding_dimension(self):
+        return DIM
+
+    def encode(self, texts, **kwargs):
+        self.encoded += texts
+        return np.stack([embed(t) for t in texts])
+
+
+def embed(text):
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:4], "little")
+    vector = np.random.default_rng(seed).standard_normal(DIM).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+@pytest.fixture
+def universe(tmp_path, monkeypatch):
+    """Universe name plus a setter for its chunks; builds go to tmp_path/data."""
+    monkeypatch.chdir(tmp_path)
+    model = FakeModel()
+    records = []
+    monkeypatch.setattr(universe_embedder, "get_embedding_model", lambda name: model)
+    monkeypatch.setattr(universe_embedder, "iter_universe_chunk_records", lambda name: iter(records))
+    monkeypatch.setattr(embedding_cache, "EMBEDDING_CACHE_ENABLED", False)
+    name = f"build-test-{tmp_path.name}"
+
+    def set_chunks(texts):
+        records[:] = [chunk_record(text, "lore") for text in texts]
+        model.encoded.clear()
+        return model
+
+    yield name, set_chunks
+    index_cache.refresh(name)
+
+
+def test_rebuild_embeds_only_changed_chunks(universe):
+    name, set_chunks = universe
+    model = set_chunks(["the gate is open", "the bridge fell", "bread at the market"])
+    assert build_universe_index(name) == 3
+    assert sorted(model.encoded) == ["bread at the market", "the bridge fell", "the gate is open"]
+    first = current_version(name)
+
+    model = set_chunks(["the gate is open", "bread at the market", "a dragon sleeps"])
+    assert build_universe_index(name) == 3
+
+    assert model.encoded == ["a dragon sleeps"]
+    assert current_version(name) != first
+    assert first in list_snapshots(name)
+    docs = get_relevant_docs_for_universe("", name, k=3, query_vector=embed("a dragon sleeps")[None, :],
+                                          mode="vector")
+    assert docs[0] == "a dragon sleeps"
+    assert "the bridge fell" not in docs
+
+
+def test_full_rebuild_embeds_everything(universe):
+    name, set_chunks = universe
+    set_chunks(["the gate is open", "the bridge fell"])
+    build_universe_index(name)
+
+    model = set_chunks(["the gate is open", "the bridge fell"])
+    build_universe_index(name, full_rebuild=True)
+
+    assert sorted(model.encoded) == ["the bridge fell", "the gate is open"]
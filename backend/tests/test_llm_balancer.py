@@ -0,0 +1,144 @@
+"""
+LLM endpoint pool against local stub servers: failover, circuit breaker,
+hedging and health checks.
+
+    cd backend && python -m pytest tests
+"""
+import asyncio
+import time
+from urllib.parse import urljoin
+
+import pytest
+
+from app.http_client import AsyncPooledHTTPClient, PooledHTTPClient
+from app.llm_balancer import CLOSED, OPEN, EndpointPool
+from app.llm_interface import Phi2Interface
+from app.llm_stub_server import StubOptions, start_stub_servers
+
+PROMPT = "User: Is the gate open?\nKael Vire:"
+
+
+@pytest.fixture
+def stubs():
+    """Start one stub server per StubOptions: returns (urls, stats)."""
+    started = []
+
+    def start(*all_options):
+        urls, stats = [], []
+        for options in all_options:
+            servers, server_urls, server_stats = start_stub_servers(port=0, options=options)
+            started.extend(servers)
+            urls += server_urls
+            stats += server_stats
+        return urls, stats
+
+    yield start
+    for server in started:
+        server.shutdown()
+        server.server_close()
+
+
+def fast(**kwargs) -> StubOptions:
+    return StubOptions(delay=0.01, token_delay=0.0, **kwargs)
+
+
+def make_llm(pool: EndpointPool) -> Phi2Interface:
+    # No per-endpoint retries: every failure reaches the pool
+    return Phi2Interface(pool=pool, client=PooledHTTPClient(max_retries=0),
+                         async_client=AsyncPooledHTTPClient(max_retries=0))
+
+
+def test_fails_over_on_5xx(stubs):
+    (bad_url, good_url), (bad, good) = stubs(fast(fail_rate=1.0), fast())
+    llm = make_llm(EndpointPool([bad_url, good_url], failure_threshold=10))
+    try:
+        replies = [llm.generate_response(PROMPT) for _ in range(4)]
+    finally:
+        llm.close()
+
+    assert all(reply.startswith("Well met") for reply in replies)
+    assert bad["failures"] > 0
+    assert good["requests"] == 4
+
+
+def test_breaker_opens_and_recovers_through_half_open(stubs):
+    bad_options = fast(fail_rate=1.0)
+    (bad_url, good_url), (bad, good) = stubs(bad_options, fast())
+    pool = EndpointPool([bad_url, good_url], failure_threshold=2, cooldown=0.3)
+    llm = make_llm(pool)
+    endpoint = pool.endpoints[0]
+    try:
+        for _ in range(6):
+            llm.generate_response(PROMPT)
+        assert endpoint.state == OPEN
+        assert bad["requests"] == 2
+
+        # Still cooling down: no traffic
+        llm.generate_response(PROMPT)
+        assert bad["requests"] == 2
+
+        bad_options.fail_rate = 0.0
+        time.sleep(0.35)
+        for _ in range(3):
+            llm.generate_response(PROMPT)
+    finally:
+        llm.close()
+
+    assert bad["requests"] > 2
+    assert endpoint.state == CLOSED
+    assert endpoint.consecutive_failures == 0
+
+
+def test_hedge_fires_after_percentile_delay(stubs):
+    (slow_url, fast_url), (slow, quick) = stubs(StubOptions(delay=1.0, token_delay=0.0), fast())
+    pool = EndpointPool([slow_url, fast_url], hedge_percentile=50, hedge_min_samples=1)
+    pool.observe(pool.endpoints[1], 0.05)
+    llm = make_llm(pool)
+
+    async def run():
+        try:
+            start = time.perf_counter()
+            pieces = [piece async for piece in llm.astream_response(PROMPT)]
+            return "".join(pieces), time.perf_counter() - start
+        finally:
+            await llm.aclose()
+
+    reply, elapsed = asyncio.run(run())
+    llm.close()
+
+    assert reply.startswith("Well met")
+    assert elapsed < 0.8
+    assert slow["requests"] == 1 and quick["requests"] == 1
+    assert pool.hedges == 1 and pool.hedge_wins == 1
+    assert all(endpoint.outstanding == 0 for endpoint in pool.endpoints)
+
+
+def test_failed_probe_keeps_only_endpoint(stubs):
+    (url,), _ = stubs(fast(unhealthy=True))
+    pool = EndpointPool([url], failure_threshold=3)
+    llm = make_llm(pool)
+    endpoint = pool.endpoints[0]
+
+    async def probe():
+        try:
+            healthy = await llm.async_client.probe(urljoin(url, "/health"))
+            # A single endpoint is never probed in the background
+            await asyncio.wait_for(pool.run_health_checks(llm.async_client.probe, interval=0.01), 1)
+            return healthy
+        finally:
+            await llm.aclose()
+
+    healthy = asyncio.run(probe())
+    assert healthy is False
+    pool.report_health(endpoint, healthy)
+    assert endpoint.state == CLOSED
+
+    # Even once its breaker opens, the last endpoint still takes calls
+    for _ in range(2):
+        pool.report_health(endpoint, False)
+    assert endpoint.state == OPEN
+    try:
+        assert llm.generate_response(PROMPT).startswith("Well met")
+    finally:
+        llm.close()
+    assert endpoint.state == CLOSED
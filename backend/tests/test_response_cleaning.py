@@ -0,0 +1,69 @@
+"""
+Reply cleaning: stop sequences, and the streaming cleaner against
+clean_response whatever the piece sizes.
+
+    cd backend && python -m pytest tests
+"""
+import pytest
+
+from app.llm_interface import EMPTY_REPLY, Phi2Interface, ResponseStreamCleaner, cut_at_stop
+
+PROMPT = "User: Is the gate open?\nKael Vire:"
+STOP = ["\nUser:"]
+
+
+@pytest.fixture(scope="module")
+def llm():
+    llm = Phi2Interface()
+    yield llm
+    llm.close()
+
+
+def stream(reply, size, prompt=PROMPT, stop=STOP):
+    cleaner = ResponseStreamCleaner(prompt, stop)
+    shown = "".join(cleaner.feed(reply[i:i + size]) for i in range(0, len(reply), size)) + cleaner.finish()
+    assert shown == cleaner.text
+    return shown
+
+
+def test_cut_at_stop_is_case_insensitive_and_keeps_leading_match():
+    assert cut_at_stop("The gate is open.\nUSER: why?", STOP) == "The gate is open."
+    # A stop at the very start would empty the reply
+    assert cut_at_stop("User: hello", ["User:"]) == "User: hello"
+    assert cut_at_stop("No stops here.", None) == "No stops here."
+
+
+@pytest.mark.parametrize("reply", [
+    PROMPT + " Well met, traveller. The gate is open.",
+    "Character: Kael Vire\nThe road is long. However, it is safe.",
+    "I guard the gate.\nUser: and you?",
+    "Answer: yes",
+    "   ",
+])
+@pytest.mark.parametrize("size", [1, 3, 7, 1000])
+def test_stream_matches_clean_response(llm, reply, size):
+    assert stream(reply, size) == llm.clean_response(reply, PROMPT, stop=STOP)
+
+
+def test_stream_is_done_at_unwanted_phrase():
+    cleaner = ResponseStreamCleaner(PROMPT, STOP)
+    shown = cleaner.feed("The road is long. ")
+    assert not cleaner.done
+    shown += cleaner.feed("However, the rest is not needed")
+    assert cleaner.done
+    assert shown == "The road is long."
+    assert cleaner.feed("more text") == ""
+
+
+def test_long_stream_is_cut_after_second_sentence():
+    reply = "The bridge fell. Nobody crossed it since. " + "The river took the stones away " * 10
+    cleaner = ResponseStreamCleaner(PROMPT, STOP)
+    shown = "".join(cleaner.feed(reply[i:i + 5]) for i in range(0, len(reply), 5))
+    assert cleaner.done
+    assert shown == "The bridge fell. Nobody crossed it since."
+
+
+def test_empty_stream_gets_fallback_reply():
+    cleaner = ResponseStreamCleaner(PROMPT, STOP)
+    cleaner.feed(PROMPT)
+    assert cleaner.finish() == EMPTY_REPLY
@@ -0,0 +1,78 @@
+"""
+Retrieval against in-memory index cache entries: BM25 with chunk scopes,
+fusion and snapshot consistency of ids and chunk texts.
+
+    cd backend && python -m pytest tests
+"""
+import numpy as np
+
+from app import retriever
+from app.chunk_metadata import ChunkMetadata
+from app.index_cache import CachedUniverseIndex
+from app.lexical_index import LexicalIndex
+
+
+def cache_entry(texts, version, tags=None):
+    metadata = ChunkMetadata.build(tags) if tags is not None else None
+    return CachedUniverseIndex(universe="U", faiss_manager=None, chunks=list(texts), signature=(version,),
+                               loaded_at=0.0, lexical=LexicalIndex.build(texts), metadata=metadata,
+                               version=version)
+
+
+class ReloadingCache:
+    """Serves a newer snapshot on every lookup, as if one were published in between."""
+
+    def __init__(self, *entries):
+        self.entries = list(entries)
+        self.lookups = 0
+
+    def get(self, universe, dim=None):
+        entry = self.entries[min(self.lookups, len(self.entries) - 1)]
+        self.lookups += 1
+        return entry
+
+
+def test_chunks_come_from_the_searched_snapshot(monkeypatch):
+    old = cache_entry(["the dragon sleeps", "bread at the market", "a dragon egg hatches"], "v1")
+    new = cache_entry(["the harbour is quiet"], "v2")
+    monkeypatch.setattr(retriever, "index_cache", ReloadingCache(old, new))
+
+    docs = retriever.get_relevant_docs_for_universe("dragon", "U", k=2, mode="lexical")
+
+    assert sorted(docs) == ["a dragon egg hatches", "the dragon sleeps"]
+
+
+def test_lexical_search_filters_to_scope(monkeypatch):
+    texts = ["the dragon of the north", "dragon dragon dragon lore", "Kael fears the dragon", "bread"]
+    tags = [{"type": "lore"}, {"type": "lore"}, {"type": "backstory", "character": "Kael"},
+            {"type": "backstory", "character": "Mira"}]
+    monkeypatch.setattr(retriever, "index_cache", ReloadingCache(cache_entry(texts, "v1", tags)))
+    scope = [{"character": "Kael"}]
+
+    scoped = retriever.search_universe("dragon", "U", k=3, mode="lexical", scope=scope, scope_mode="filter")
+    unscoped = retriever.search_universe("dragon", "U", k=3, mode="lexical", scope=scope, scope_mode="universe")
+
+    assert scoped == [2]
+    assert sorted(unscoped) == [0, 1, 2]
+    assert unscoped[0] == 1
+    assert retriever.search_universe("dragon", "U", mode="lexical", scope=[{"character": "Nobody"}],
+                                     scope_mode="filter") == []
+
+
+def test_fuse_results_weights_both_retrievers():
+    # FAISS distances (smaller is closer) and BM25 scores (larger is better)
+    vector_hits = (np.array([0.1, 0.5, 0.9], dtype=np.float32), np.array([1, 2, 3]))
+    lexical_hits = (np.array([7.0, 5.0, 1.0], dtype=np.float32), np.array([3, 1, 4]))
+
+    assert retriever.fuse_results(vector_hits, lexical_hits, 3, alpha=1.0)[0] == 1
+    assert retriever.fuse_results(vector_hits, lexical_hits, 3, alpha=0.0)[0] == 3
+    # Found by both retrievers beats found by one
+    assert retriever.fuse_results(vector_hits, lexical_hits, 1, alpha=0.5) == [1]
+
+
+def test_fuse_results_boosts_scoped_chunks_and_skips_padding():
+    vector_hits = (np.array([0.1, 0.2, 0.0], dtype=np.float32), np.array([1, 2, -1]))
+
+    fused = retriever.fuse_results(vector_hits, retriever._NO_HITS, 3, alpha=1.0, boost_ids=np.array([2]), boost=2.0)
+
+    assert fused == [2, 1]
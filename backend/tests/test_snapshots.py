@@ -0,0 +1,64 @@
+"""
+Index snapshots: atomic publish of CURRENT and garbage collection that
+spares served (leased) and in-progress snapshots.
+
+    cd backend && python -m pytest tests
+"""
+import pytest
+
+from app import snapshots
+from app.snapshots import (
+    acquire_lease, current_snapshot_dir, current_version, gc_snapshots, list_snapshots, new_snapshot_dir,
+    publish_snapshot
+)
+
+
+@pytest.fixture(autouse=True)
+def data_root(tmp_path, monkeypatch):
+    # Index roots are relative to the working directory (data/<universe>/faiss_index)
+    monkeypatch.chdir(tmp_path)
+
+
+def make_snapshots(count):
+    paths = [new_snapshot_dir("U") for _ in range(count)]
+    for path in paths:
+        (path / "index.faiss").write_bytes(b"index")
+    return paths
+
+
+def test_publish_switches_current_atomically():
+    assert current_version("U") is None
+    first, second = make_snapshots(2)
+
+    publish_snapshot("U", first)
+    assert current_snapshot_dir("U") == first
+    publish_snapshot("U", second)
+
+    assert current_version("U") == second.name
+    assert current_snapshot_dir("U") == second
+    # Only the pointer itself is left behind, no temporary files
+    assert sorted(p.name for p in snapshots.index_root("U").iterdir()) == ["CURRENT", "snapshots"]
+
+
+def test_gc_keeps_current_newer_and_most_recent_old_snapshots():
+    oldest, old, previous, current, building = make_snapshots(5)
+    publish_snapshot("U", current)
+
+    removed = gc_snapshots("U", keep=1)
+
+    assert removed == [oldest.name, old.name]
+    assert list_snapshots("U") == [previous.name, current.name, building.name]
+
+
+@pytest.mark.skipif(snapshots.fcntl is None, reason="leases need fcntl")
+def test_gc_spares_leased_snapshot_until_released():
+    served, current = make_snapshots(2)
+    publish_snapshot("U", current)
+    lease = acquire_lease(served)
+
+    assert gc_snapshots("U", keep=0) == []
+    assert served.exists()
+
+    lease.close()
+    assert gc_snapshots("U", keep=0) == [served.name]
+    assert not served.exists()
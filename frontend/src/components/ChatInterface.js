@@ -1,6 +1,39 @@
 import React, { useState, useEffect } from 'react';
 import axios from 'axios';
 
+// POST a chat turn to the streaming endpoint; calls onToken with each piece of the reply
+// and resolves with the final response body (same shape as /api/chat)
+const streamChat = async (requestData, onToken) => {
+  const res = await fetch('/api/chat/stream', {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json', 'Accept': 'text/event-stream' },
+    body: JSON.stringify(requestData)
+  });
+  if (!res.ok) {
+    const body = await res.json().catch(() => ({}));
+    throw Object.assign(new Error('Chat request failed'), { detail: body.detail || res.statusText });
+  }
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    let boundary;
+    while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+      const block = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+      const event = (block.match(/^event: (.*)$/m) || [])[1];
+      const data = JSON.parse((block.match(/^data: (.*)$/m) || [])[1] || '{}');
+      if (event === 'token') onToken(data.text);
+      else if (event === 'done') return data;
+      else if (event === 'error') throw Object.assign(new Error('Chat stream failed'), { detail: data.detail });
+    }
+  }
+  throw Object.assign(new Error('Chat stream ended early'), { detail: 'the connection closed before the reply was complete' });
+};
+
 const ChatInterface = () => {
   const [universes, setUniverses] = useState([]);
   const [selectedUniverse, setSelectedUniverse] = useState('');
@@ -93,20 +126,34 @@ const ChatInterface = () => {
       };
       console.log('Request data:', requestData);
       
-      const response = await axios.post('/api/chat', requestData);
-      console.log('Response received:', response.data);
+      // Stream the reply: the message grows as tokens arrive, state updates come with the final event
+      const aiTimestamp = new Date().toLocaleTimeString();
+      let started = false;
+      const data = await streamChat(requestData, (text) => {
+        if (!started) {
+          started = true;
+          setIsLoading(false);
+          setMessages(prev => [...prev, { type: 'ai', content: text, character: selectedCharacter, timestamp: aiTimestamp }]);
+        } else {
+          setMessages(prev => {
+            const last = prev[prev.length - 1];
+            return [...prev.slice(0, -1), { ...last, content: last.content + text }];
+          });
+        }
+      });
+      console.log('Response received:', data);
 
       const aiMessage = {
         type: 'ai',
-        content: response.data.response,
-        character: response.data.character,
-        timestamp: new Date().toLocaleTimeString()
+        content: data.response,
+        character: data.character,
+        timestamp: aiTimestamp
       };
 
-      setMessages(prev => [...prev, aiMessage]);
+      setMessages(prev => started ? [...prev.slice(0, -1), aiMessage] : [...prev, aiMessage]);
       
       // Handle character state changes
-      if (response.data.character_updated) {
+      if (data.character_updated) {
         // Refresh character data and events
         fetchCharacters();
         fetchCharacterEvents();
@@ -121,18 +168,18 @@ const ChatInterface = () => {
       }
       
       // Store debug info if available
-      if (debugMode && response.data.debug_info) {
-        console.log('Setting debug info:', response.data.debug_info);
-        setDebugInfo(response.data.debug_info);
+      if (debugMode && data.debug_info) {
+        console.log('Setting debug info:', data.debug_info);
+        setDebugInfo(data.debug_info);
       } else if (debugMode) {
         console.log('Debug mode enabled but no debug_info in response');
-        console.log('Full response:', response.data);
+        console.log('Full response:', data);
       }
     } catch (error) {
       console.error('Error in sendMessage:', error);
       const errorMessage = {
         type: 'error',
-        content: 'Sorry, there was an error processing your message: ' + error.response?.data?.detail,
+        content: 'Sorry, there was an error processing your message: ' + (error.detail || error.response?.data?.detail),
         timestamp: new Date().toLocaleTimeString()
       };
       setMessages(prev => [...prev, errorMessage]);